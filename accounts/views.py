@@ -17,6 +17,14 @@ def signup(request):
         form = SignUpForm()
     return render(request, 'registration/signup.html', {'form': form})
 
+def _profile_activity(user_obj):
+    # ดึงข้อมูลต่างๆ ของ User คนนี้มาแสดง (แต่ละรายการอ่านจาก index (user, -created_at) ของตารางนั้น)
+    return {
+        'recent_reviews': user_obj.reviews.all().order_by('-created_at')[:5],
+        'favorites': user_obj.favorites.all().order_by('-created_at')[:10],
+        'bookmarks': user_obj.bookmarks.all().order_by('-created_at')[:10],
+    }
+
 @login_required
 def profile(request, username=None):
     if username:
@@ -24,16 +32,9 @@ def profile(request, username=None):
     else:
         user_obj = request.user
 
-    # ดึงข้อมูลต่างๆ ของ User คนนี้มาแสดง
-    recent_reviews = user_obj.reviews.all().order_by('-created_at')[:5]
-    favorites = user_obj.favorites.all().order_by('-created_at')[:10]
-    bookmarks = user_obj.bookmarks.all().order_by('-created_at')[:10]
-    
     return render(request, 'accounts/profile.html', {
         'profile_user': user_obj,
-        'recent_reviews': recent_reviews,
-        'favorites': favorites,
-        'bookmarks': bookmarks
+        **_profile_activity(user_obj),
     })
 
 @login_required
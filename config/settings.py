@@ -90,6 +90,45 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# ค่าเริ่มต้นเป็น cache ใน process ตอน deploy หลาย worker ให้เปลี่ยนเป็น Redis/Memcached
+# เพื่อให้ lock/ผลลัพธ์ที่ใช้รวม request TMDb เห็นร่วมกันทุก worker
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'mood2movies',
+    },
+    # {% cache %} ของหน้า detail (movies/fragments.py) แยกไว้ ไม่ให้แย่งที่/โดน cull ร่วมกับ cache ของ TMDb
+    'template_fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'mood2movies-fragments',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+
+
+# TMDb
+# ตั้ง env TMDB_BASE_URL เพื่อชี้ไปที่ TMDb จำลอง (python manage.py tmdb_standin) ได้
+
+TMDB_BASE_URL = os.environ.get('TMDB_BASE_URL', 'https://api.themoviedb.org/3')
+
+# หน้า detail จะเรียก TMDb เฉพาะหนังที่ sync ล่าสุดเก่ากว่านี้ (วินาที)
+# ที่เหลือให้ python manage.py sync_tmdb_changes คอยอัปเดตเป็นรอบ ๆ
+TMDB_SYNC_MAX_AGE = 24 * 3600
+
+# จำกัดการยิง TMDb ร่วมกันทุก worker (ผ่าน CACHES['default'] ต้องเป็น Redis/Memcached ตอน deploy
+# ถ้ายังเป็น LocMem แต่ละ worker จะมีถังของตัวเอง manage.py check --deploy จะเตือน movies.W001)
+# background_share = สัดส่วนของโควตาที่งานเบื้องหลัง (sync/import) ใช้ได้
+TMDB_RATE_LIMIT = {
+    'rate': 40,
+    'per': 1.0,
+    'background_share': 0.5,
+    'max_wait': {'interactive': 1.0, 'background': 30.0},
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
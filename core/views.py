@@ -1,14 +1,22 @@
 # core/views.py
+import asyncio
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
-from movies.models import Mood
-from movies.utils import get_popular_movies_tmdb
+from movies.moods import mood_registry
+from movies.utils import aget_popular_movies_tmdb, get_popular_movies_local
 
-def home(request):
-    moods = Mood.objects.all() # ดึง Mood ทั้งหมดจาก DB
-        # ดึงหนังยอดนิยมมาด้วย
-    popular_movies = get_popular_movies_tmdb()
+async def home(request):
+    # อารมณ์ทั้งหมดจากทะเบียนใน memory พร้อมกับหนังยอดนิยมจาก TMDb
+    moods, popular_movies = await asyncio.gather(
+        mood_registry.aall(),
+        aget_popular_movies_tmdb(),
+    )
+    if not popular_movies:
+        # TMDb ล่ม/ตัดวงจรอยู่ -> ใช้หนังยอดนิยมที่มีใน DB แทน
+        popular_movies = await sync_to_async(get_popular_movies_local)()
 
-    return render(request, 'core/home.html', {
+    return await sync_to_async(render)(request, 'core/home.html', {
         'moods': moods,
         'popular_movies': popular_movies # ส่งไปที่ Template
-    })
\ No newline at end of file
+    })
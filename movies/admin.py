@@ -1,7 +1,8 @@
 # movies/admin.py
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Movie, Mood, Review, Favorite, Bookmark, CustomList, Profile, ReviewMoodScore
+from . import mood_stats, services
+from .models import Movie, Mood, Review, Favorite, Bookmark, CustomList, Profile, ReviewMoodScore, Genre
 
 # Config Header
 admin.site.site_header = "Mood2Movie Administration"
@@ -51,6 +52,19 @@ class ReviewAdmin(admin.ModelAdmin):
     # [NEW] ใส่ Inline เพื่อให้จัดการคะแนนอารมณ์ได้ในหน้าเดียวกัน
     inlines = [ReviewMoodScoreInline]
 
+    def get_readonly_fields(self, request, obj=None):
+        # ย้ายรีวิวไปหนัง/ผู้ใช้อื่นจะทำให้สถิติของสองเรื่องเพี้ยน แก้ได้แค่ตอนสร้าง
+        return ('user', 'movie') if obj else ()
+
+    def save_model(self, request, obj, form, change):
+        # คะแนนก่อนแก้ ไว้คำนวณส่วนต่างของ MovieMoodStats หลัง inline บันทึกเสร็จ (save_related)
+        obj._old_scores = mood_stats.review_scores(obj) if change else {}
+        super().save_model(request, obj, form, change)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        services.scores_changed(form.instance, form.instance._old_scores, created=not change)
+
 @admin.register(Profile)
 class ProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'avatar_thumbnail')
@@ -65,4 +79,5 @@ class ProfileAdmin(admin.ModelAdmin):
 # Register Simple Models
 admin.site.register(Favorite)
 admin.site.register(Bookmark)
-admin.site.register(CustomList)
\ No newline at end of file
+admin.site.register(CustomList)
+admin.site.register(Genre)
\ No newline at end of file
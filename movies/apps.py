@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class MoviesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'movies'
+
+    def ready(self):
+        # โหลดรายชื่อประเภทหนังจาก snapshot บนดิสก์ครั้งเดียวตอนเริ่ม (ไม่ยิงเน็ต)
+        from .genres import genre_registry
+        genre_registry.load_snapshot()
+        # ลงทะเบียน signal ล้างทะเบียนอารมณ์เมื่อ Mood เปลี่ยน
+        from . import moods  # noqa: F401
+        # ลงทะเบียน signal ล้าง LRU ของตัวหา Movie เมื่อมีการลบหนัง
+        from . import resolver  # noqa: F401
+        # ลงทะเบียน signal หักคะแนนออกจาก MovieMoodStats เมื่อรีวิวถูกลบ (ทั้งลบตรง ๆ และ cascade)
+        from . import services  # noqa: F401
@@ -0,0 +1,102 @@
+# movies/cache.py
+"""
+Cache ในหน่วยความจำของ process แบบ TTL + LRU
+
+- แต่ละ entry มีอายุ "สด" (ttl) และช่วงที่ยอมเสิร์ฟของเก่า (stale_ttl) ต่อท้าย
+- ระหว่างช่วง stale จะคืนของเก่าให้ทันที แล้วสั่ง refresh อยู่เบื้องหลัง
+  (stale-while-revalidate) ผู้ใช้จึงไม่ต้องรอ TMDb
+- เมื่อจำนวน entry เกิน maxsize จะไล่ตัวที่ไม่ได้ใช้นานที่สุดออก (LRU)
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+MISS = 'miss'
+FRESH = 'fresh'
+STALE = 'stale'
+
+# thread สำหรับ refresh เบื้องหลัง ใช้ร่วมกันทุก cache ใน process
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='cache-refresh')
+
+
+class TTLCache:
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()  # key -> (value, fresh_until, stale_until)
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def lookup(self, key):
+        """คืน (value, state) โดย state เป็น FRESH / STALE / MISS"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, MISS
+            value, fresh_until, stale_until = entry
+            if now >= stale_until:
+                del self._data[key]
+                self.misses += 1
+                return None, MISS
+            self._data.move_to_end(key)
+            if now < fresh_until:
+                self.hits += 1
+                return value, FRESH
+            self.stale_hits += 1
+            return value, STALE
+
+    def set(self, key, value, ttl, stale_ttl=0):
+        now = time.monotonic()
+        with self._lock:
+            self._data[key] = (value, now + ttl, now + ttl + stale_ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def _refresh(self, key, fetch, ttl, stale_ttl):
+        try:
+            self.set(key, fetch(), ttl, stale_ttl)
+        except Exception as e:
+            # refresh ไม่สำเร็จก็ปล่อยของเก่าไว้ใช้ต่อจนหมดช่วง stale
+            logger.warning("Background refresh failed for %r: %s", key, e)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def refresh_in_background(self, key, fetch, ttl, stale_ttl=0):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        _refresh_executor.submit(self._refresh, key, fetch, ttl, stale_ttl)
+
+    def get_or_fetch(self, key, fetch, ttl, stale_ttl=0):
+        """read-through: มีของสดคืนเลย, ของเก่าคืนพร้อม refresh เบื้องหลัง, ไม่มีก็ fetch"""
+        value, state = self.lookup(key)
+        if state == FRESH:
+            return value
+        if state == STALE:
+            self.refresh_in_background(key, fetch, ttl, stale_ttl)
+            return value
+        value = fetch()
+        self.set(key, value, ttl, stale_ttl)
+        return value
@@ -0,0 +1,148 @@
+# movies/evaluation.py
+"""
+ประเมินระบบแนะนำหนังแบบ offline (ใช้กับคำสั่ง python manage.py evaluate_recommenders)
+
+- ตัดรีวิวล่าสุดของผู้ใช้กลุ่มตัวอย่างออกเป็นชุดทดสอบ (held-out) แล้วให้แต่ละ recommender เดาหนังให้ผู้ใช้คนนั้น
+  นับว่าถูกเมื่อหนังที่แนะนำอยู่ในชุดทดสอบ วัด precision@k, recall@k และ NDCG@k
+- จับเวลาแต่ละครั้งที่เรียก (p50/p95/p99) และนับจำนวน query ที่ยิงเข้า DB
+- ทุกอย่างไม่ต้องต่อเน็ต ใช้ข้อมูลใน DB (ข้อมูลจริงที่ snapshot มาหรือสร้างด้วย generate_synthetic_data)
+"""
+import math
+import time
+
+import numpy as np
+from django.db import connection
+from django.db.models import Avg, Count
+from django.test.utils import CaptureQueriesContext
+
+from . import mood_stats
+from .models import Movie, ReviewMoodScore
+from .recommender import Recommender, load_interactions, save_model, to_csr, train_als
+from .similarity import MoodVectorIndex
+
+
+# ---------- metrics ----------
+
+def precision_at_k(recommended, relevant, k):
+    hits = sum(1 for movie_id in recommended[:k] if movie_id in relevant)
+    return hits / k
+
+
+def recall_at_k(recommended, relevant, k):
+    if not relevant:
+        return 0.0
+    hits = sum(1 for movie_id in recommended[:k] if movie_id in relevant)
+    return hits / len(relevant)
+
+
+def ndcg_at_k(recommended, relevant, k):
+    dcg = sum(1 / math.log2(rank + 2) for rank, movie_id in enumerate(recommended[:k]) if movie_id in relevant)
+    ideal = sum(1 / math.log2(rank + 2) for rank in range(min(len(relevant), k)))
+    return dcg / ideal if ideal else 0.0
+
+
+def percentiles(samples_ms):
+    if not samples_ms:
+        return {}
+    values = np.percentile(samples_ms, [50, 95, 99])
+    return {'p50_ms': round(float(values[0]), 3), 'p95_ms': round(float(values[1]), 3),
+            'p99_ms': round(float(values[2]), 3), 'max_ms': round(max(samples_ms), 3)}
+
+
+# ---------- recommenders ----------
+# แต่ละตัวรับ (user_id, seen, k) แล้วคืน list ของ Movie.id เรียงจากแนะนำมากไปน้อย
+# seen = หนังที่ผู้ใช้มี interaction แล้วในชุด train (ต้องไม่แนะนำซ้ำ)
+
+class PopularRecommender:
+    """baseline: หนังที่มีคนกด Favorite + รีวิวมากที่สุด (เหมือนกันทุกคน)"""
+    name = 'popular'
+
+    def __init__(self, pool=500):
+        self.ranked = list(Movie.objects.annotate(
+            fav_count=Count('favorited_by', distinct=True),
+            review_count=Count('reviews', distinct=True),
+        ).order_by('-fav_count', '-review_count', '-vote_average', 'id').values_list('id', flat=True)[:pool])
+
+    def recommend(self, user_id, seen, k):
+        return [movie_id for movie_id in self.ranked if movie_id not in seen][:k]
+
+
+class MoodLeaderboardRecommender:
+    """หน้าแนะนำตามอารมณ์ (Weighted Rating) โดยเลือกอารมณ์ที่ผู้ใช้ให้คะแนนเฉลี่ยสูงสุดในรีวิวเดิม"""
+    name = 'mood_leaderboard'
+
+    def recommend(self, user_id, seen, k):
+        top_mood = ReviewMoodScore.objects.filter(review__user_id=user_id, intensity__gt=0) \
+            .values('mood_id').annotate(avg=Avg('intensity')).order_by('-avg', 'mood_id').first()
+        if top_mood is None:
+            return []
+        movies = mood_stats.leaderboard(top_mood['mood_id'], limit=k + len(seen))
+        return [movie.id for movie in movies if movie.id not in seen][:k]
+
+
+class SimilarMoodRecommender:
+    """รวมหนังที่อารมณ์คล้ายกับหนังที่ผู้ใช้เคยรีวิว (ให้คะแนนตามผลรวม cosine similarity)"""
+    name = 'similar_mood'
+
+    def __init__(self, neighbours=20):
+        self.neighbours = neighbours
+        self.index = MoodVectorIndex(refresh_interval=float('inf'))
+        self.index.refresh(force=True)
+
+    def recommend(self, user_id, seen, k):
+        scores = {}
+        for movie_id in seen:
+            for neighbour, similarity in self.index.similar(movie_id, k=self.neighbours):
+                if neighbour not in seen:
+                    scores[neighbour] = scores.get(neighbour, 0.0) + similarity
+        return sorted(scores, key=lambda movie_id: (-scores[movie_id], movie_id))[:k]
+
+
+class ALSRecommender:
+    """Matrix Factorization (implicit ALS) เทรนใหม่จากข้อมูลชุด train ก่อนวัดผล"""
+    name = 'als'
+
+    def __init__(self, model_path, factors=32, iterations=10, regularization=0.1, alpha=10.0, seed=0):
+        user_ids, movie_ids, values = load_interactions()
+        unique_users, user_index = np.unique(user_ids, return_inverse=True)
+        unique_movies, item_index = np.unique(movie_ids, return_inverse=True)
+        started = time.monotonic()
+        user_factors, item_factors = train_als(
+            user_index, item_index, values, len(unique_users), len(unique_movies),
+            factors=factors, regularization=regularization, alpha=alpha, iterations=iterations, seed=seed,
+        )
+        self.train_seconds = time.monotonic() - started
+        seen = to_csr(user_index, item_index, values, len(unique_users))
+        save_model(model_path, unique_users, unique_movies, user_factors, item_factors, seen[:2])
+        self.scorer = Recommender(model_path, cache_ttl=0)
+
+    def recommend(self, user_id, seen, k):
+        return self.scorer.recommend_ids(user_id, k)
+
+
+# ---------- run ----------
+
+def evaluate(recommender, cases, k):
+    """
+    cases = [(user_id, seen_set, relevant_set)]
+    คืน dict ของค่าเฉลี่ย metric + latency percentile + จำนวน query ต่อครั้ง
+    """
+    precision, recall, ndcg, latency, queries = [], [], [], [], []
+    for user_id, seen, relevant in cases:
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            recommended = recommender.recommend(user_id, seen, k)
+            latency.append((time.perf_counter() - started) * 1000)
+        queries.append(len(captured))
+        precision.append(precision_at_k(recommended, relevant, k))
+        recall.append(recall_at_k(recommended, relevant, k))
+        ndcg.append(ndcg_at_k(recommended, relevant, k))
+
+    return {
+        'users': len(cases),
+        f'precision@{k}': round(float(np.mean(precision)), 5) if cases else 0.0,
+        f'recall@{k}': round(float(np.mean(recall)), 5) if cases else 0.0,
+        f'ndcg@{k}': round(float(np.mean(ndcg)), 5) if cases else 0.0,
+        'latency': percentiles(latency),
+        'queries': {'mean': round(float(np.mean(queries)), 2) if queries else 0, 'max': max(queries, default=0)},
+    }
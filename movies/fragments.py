@@ -0,0 +1,61 @@
+# movies/fragments.py
+"""
+cache ส่วนที่ใช้ร่วมกันทุกคนในหน้า detail ด้วย {% cache %} ของ Django (ดู templates/movies/detail.html)
+
+- ส่วนหัว (ข้อมูล TMDb + Mood DNA) และรายการรีวิวหน้าแรก ไม่ขึ้นกับผู้ใช้ key มี "เวอร์ชันของหนัง" ต่อท้าย
+- เวอร์ชันเพิ่มเมื่อมีรีวิว/คะแนน/การ sync จาก TMDb แตะหนังเรื่องนั้น (หลัง commit) key ใหม่จึง miss แล้ว render ใหม่
+  ของเก่าไม่ต้องลบ ปล่อยให้หมดอายุเอง
+- fragment อยู่ใน cache ชื่อ template_fragments (ดู CACHES ใน settings) แยกจาก cache ของ TMDb
+  จะได้ไม่โดน cull ไปพร้อมกัน
+- view ส่งข้อมูลของส่วนที่ใช้ร่วมกันเป็น callable ให้ template คำนวณเองเฉพาะตอน fragment miss
+  ส่วนเฉพาะผู้ใช้ (ปุ่ม Favorite/Bookmark/List, รีวิวของฉัน) คำนวณแยกทุกครั้ง
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db import transaction
+
+FRAGMENT_TTL = getattr(settings, 'DETAIL_FRAGMENT_TTL', 24 * 3600)
+
+# ชื่อ fragment ที่ใช้ใน {% cache %} ของ detail.html
+HEADER = 'movie_header'
+REVIEWS = 'movie_reviews'
+
+
+def _version_key(movie_id):
+    return f"movie:{movie_id}:version"
+
+
+def movie_version(movie_id):
+    """เวอร์ชันปัจจุบันของหนัง (เริ่มจากเวลาปัจจุบัน ถ้า key หลุดจาก cache ก็ไม่วนกลับไปชนเลขเก่า)"""
+    version = cache.get(_version_key(movie_id))
+    if version is None:
+        cache.add(_version_key(movie_id), time.time_ns() // 1000, None)
+        version = cache.get(_version_key(movie_id))
+    return version
+
+
+async def amovie_version(movie_id):
+    """เหมือน movie_version() สำหรับ async view (ใช้ API แบบ async ของ Django cache)"""
+    version = await cache.aget(_version_key(movie_id))
+    if version is None:
+        await cache.aadd(_version_key(movie_id), time.time_ns() // 1000, None)
+        version = await cache.aget(_version_key(movie_id))
+    return version
+
+
+def bump_movie_version(movie_id):
+    """ให้ fragment ของหนังเรื่องนี้ render ใหม่ หลัง transaction ปัจจุบัน commit"""
+    def bump():
+        try:
+            cache.incr(_version_key(movie_id))
+        except ValueError:
+            movie_version(movie_id)
+    transaction.on_commit(bump)
+
+
+def fragment_key(name, movie_id, version):
+    return make_template_fragment_key(name, [movie_id, version])
+
@@ -0,0 +1,127 @@
+# movies/genres.py
+"""
+ทะเบียนประเภทหนัง (Genre) ของ TMDb ที่โหลดไว้ในหน่วยความจำ
+
+- MoviesConfig.ready() โหลดจาก snapshot บนดิสก์ครั้งเดียวตอนเริ่ม process
+- refresh จาก TMDb เป็นระยะอยู่เบื้องหลัง แล้วเขียน snapshot ทับ
+- ถ้าไม่มี snapshot ที่เขียนไว้ จะใช้ไฟล์ตั้งต้น movies/data/tmdb_genres.json
+  หน้า search จึงแสดง dropdown ได้แม้ start ตอนไม่มีเน็ต
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .tmdb import get_client, TMDbError
+
+logger = logging.getLogger(__name__)
+
+BUNDLED_SNAPSHOT = Path(__file__).resolve().parent / 'data' / 'tmdb_genres.json'
+
+
+class GenreRegistry:
+    def __init__(self, snapshot_path, refresh_interval=24 * 3600):
+        self.snapshot_path = Path(snapshot_path)
+        self.refresh_interval = refresh_interval
+        self._genres = ()      # tuple ของ {'id': ..., 'name': ...} เรียงตาม TMDb
+        self._names = {}       # id -> name
+        self._loaded_at = 0.0  # เวลา (epoch) ของข้อมูลชุดปัจจุบัน
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def _replace(self, genres, loaded_at):
+        genres = tuple({'id': int(g['id']), 'name': g['name']} for g in genres)
+        # สลับทั้งชุดทีเดียว คนที่อ่านอยู่จะเห็นชุดเก่าหรือชุดใหม่ ไม่ปนกัน
+        self._genres, self._names, self._loaded_at = genres, {g['id']: g['name'] for g in genres}, loaded_at
+
+    def load_snapshot(self):
+        """โหลดจาก snapshot (ถ้ามี) ไม่งั้นใช้ไฟล์ตั้งต้นที่มากับโค้ด"""
+        for path in (self.snapshot_path, BUNDLED_SNAPSHOT):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            # ไฟล์ตั้งต้นถือว่าเก่าเสมอ จะได้ refresh ตั้งแต่ครั้งแรกที่ถูกใช้
+            loaded_at = data.get('fetched_at', 0.0) if path == self.snapshot_path else 0.0
+            self._replace(data.get('genres', []), loaded_at)
+            return True
+        return False
+
+    def _write_snapshot(self, genres, fetched_at):
+        self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+        # เขียนไฟล์ชั่วคราวแล้ว rename เพื่อไม่ให้ process อื่นอ่านเจอไฟล์ครึ่ง ๆ กลาง ๆ
+        fd, tmp_path = tempfile.mkstemp(dir=self.snapshot_path.parent, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'fetched_at': fetched_at, 'genres': genres}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.snapshot_path)
+
+    def refresh(self):
+        """ดึงรายชื่อประเภทหนังล่าสุดจาก TMDb (ล้มเหลวก็ใช้ชุดเดิมต่อ)"""
+        try:
+            genres = get_client().get('genre/movie/list').get('genres', [])
+        except TMDbError as e:
+            logger.warning("Error refreshing genres: %s", e)
+            return False
+        if not genres:
+            return False
+        now = time.time()
+        self._replace(genres, now)
+        try:
+            self._write_snapshot(genres, now)
+        except OSError as e:
+            logger.warning("Could not write genre snapshot %s: %s", self.snapshot_path, e)
+        return True
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name='genre-refresh', daemon=True).start()
+
+    def is_stale(self):
+        return time.time() - self._loaded_at > self.refresh_interval
+
+    def all(self):
+        """รายชื่อประเภทหนังทั้งหมด (list ของ dict มี id, name) สำหรับ dropdown"""
+        if not self._genres:
+            # ไม่มีข้อมูลเลยจริง ๆ (snapshot หาย) ต้องดึงแบบรอผล
+            self.refresh()
+        elif self.is_stale():
+            self._refresh_in_background()
+        return list(self._genres)
+
+    async def aall(self):
+        """เหมือน all() สำหรับ async view ถ้าต้องดึงจาก TMDb แบบรอผลจะทำใน thread ไม่บล็อก event loop"""
+        if not self._genres:
+            await sync_to_async(self.refresh, thread_sensitive=False)()
+        elif self.is_stale():
+            self._refresh_in_background()
+        return list(self._genres)
+
+    def name(self, genre_id, default=None):
+        return self._names.get(int(genre_id), default)
+
+    def names(self):
+        """dict id -> name"""
+        return dict(self._names)
+
+
+genre_registry = GenreRegistry(
+    snapshot_path=getattr(settings, 'TMDB_GENRE_SNAPSHOT', settings.BASE_DIR / 'var' / 'tmdb_genres.json'),
+    refresh_interval=getattr(settings, 'TMDB_GENRE_REFRESH_INTERVAL', 24 * 3600),
+)
@@ -0,0 +1,150 @@
+# movies/management/commands/evaluate_recommenders.py
+"""
+วัดคุณภาพและความเร็วของระบบแนะนำหนังแบบ offline แล้วเขียนรายงาน JSON ไว้เทียบระหว่าง commit
+
+ขั้นตอน (ทั้งหมดอยู่ใน transaction ที่ rollback ตอนจบ ข้อมูลจริงไม่เปลี่ยน):
+1. สุ่มผู้ใช้ที่มีรีวิวอย่างน้อย --min-reviews เรื่อง แล้วตัดรีวิวล่าสุด --holdout เรื่องออกเป็นชุดทดสอบ
+   (ลบ Favorite/Bookmark/List ของหนังเรื่องนั้นด้วย กันข้อมูลรั่ว) และอัปเดต MovieMoodStats/อันดับตามจริง
+2. ให้แต่ละ recommender แนะนำ k เรื่อง วัด precision@k, recall@k, NDCG@k, latency และจำนวน query
+
+    python manage.py evaluate_recommenders --users 500 --k 10
+    python manage.py evaluate_recommenders --only popular mood_leaderboard --output var/eval/baseline.json
+"""
+import datetime
+import json
+import random
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+
+from movies import mood_stats
+from movies.evaluation import (
+    ALSRecommender, MoodLeaderboardRecommender, PopularRecommender, SimilarMoodRecommender, evaluate,
+)
+from movies.models import Bookmark, CustomList, Favorite, Review
+
+RECOMMENDERS = ['popular', 'mood_leaderboard', 'similar_mood', 'als']
+
+
+class Command(BaseCommand):
+    help = 'ประเมินระบบแนะนำหนังแบบ offline (precision/recall/NDCG + latency + จำนวน query) แล้วเขียนรายงาน JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500, help='จำนวนผู้ใช้ตัวอย่างสูงสุด')
+        parser.add_argument('--min-reviews', type=int, default=3)
+        parser.add_argument('--holdout', type=int, default=1, help='จำนวนรีวิวล่าสุดต่อคนที่ตัดไปเป็นชุดทดสอบ')
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--only', nargs='+', choices=RECOMMENDERS, help='วัดเฉพาะ recommender ที่ระบุ')
+        parser.add_argument('--als-iterations', type=int, default=10)
+        parser.add_argument('--als-factors', type=int, default=32)
+        parser.add_argument('--output', help='ไฟล์รายงาน JSON (ค่าเริ่มต้น var/eval/<commit>-<เวลา>.json)')
+
+    def handle(self, *args, **options):
+        if options['holdout'] >= options['min_reviews']:
+            raise CommandError('--holdout ต้องน้อยกว่า --min-reviews (ต้องเหลือรีวิวไว้เทรน)')
+
+        report = {
+            'commit': self.git_commit(),
+            'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'database': connection.vendor,
+            'params': {key: options[key] for key in
+                       ('users', 'min_reviews', 'holdout', 'k', 'seed', 'als_iterations', 'als_factors')},
+            'results': {},
+        }
+
+        with transaction.atomic():
+            cases, dataset = self.split(options)
+            report['dataset'] = dataset
+            self.stdout.write(f"ผู้ใช้ทดสอบ {len(cases)} คน, ตัดรีวิวออก {dataset['heldout_reviews']} รายการ")
+
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                for name in options['only'] or RECOMMENDERS:
+                    started = time.monotonic()
+                    recommender = self.build(name, options, Path(tmp_dir))
+                    setup_seconds = time.monotonic() - started
+                    result = evaluate(recommender, cases, options['k'])
+                    result['setup_seconds'] = round(setup_seconds, 3)
+                    report['results'][name] = result
+                    self.print_result(name, result, options['k'])
+
+            # คืนข้อมูลทั้งหมดที่ตัดออกไป
+            transaction.set_rollback(True)
+
+        output = Path(options['output'] or settings.BASE_DIR / 'var' / 'eval' /
+                      f"{report['commit'] or 'nocommit'}-{int(time.time())}.json")
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"เขียนรายงานที่ {output}"))
+
+    def split(self, options):
+        """ตัดรีวิวล่าสุดของผู้ใช้ตัวอย่างออก คืน (cases, ข้อมูลสรุปของชุดข้อมูล)"""
+        eligible = list(Review.objects.values('user_id').annotate(n=Count('id'))
+                        .filter(n__gte=options['min_reviews']).order_by('user_id').values_list('user_id', flat=True))
+        rng = random.Random(options['seed'])
+        users = sorted(rng.sample(eligible, min(options['users'], len(eligible))))
+
+        cases = []
+        heldout_total = 0
+        for user_id in users:
+            reviews = list(Review.objects.filter(user_id=user_id).order_by('-created_at', '-id'))
+            heldout = reviews[:options['holdout']]
+            relevant = {review.movie_id for review in heldout}
+            for review in heldout:
+                # pre_delete ของ Review (services.remove_review_stats) หักคะแนนออกจาก MovieMoodStats ให้เอง
+                review.delete()
+            Favorite.objects.filter(user_id=user_id, movie_id__in=relevant).delete()
+            Bookmark.objects.filter(user_id=user_id, movie_id__in=relevant).delete()
+            CustomList.movies.through.objects.filter(customlist__user_id=user_id, movie_id__in=relevant).delete()
+            heldout_total += len(heldout)
+
+            seen = {review.movie_id for review in reviews[options['holdout']:]}
+            seen.update(Favorite.objects.filter(user_id=user_id).values_list('movie_id', flat=True))
+            seen.update(Bookmark.objects.filter(user_id=user_id).values_list('movie_id', flat=True))
+            cases.append((user_id, seen, relevant))
+
+        # ค่าเฉลี่ยรวมของแต่ละอารมณ์เปลี่ยนหลังตัดรีวิว -> จัดอันดับใหม่ให้ตรงกับชุด train
+        mood_stats.rerank()
+        dataset = {
+            'eligible_users': len(eligible),
+            'sampled_users': len(users),
+            'heldout_reviews': heldout_total,
+            'reviews': Review.objects.count(),
+            'favorites': Favorite.objects.count(),
+            'bookmarks': Bookmark.objects.count(),
+        }
+        return cases, dataset
+
+    def build(self, name, options, tmp_dir):
+        if name == 'popular':
+            return PopularRecommender()
+        if name == 'mood_leaderboard':
+            return MoodLeaderboardRecommender()
+        if name == 'similar_mood':
+            return SimilarMoodRecommender()
+        return ALSRecommender(tmp_dir / 'als.npz', factors=options['als_factors'],
+                              iterations=options['als_iterations'], seed=options['seed'])
+
+    def print_result(self, name, result, k):
+        latency = result['latency']
+        self.stdout.write(
+            f"{name:18} P@{k}={result[f'precision@{k}']:.4f} R@{k}={result[f'recall@{k}']:.4f} "
+            f"NDCG@{k}={result[f'ndcg@{k}']:.4f} p50={latency.get('p50_ms', 0):.2f}ms "
+            f"p95={latency.get('p95_ms', 0):.2f}ms queries={result['queries']['mean']}"
+        )
+
+    def git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, timeout=5, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return None
@@ -0,0 +1,254 @@
+# movies/management/commands/generate_synthetic_data.py
+"""
+สร้างข้อมูลจำลองปริมาณมาก (ผู้ใช้, หนัง, รีวิว, คะแนนอารมณ์, Favorite, Bookmark, CustomList) ไว้ทดสอบ scale
+
+- ความนิยมของหนังเป็น power law (Zipf) หนังดังไม่กี่เรื่องได้ interaction ส่วนใหญ่
+- หนังแต่ละเรื่องมี mood profile เด่นไม่กี่อารมณ์ คะแนนในรีวิวจึงเบ้ไปทางอารมณ์นั้น ๆ
+- ใช้ bulk_create ทีละ --batch-size แถว และ seed ได้ (รันซ้ำด้วย seed เดิมได้ข้อมูลเหมือนเดิม)
+- bulk_create ไม่ส่ง post_save เลยสร้าง Profile ให้ผู้ใช้เองแบบ bulk (ไม่ต้องผ่าน signal ทีละแถว)
+- จบแล้วคำนวณ MovieMoodStats และอันดับตามอารมณ์ใหม่ให้ตรงกับข้อมูล
+
+    python manage.py generate_synthetic_data --users 10000 --movies 50000 --reviews-per-user 30
+"""
+import datetime
+import time
+from contextlib import contextmanager
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from movies.models import (
+    MOOD_EMOJIS, Bookmark, CustomList, Favorite, Genre, Mood, Movie, Profile, Review, ReviewMoodScore,
+)
+from movies.mood_stats import rebuild_mood_stats, rerank
+from movies.moods import mood_registry
+
+# tmdb_id ของหนังจำลองเริ่มที่เลขนี้ ไม่ชนกับ TMDb จริงและหนังจำลองของ tmdb_standin
+SYNTHETIC_TMDB_BASE = 1_500_000_000
+
+# อารมณ์ตั้งต้นเมื่อยังไม่มีใน DB ใช้ชื่อเดียวกับที่ Mood.emoji รู้จัก หน้าเว็บจะได้มี emoji ครบ
+DEFAULT_MOODS = [name for name, _ in MOOD_EMOJIS]
+
+
+@contextmanager
+def explicit_created_at(*models):
+    """ปิด auto_now_add ชั่วคราว จะได้กำหนด created_at ย้อนหลังเองได้ (ข้อมูลมีไทม์ไลน์สมจริง)"""
+    fields = [model._meta.get_field('created_at') for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = 'สร้างข้อมูลจำลองจำนวนมากสำหรับทดสอบ scale (bulk_create, seed ได้, ความนิยมแบบ power law)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--movies', type=int, default=5000)
+        parser.add_argument('--reviews-per-user', type=float, default=20, help='ค่าเฉลี่ยจำนวนรีวิวต่อคน')
+        parser.add_argument('--favorites-per-user', type=float, default=5)
+        parser.add_argument('--bookmarks-per-user', type=float, default=5)
+        parser.add_argument('--lists-per-user', type=float, default=0.5)
+        parser.add_argument('--list-size', type=int, default=10)
+        parser.add_argument('--zipf', type=float, default=1.1, help='ความเบ้ของความนิยม (ยิ่งมากหนังดังยิ่งกินส่วนแบ่ง)')
+        parser.add_argument('--days', type=int, default=365, help='กระจายวันที่รีวิวย้อนหลังกี่วัน')
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--user-chunk', type=int, default=2000, help='จำนวนผู้ใช้ที่สร้าง interaction ต่อรอบ')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='synth', help='คำนำหน้า username ของผู้ใช้จำลอง')
+        parser.add_argument('--skip-stats', action='store_true', help='ไม่ต้องคำนวณ MovieMoodStats ตอนจบ')
+
+    def handle(self, *args, **options):
+        self.rng = np.random.default_rng(options['seed'])
+        self.batch_size = options['batch_size']
+        self.started = time.monotonic()
+        self.now = timezone.now()
+
+        if User.objects.filter(username__startswith=f"{options['prefix']}_").exists():
+            raise CommandError(f"มีผู้ใช้ {options['prefix']}_* อยู่แล้ว ใช้ --prefix อื่นหรือลบของเดิมก่อน")
+
+        self.moods = self.ensure_moods()
+        self.movie_ids = self.create_movies(options['movies'])
+        self.popularity = self.zipf_weights(len(self.movie_ids), options['zipf'])
+        self.profiles = self.mood_profiles(len(self.movie_ids), len(self.moods))
+        user_ids = self.create_users(options['users'], options['prefix'])
+
+        counts = {'reviews': 0, 'mood_scores': 0, 'favorites': 0, 'bookmarks': 0, 'lists': 0, 'list_items': 0}
+        chunk = options['user_chunk']
+        with explicit_created_at(Review, Favorite, Bookmark, CustomList):
+            for start in range(0, len(user_ids), chunk):
+                users = user_ids[start:start + chunk]
+                with transaction.atomic():
+                    reviews, scores = self.create_reviews(users, options['reviews_per_user'], options['days'])
+                    counts['reviews'] += reviews
+                    counts['mood_scores'] += scores
+                    counts['favorites'] += self.create_pairs(Favorite, users, options['favorites_per_user'], options['days'])
+                    counts['bookmarks'] += self.create_pairs(Bookmark, users, options['bookmarks_per_user'], options['days'])
+                    lists, items = self.create_lists(users, options['lists_per_user'], options['list_size'], options['days'])
+                    counts['lists'] += lists
+                    counts['list_items'] += items
+                self.log(f"ผู้ใช้ {min(start + chunk, len(user_ids))}/{len(user_ids)}: " +
+                         ', '.join(f"{k} {v}" for k, v in counts.items()))
+
+        if not options['skip_stats']:
+            rows = rebuild_mood_stats()
+            rerank()
+            self.log(f"คำนวณ MovieMoodStats {rows} แถว และจัดอันดับตามอารมณ์ใหม่แล้ว")
+
+        self.stdout.write(self.style.SUCCESS(f"เสร็จแล้วใน {time.monotonic() - self.started:.1f}s"))
+
+    def log(self, message):
+        self.stdout.write(f"[{time.monotonic() - self.started:7.1f}s] {message}")
+
+    # ---------- การแจกแจง ----------
+
+    def zipf_weights(self, n, exponent):
+        """ความน่าจะเป็นที่หนังอันดับ r จะถูกเลือก ∝ 1 / r^exponent (สลับลำดับให้ไม่ผูกกับ id)"""
+        weights = 1.0 / np.arange(1, n + 1) ** exponent
+        self.rng.shuffle(weights)
+        return weights / weights.sum()
+
+    def mood_profiles(self, n_movies, n_moods):
+        """mood profile ของหนังแต่ละเรื่อง (0-1) ให้มีอารมณ์เด่น 1-3 อย่าง ที่เหลือจาง ๆ"""
+        profiles = self.rng.dirichlet(np.full(n_moods, 0.3), size=n_movies)
+        return profiles / profiles.max(axis=1, keepdims=True)
+
+    def sample_counts(self, n, mean):
+        return self.rng.poisson(mean, size=n) if mean > 0 else np.zeros(n, dtype=np.int64)
+
+    def sample_pairs(self, users, mean):
+        """สุ่ม (user_id, movie ดัชนี) ตามความนิยม ไม่ซ้ำกันในผู้ใช้คนเดียว"""
+        counts = self.sample_counts(len(users), mean)
+        user_index = np.repeat(np.arange(len(users)), counts)
+        movie_index = self.rng.choice(len(self.movie_ids), size=len(user_index), p=self.popularity)
+        keys = np.unique(user_index.astype(np.int64) * len(self.movie_ids) + movie_index)
+        return np.asarray(users)[keys // len(self.movie_ids)], keys % len(self.movie_ids)
+
+    def random_times(self, n, days):
+        seconds = self.rng.uniform(0, days * 86400, size=n)
+        return [self.now - datetime.timedelta(seconds=float(s)) for s in seconds]
+
+    # ---------- สร้างข้อมูล ----------
+
+    def ensure_moods(self):
+        moods = list(Mood.objects.order_by('id'))
+        if not moods:
+            Mood.objects.bulk_create([Mood(name=name) for name in DEFAULT_MOODS])
+            mood_registry.invalidate()  # bulk_create ไม่ส่ง signal
+            moods = list(Mood.objects.order_by('id'))
+        return [mood.id for mood in moods]
+
+    def create_movies(self, n):
+        start = max(Movie.objects.aggregate(m=Max('tmdb_id'))['m'] or 0, SYNTHETIC_TMDB_BASE) + 1
+        release = self.rng.integers(0, 365 * 40, size=n)
+        votes = np.round(self.rng.normal(6.5, 1.2, size=n).clip(1, 10), 1)
+        base_date = datetime.date(1985, 1, 1)
+        Movie.objects.bulk_create((
+            Movie(
+                tmdb_id=start + i,
+                title=f"Synthetic Movie {start + i}",
+                poster_path=f"/synthetic_{start + i}.jpg",
+                overview='หนังจำลองสำหรับทดสอบ scale',
+                release_date=base_date + datetime.timedelta(days=int(release[i])),
+                vote_average=float(votes[i]),
+                runtime=int(self.rng.integers(80, 180)),
+                last_synced_at=self.now,
+            ) for i in range(n)
+        ), batch_size=self.batch_size)
+        movie_ids = np.array(Movie.objects.filter(tmdb_id__gte=start, tmdb_id__lt=start + n)
+                             .order_by('tmdb_id').values_list('id', flat=True), dtype=np.int64)
+
+        genre_ids = list(Genre.objects.values_list('id', flat=True))
+        if genre_ids:
+            Through = Movie.genres.through
+            picks = self.rng.choice(genre_ids, size=(n, min(2, len(genre_ids))))
+            Through.objects.bulk_create((
+                Through(movie_id=int(movie_ids[i]), genre_id=int(g))
+                for i in range(n) for g in set(picks[i].tolist())
+            ), batch_size=self.batch_size, ignore_conflicts=True)
+        self.log(f"สร้างหนัง {n} เรื่อง")
+        return movie_ids
+
+    def create_users(self, n, prefix):
+        # hash รหัสผ่านครั้งเดียวใช้ร่วมกัน (hash ทีละคนช้ามาก) ทุกคนล็อกอินด้วยรหัส 'synthetic'
+        password = make_password('synthetic')
+        User.objects.bulk_create((
+            User(username=f"{prefix}_{i}", email=f"{prefix}_{i}@example.com", password=password)
+            for i in range(n)
+        ), batch_size=self.batch_size)
+        user_ids = list(User.objects.filter(username__startswith=f"{prefix}_")
+                        .order_by('id').values_list('id', flat=True))
+        # bulk_create ไม่ส่ง post_save -> สร้าง Profile ให้ครบเองในครั้งเดียว
+        Profile.objects.bulk_create((Profile(user_id=user_id) for user_id in user_ids), batch_size=self.batch_size)
+        self.log(f"สร้างผู้ใช้ {len(user_ids)} คน พร้อม Profile")
+        return user_ids
+
+    def create_reviews(self, users, mean, days):
+        user_ids, movie_index = self.sample_pairs(users, mean)
+        if not len(user_ids):
+            return 0, 0
+        created_at = self.random_times(len(user_ids), days)
+        reviews = Review.objects.bulk_create([
+            Review(user_id=int(u), movie_id=int(self.movie_ids[m]), comment='', created_at=created_at[i])
+            for i, (u, m) in enumerate(zip(user_ids, movie_index))
+        ], batch_size=self.batch_size)
+        review_ids = self.created_ids(Review, reviews, user_id__in=users)
+
+        # คะแนน = profile ของหนัง * 5 * ความอินของผู้ใช้ + noise แล้วปัดเป็น 0-5 (เก็บเฉพาะ > 0 เหมือนหน้าเว็บ)
+        enthusiasm = self.rng.uniform(0.6, 1.2, size=(len(review_ids), 1))
+        noise = self.rng.normal(0, 0.8, size=(len(review_ids), len(self.moods)))
+        intensity = np.clip(np.rint(self.profiles[movie_index] * 5 * enthusiasm + noise), 0, 5).astype(np.int64)
+        rows, cols = np.nonzero(intensity)
+        mood_ids = self.moods
+        ReviewMoodScore.objects.bulk_create((
+            ReviewMoodScore(review_id=int(review_ids[r]), mood_id=mood_ids[c], intensity=int(intensity[r, c]))
+            for r, c in zip(rows.tolist(), cols.tolist())
+        ), batch_size=self.batch_size)
+        return len(review_ids), len(rows)
+
+    def created_ids(self, model, objects, **filters):
+        """id ของแถวที่เพิ่ง bulk_create (backend ที่คืน pk ไม่ได้จะอ่านกลับจาก DB ตามลำดับที่สร้าง)"""
+        if objects and objects[0].pk is not None:
+            return np.array([obj.pk for obj in objects], dtype=np.int64)
+        ids = list(model.objects.filter(**filters).order_by('-id').values_list('id', flat=True)[:len(objects)])
+        return np.array(ids[::-1], dtype=np.int64)
+
+    def create_pairs(self, model, users, mean, days):
+        user_ids, movie_index = self.sample_pairs(users, mean)
+        created_at = self.random_times(len(user_ids), days)
+        model.objects.bulk_create((
+            model(user_id=int(u), movie_id=int(self.movie_ids[m]), created_at=created_at[i])
+            for i, (u, m) in enumerate(zip(user_ids, movie_index))
+        ), batch_size=self.batch_size, ignore_conflicts=True)
+        return len(user_ids)
+
+    def create_lists(self, users, mean, size, days):
+        counts = self.sample_counts(len(users), mean)
+        owners = np.repeat(np.asarray(users), counts)
+        if not len(owners):
+            return 0, 0
+        created_at = self.random_times(len(owners), days)
+        lists = CustomList.objects.bulk_create([
+            CustomList(user_id=int(owner), name=f"Synthetic list {i + 1}", is_public=bool(i % 3),
+                       created_at=created_at[i])
+            for i, owner in enumerate(owners)
+        ], batch_size=self.batch_size)
+        list_ids = self.created_ids(CustomList, lists, user_id__in=users)
+
+        movie_index = self.rng.choice(len(self.movie_ids), size=(len(list_ids), size), p=self.popularity)
+        Through = CustomList.movies.through
+        items = [
+            Through(customlist_id=int(list_id), movie_id=int(self.movie_ids[m]))
+            for list_id, row in zip(list_ids.tolist(), movie_index) for m in set(row.tolist())
+        ]
+        Through.objects.bulk_create(items, batch_size=self.batch_size, ignore_conflicts=True)
+        return len(list_ids), len(items)
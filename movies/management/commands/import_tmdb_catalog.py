@@ -0,0 +1,168 @@
+# movies/management/commands/import_tmdb_catalog.py
+"""
+ดึงหนังจาก TMDb (หน้า popular/discover) หรือไฟล์ JSONL มาเก็บในตาราง Movie ทีละหลายพันแถว
+ใช้ bulk_create(update_conflicts=True) บน tmdb_id -> INSERT ... ON CONFLICT DO UPDATE
+
+ตัวอย่าง:
+    python manage.py import_tmdb_catalog --source popular --pages 500
+    python manage.py import_tmdb_catalog --source discover --pages 500 --resume
+    python manage.py import_tmdb_catalog --jsonl dump.jsonl --batch-size 5000
+"""
+import json
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from movies.fragments import bump_movie_version
+from movies.models import Movie
+from movies.ratelimit import rate_limit_lane, BACKGROUND
+from movies.tmdb import get_client, TMDbError
+from movies.utils import movie_fields_from_tmdb, genres_from_tmdb, bulk_set_movie_genres
+
+UPDATE_FIELDS = ['title', 'poster_path', 'overview', 'release_date', 'vote_average']
+
+# TMDb ให้ดึงได้ไม่เกินหน้า 500 ต่อ query
+TMDB_MAX_PAGE = 500
+
+
+class Command(BaseCommand):
+    help = 'นำเข้าหนังจำนวนมากจาก TMDb หรือไฟล์ JSONL เข้าตาราง Movie แบบ batch upsert (resume ได้)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', choices=['popular', 'discover'], default='popular')
+        parser.add_argument('--jsonl', help='อ่านจากไฟล์ JSONL (1 บรรทัด = หนัง 1 เรื่องแบบ TMDb) แทนการยิง API')
+        parser.add_argument('--pages', type=int, default=50, help='จำนวนหน้าสูงสุดที่จะดึงจาก TMDb')
+        parser.add_argument('--batch-size', type=int, default=2000, help='จำนวนแถวต่อการ upsert หนึ่งครั้ง')
+        parser.add_argument('--checkpoint', help='ไฟล์ checkpoint (ค่าเริ่มต้นอยู่ใน var/)')
+        parser.add_argument('--resume', action='store_true', help='ทำต่อจาก checkpoint ล่าสุด')
+
+    def handle(self, *args, **options):
+        # งานเบื้องหลังใช้เลน background ให้ request จากผู้ใช้ได้ token ก่อน
+        with rate_limit_lane(BACKGROUND):
+            self.run(**options)
+
+    def run(self, **options):
+        source = 'jsonl' if options['jsonl'] else options['source']
+        checkpoint_path = Path(options['checkpoint'] or settings.BASE_DIR / 'var' / f'import_tmdb_{source}.json')
+        state = self.load_checkpoint(checkpoint_path) if options['resume'] else {}
+
+        self.batch_size = options['batch_size']
+        self.checkpoint_path = checkpoint_path
+        self.pending = []
+        self.pending_genres = {}
+        self.total = state.get('rows', 0)
+        self.started = time.monotonic()
+        self.rows_this_run = 0
+
+        if source == 'jsonl':
+            self.import_jsonl(Path(options['jsonl']), state.get('line', 0))
+        else:
+            self.import_pages(source, state.get('page', 0) + 1, options['pages'])
+
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(self.style.SUCCESS(
+            f"เสร็จแล้ว: upsert {self.rows_this_run} แถวในรอบนี้ (รวม {self.total}) "
+            f"ใช้เวลา {elapsed:.1f}s ({self.rows_this_run / elapsed if elapsed else 0:.0f} แถว/วินาที)"
+        ))
+
+    # ---------- แหล่งข้อมูล ----------
+
+    def import_pages(self, source, start_page, max_pages):
+        path = 'movie/popular' if source == 'popular' else 'discover/movie'
+        params = {} if source == 'popular' else {'sort_by': 'popularity.desc', 'include_adult': 'false'}
+        client = get_client()
+
+        last_page = min(max_pages, TMDB_MAX_PAGE)
+        page = start_page
+        while page <= last_page:
+            try:
+                data = client.get(path, {**params, 'page': page}, use_cache=False)
+            except TMDbError as e:
+                self.flush({'page': page - 1})
+                raise CommandError(f"หยุดที่หน้า {page}: {e} (ใช้ --resume เพื่อทำต่อ)")
+
+            for item in data.get('results', []):
+                self.add(item)
+            last_page = min(last_page, data.get('total_pages', last_page))
+
+            # checkpoint เฉพาะตอน flush จริง จะได้ไม่บันทึกหน้าที่ยังไม่ลง DB
+            if len(self.pending) >= self.batch_size:
+                self.flush({'page': page})
+            page += 1
+
+        self.flush({'page': last_page})
+
+    def import_jsonl(self, path, skip_lines):
+        if not path.exists():
+            raise CommandError(f"ไม่พบไฟล์ {path}")
+        line_no = 0
+        with open(path, encoding='utf-8') as f:
+            for line_no, line in enumerate(f, start=1):
+                if line_no <= skip_lines or not line.strip():
+                    continue
+                try:
+                    self.add(json.loads(line))
+                except (ValueError, KeyError) as e:
+                    self.stderr.write(f"ข้ามบรรทัด {line_no}: {e}")
+                    continue
+                if len(self.pending) >= self.batch_size:
+                    self.flush({'line': line_no})
+        self.flush({'line': max(line_no, skip_lines)})
+
+    # ---------- เขียนลง DB ----------
+
+    def add(self, item):
+        fields = movie_fields_from_tmdb(item)
+        if fields['title']:
+            self.pending.append(Movie(**fields))
+            self.pending_genres[fields['tmdb_id']] = genres_from_tmdb(item)
+
+    def flush(self, position):
+        if self.pending:
+            # กันกรณี batch เดียวมี tmdb_id ซ้ำ (ON CONFLICT อัปเดตแถวเดียวกันซ้ำสองครั้งไม่ได้)
+            unique = {m.tmdb_id: m for m in self.pending}
+            with transaction.atomic():
+                # แถวที่มีอยู่แล้วจะถูกเขียนทับ fragment ของหน้า detail ที่ cache ไว้ต้องเปลี่ยนเวอร์ชันตาม
+                existing = set(Movie.objects.filter(tmdb_id__in=unique).values_list('id', flat=True))
+                Movie.objects.bulk_create(
+                    unique.values(),
+                    batch_size=self.batch_size,
+                    update_conflicts=True,
+                    unique_fields=['tmdb_id'],
+                    update_fields=UPDATE_FIELDS,
+                )
+                # แถวที่ชนกันจะไม่ได้ pk กลับมาทุก backend เลยอ่าน pk จาก tmdb_id อีกรอบ
+                pks = dict(Movie.objects.filter(tmdb_id__in=unique).values_list('tmdb_id', 'id'))
+                bulk_set_movie_genres({pks[tmdb_id]: genres for tmdb_id, genres in self.pending_genres.items()})
+                for pk in existing:
+                    bump_movie_version(pk)
+            self.total += len(unique)
+            self.rows_this_run += len(unique)
+            self.pending = []
+            self.pending_genres = {}
+
+            elapsed = time.monotonic() - self.started
+            self.stdout.write(
+                f"{position} upsert แล้ว {self.total} แถว "
+                f"({self.rows_this_run / elapsed if elapsed else 0:.0f} แถว/วินาที)"
+            )
+        self.save_checkpoint({**position, 'rows': self.total})
+
+    def load_checkpoint(self, path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        self.stdout.write(f"ทำต่อจาก checkpoint {path}: {state}")
+        return state
+
+    def save_checkpoint(self, state):
+        self.checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.checkpoint_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        tmp_path.replace(self.checkpoint_path)
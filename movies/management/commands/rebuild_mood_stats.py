@@ -0,0 +1,32 @@
+# movies/management/commands/rebuild_mood_stats.py
+"""
+สร้างตาราง MovieMoodStats ใหม่จาก ReviewMoodScore ทั้งหมด (หรือเฉพาะหนังที่ระบุ)
+ใช้ตอนติดตั้งครั้งแรก หรือเมื่อสงสัยว่าตัวเลขที่อัปเดตทีละส่วนเพี้ยนไป
+
+    python manage.py rebuild_mood_stats
+    python manage.py rebuild_mood_stats --movie 550 --movie 603
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from movies.mood_stats import rebuild_mood_stats
+from movies.resolver import movie_resolver
+
+
+class Command(BaseCommand):
+    help = 'คำนวณตารางสรุปคะแนนอารมณ์ (MovieMoodStats) ใหม่จากรีวิวทั้งหมด'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movie', type=int, action='append', dest='tmdb_ids',
+                            help='tmdb_id ของหนังที่จะคำนวณใหม่ (ระบุได้หลายครั้ง ไม่ระบุ = ทุกเรื่อง)')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        movie_ids = None
+        if options['tmdb_ids']:
+            movie_ids = list(movie_resolver.resolve_pks(options['tmdb_ids']).values())
+        rows = rebuild_mood_stats(movie_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f"สร้าง MovieMoodStats ใหม่ {rows} แถว ใช้เวลา {time.monotonic() - started:.1f}s"
+        ))
@@ -0,0 +1,32 @@
+# movies/management/commands/rerank_moods.py
+"""
+คำนวณค่าเฉลี่ยรวมของแต่ละอารมณ์ (C) ใหม่ แล้วจัดอันดับ weighted_score ของหนังทุกเรื่องในอารมณ์นั้นใหม่
+คะแนนที่อัปเดตทีละรีวิวใช้ C ของรอบล่าสุด ค่าจะค่อย ๆ คลาดเมื่อค่าเฉลี่ยรวมเปลี่ยน ให้ตั้ง cron รันคำสั่งนี้เป็นระยะ
+
+    python manage.py rerank_moods
+    python manage.py rerank_moods --mood 3
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from movies.models import Mood
+from movies.mood_stats import rerank
+
+
+class Command(BaseCommand):
+    help = 'คำนวณ C ของแต่ละอารมณ์ใหม่และจัดอันดับหนังแนะนำตามอารมณ์ใหม่'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mood', type=int, action='append', dest='mood_ids',
+                            help='id ของอารมณ์ที่จะจัดอันดับใหม่ (ระบุได้หลายครั้ง ไม่ระบุ = ทุกอารมณ์)')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        priors = rerank(options['mood_ids'])
+        names = dict(Mood.objects.filter(id__in=priors).values_list('id', 'name'))
+        for mood_id, prior in priors.items():
+            self.stdout.write(f"{names.get(mood_id, mood_id)}: C = {prior:.2f}")
+        self.stdout.write(self.style.SUCCESS(
+            f"จัดอันดับใหม่ {len(priors)} อารมณ์ ใช้เวลา {time.monotonic() - started:.1f}s"
+        ))
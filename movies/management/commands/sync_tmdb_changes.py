@@ -0,0 +1,164 @@
+# movies/management/commands/sync_tmdb_changes.py
+"""
+อัปเดตข้อมูลหนังใน DB ให้ตรงกับ TMDb แบบเฉพาะส่วนที่เปลี่ยน
+
+- --mode changes (ค่าเริ่มต้น): อ่าน /movie/changes ตั้งแต่รอบที่แล้ว แล้ว refresh เฉพาะหนังที่เรามีและมีการเปลี่ยน
+  ถ้า --limit ตัดรายการ เรื่องที่เหลือจะเก็บไว้ใน checkpoint (pending) แล้วรอบหน้าทำต่อ
+- --mode stale: refresh หนังที่ last_synced_at เก่ากว่า --stale-hours (หรือยังไม่เคย sync)
+
+ตั้ง cron ไว้รันทุกชั่วโมง/ทุกวันก็พอ หน้า detail จะได้อ่านจาก DB อย่างเดียว
+"""
+import datetime
+import json
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+
+from movies.fragments import bump_movie_version
+from movies.models import Movie
+from movies.ratelimit import rate_limit_lane, BACKGROUND
+from movies.tmdb import get_client, TMDbError, TMDbNotFound
+from movies.utils import movie_fields_from_tmdb, genres_from_tmdb, bulk_set_movie_genres, SYNC_FIELDS
+
+# TMDb ให้ดู changes ย้อนหลังได้ไม่เกิน 14 วันต่อ request
+MAX_CHANGES_DAYS = 14
+
+
+class Command(BaseCommand):
+    help = 'Sync ข้อมูลหนังจาก TMDb เฉพาะเรื่องที่เปลี่ยนหรือข้อมูลเก่า (batch bulk_update)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=['changes', 'stale'], default='changes')
+        parser.add_argument('--days', type=int, help='(changes) ย้อนหลังกี่วัน ถ้าไม่ระบุจะเริ่มจากรอบที่แล้ว')
+        parser.add_argument('--stale-hours', type=float,
+                            help='(stale) refresh แถวที่เก่ากว่านี้ (ค่าเริ่มต้นตาม TMDB_SYNC_MAX_AGE)')
+        parser.add_argument('--limit', type=int, help='จำนวนหนังสูงสุดที่จะ refresh ในรอบนี้')
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--checkpoint', help='ไฟล์เก็บวันที่ sync ล่าสุด (ค่าเริ่มต้นอยู่ใน var/)')
+
+    def handle(self, *args, **options):
+        # งานเบื้องหลังใช้เลน background ให้ request จากผู้ใช้ได้ token ก่อน
+        with rate_limit_lane(BACKGROUND):
+            self.run(**options)
+
+    def run(self, **options):
+        self.client = get_client()
+        self.batch_size = options['batch_size']
+        self.started = time.monotonic()
+        self.refreshed = 0
+        self.missing = 0
+
+        if options['mode'] == 'changes':
+            checkpoint = Path(options['checkpoint'] or settings.BASE_DIR / 'var' / 'sync_tmdb_changes.json')
+            today = timezone.localdate()
+            state = self.load_checkpoint(checkpoint)
+            start_date = self.get_start_date(state, today, options['days'])
+            # เรื่องที่รอบก่อนค้างไว้เพราะ --limit ต้องทำต่อ ถึง changes ช่วงใหม่จะไม่มีแล้วก็ตาม
+            changed_ids = self.fetch_changed_ids(start_date, today) | set(state.get('pending', []))
+            self.stdout.write(f"TMDb แจ้งว่ามี {len(changed_ids)} เรื่องเปลี่ยนตั้งแต่ {start_date}")
+            queryset = Movie.objects.filter(tmdb_id__in=changed_ids)
+        else:
+            max_age = options['stale_hours'] * 3600 if options['stale_hours'] is not None \
+                else getattr(settings, 'TMDB_SYNC_MAX_AGE', 24 * 3600)
+            cutoff = timezone.now() - datetime.timedelta(seconds=max_age)
+            queryset = Movie.objects.filter(Q(last_synced_at__isnull=True) | Q(last_synced_at__lt=cutoff))
+
+        queryset = queryset.order_by('last_synced_at', 'id')
+        pending = []
+        if options['limit']:
+            if options['mode'] == 'changes':
+                pending = list(queryset.values_list('tmdb_id', flat=True)[options['limit']:])
+            queryset = queryset[:options['limit']]
+        self.refresh(queryset)
+
+        if options['mode'] == 'changes':
+            # เลื่อนวันที่ได้เสมอ เรื่องที่ --limit ตัดออกไปเก็บไว้ใน pending ให้รอบหน้าทำต่อ
+            if pending:
+                self.stdout.write(f"เหลือ {len(pending)} เรื่องที่ยังไม่ได้ refresh เก็บไว้ทำรอบหน้า")
+            self.save_checkpoint(checkpoint, {'last_run': today.isoformat(), 'pending': pending})
+
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(self.style.SUCCESS(
+            f"อัปเดต {self.refreshed} เรื่อง (ไม่พบใน TMDb {self.missing}) ใช้เวลา {elapsed:.1f}s"
+        ))
+
+    # ---------- changes feed ----------
+
+    def load_checkpoint(self, path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return state if isinstance(state, dict) else {}
+
+    def get_start_date(self, state, today, days):
+        if days:
+            return today - datetime.timedelta(days=min(days, MAX_CHANGES_DAYS))
+        try:
+            last_run = datetime.date.fromisoformat(state['last_run'])
+        except (TypeError, ValueError, KeyError):
+            return today - datetime.timedelta(days=1)
+        return max(last_run, today - datetime.timedelta(days=MAX_CHANGES_DAYS))
+
+    def fetch_changed_ids(self, start_date, end_date):
+        ids = set()
+        page, total_pages = 1, 1
+        while page <= total_pages:
+            try:
+                data = self.client.get('movie/changes', {
+                    'start_date': start_date.isoformat(),
+                    'end_date': end_date.isoformat(),
+                    'page': page,
+                }, use_cache=False)
+            except TMDbError as e:
+                raise CommandError(f"อ่าน movie/changes หน้า {page} ไม่สำเร็จ: {e}")
+            ids.update(item['id'] for item in data.get('results', []) if not item.get('adult'))
+            total_pages = data.get('total_pages', 1)
+            page += 1
+        return ids
+
+    def save_checkpoint(self, path, state):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+
+    # ---------- refresh ----------
+
+    def refresh(self, queryset):
+        batch = []
+        for movie in queryset.iterator(chunk_size=self.batch_size):
+            try:
+                data = self.client.get(f'movie/{movie.tmdb_id}', endpoint='movie/{id}', use_cache=False)
+            except TMDbNotFound:
+                self.missing += 1
+                continue
+            except TMDbError as e:
+                self.flush(batch)
+                raise CommandError(f"หยุดที่ tmdb_id={movie.tmdb_id}: {e}")
+
+            fields = movie_fields_from_tmdb(data, detail=True)
+            for field in SYNC_FIELDS:
+                setattr(movie, field, fields[field])
+            movie.last_synced_at = timezone.now()
+            batch.append(movie)
+
+            if len(batch) >= self.batch_size:
+                self.flush(batch)
+                batch = []
+        self.flush(batch)
+
+    def flush(self, batch):
+        if not batch:
+            return
+        Movie.objects.bulk_update(batch, SYNC_FIELDS + ['last_synced_at'], batch_size=self.batch_size)
+        bulk_set_movie_genres({movie.pk: genres_from_tmdb(movie.tmdb_payload) for movie in batch})
+        for movie in batch:
+            bump_movie_version(movie.pk)
+        self.refreshed += len(batch)
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(f"อัปเดตแล้ว {self.refreshed} เรื่อง ({self.refreshed / elapsed if elapsed else 0:.0f} เรื่อง/วินาที)")
@@ -0,0 +1,57 @@
+# movies/management/commands/tmdb_standin.py
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import make_server, WSGIServer, WSGIRequestHandler
+
+from django.core.management.base import BaseCommand
+
+from movies.tmdb_standin import TMDbStandIn
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = 'รัน TMDb จำลองจากข้อมูลที่บันทึกไว้ (ใช้ benchmark/ทดสอบแบบไม่ต่อเน็ต)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8001)
+        parser.add_argument('--latency-ms', type=float, default=0, help='หน่วงเวลาทุก request (ms)')
+        parser.add_argument('--jitter-ms', type=float, default=0, help='สุ่มบวก/ลบจาก latency (ms)')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='สัดส่วน request ที่ตอบ 5xx (0-1)')
+        parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='สัดส่วน request ที่ตอบ 429 (0-1)')
+        parser.add_argument('--synthetic-per-day', type=int, default=3,
+                            help='จำนวนหนังจำลองสูงสุดต่อวันใน discover แบบช่วงวันที่ (0 = ปิด)')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--verbose-log', action='store_true', help='แสดง access log')
+
+    def handle(self, *args, **options):
+        app = TMDbStandIn(
+            latency_ms=options['latency_ms'],
+            jitter_ms=options['jitter_ms'],
+            error_rate=options['error_rate'],
+            rate_limit_rate=options['rate_limit_rate'],
+            synthetic_per_day=options['synthetic_per_day'],
+            seed=options['seed'],
+        )
+        handler = WSGIRequestHandler if options['verbose_log'] else QuietHandler
+        server = make_server(options['host'], options['port'], app,
+                             server_class=ThreadingWSGIServer, handler_class=handler)
+        self.stdout.write(self.style.SUCCESS(
+            f"TMDb stand-in on http://{options['host']}:{options['port']}/3 "
+            f"({len(app.movies)} movies, latency={options['latency_ms']}ms, "
+            f"errors={options['error_rate']}, 429={options['rate_limit_rate']})"
+        ))
+        self.stdout.write(f"ตั้ง TMDB_BASE_URL=http://{options['host']}:{options['port']}/3 แล้วรันเว็บได้เลย")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0007_alter_review_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='last_synced_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Avg, Count, Sum
+
+
+def fill_mood_stats(apps, schema_editor):
+    # เติมตารางสรุปจากรีวิวที่มีอยู่แล้ว
+    ReviewMoodScore = apps.get_model('movies', 'ReviewMoodScore')
+    MovieMoodStats = apps.get_model('movies', 'MovieMoodStats')
+    rows = ReviewMoodScore.objects.filter(intensity__gt=0).values('review__movie_id', 'mood_id').annotate(
+        total=Sum('intensity'), count=Count('id'), avg=Avg('intensity'),
+    )
+    MovieMoodStats.objects.bulk_create([
+        MovieMoodStats(
+            movie_id=row['review__movie_id'], mood_id=row['mood_id'],
+            score_sum=row['total'], score_count=row['count'], avg_intensity=row['avg'],
+        ) for row in rows
+    ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0009_genre_movie_runtime_tmdb_payload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovieMoodStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score_sum', models.IntegerField(default=0)),
+                ('score_count', models.IntegerField(default=0)),
+                ('avg_intensity', models.FloatField(default=0.0)),
+                ('mood', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movie_stats', to='movies.mood')),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mood_stats', to='movies.movie')),
+            ],
+            options={
+                'unique_together': {('movie', 'mood')},
+            },
+        ),
+        migrations.RunPython(fill_mood_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F, FloatField, Sum
+from django.db.models.functions import Cast
+
+
+def fill_leaderboard(apps, schema_editor):
+    # คำนวณ C ของแต่ละอารมณ์ และ weighted_score เริ่มต้น (m = 1, ไม่มีคะแนนเลยใช้ C = 5.0)
+    Mood = apps.get_model('movies', 'Mood')
+    MoodPrior = apps.get_model('movies', 'MoodPrior')
+    MovieMoodStats = apps.get_model('movies', 'MovieMoodStats')
+    totals = {
+        row['mood_id']: row for row in
+        MovieMoodStats.objects.values('mood_id').annotate(total=Sum('score_sum'), count=Sum('score_count'))
+    }
+    for mood_id in Mood.objects.values_list('id', flat=True):
+        row = totals.get(mood_id)
+        prior = row['total'] / row['count'] if row and row['count'] else 5.0
+        MoodPrior.objects.create(mood_id=mood_id, mean=prior)
+        MovieMoodStats.objects.filter(mood_id=mood_id).update(
+            weighted_score=(Cast('score_sum', FloatField()) + prior) / (F('score_count') + 1)
+        )
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0010_moviemoodstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MoodPrior',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mean', models.FloatField(default=5.0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='moviemoodstats',
+            name='weighted_score',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddIndex(
+            model_name='moviemoodstats',
+            index=models.Index(fields=['mood', '-weighted_score'], name='moodstats_leaderboard_idx'),
+        ),
+        migrations.AddField(
+            model_name='moodprior',
+            name='mood',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='prior', to='movies.mood'),
+        ),
+        migrations.RunPython(fill_leaderboard, migrations.RunPython.noop),
+    ]
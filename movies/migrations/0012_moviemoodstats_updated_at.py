@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0011_mood_leaderboard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='moviemoodstats',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0012_moviemoodstats_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bookmark',
+            index=models.Index(fields=['user', '-created_at'], name='bookmark_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customlist',
+            index=models.Index(fields=['user', '-created_at'], name='customlist_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customlist',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['user', '-created_at'], name='customlist_public_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['user', '-created_at'], name='favorite_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['movie', '-created_at'], name='review_movie_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['user', '-created_at'], name='review_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reviewmoodscore',
+            index=models.Index(condition=models.Q(('intensity__gt', 0)), fields=['mood', 'intensity', 'review'], name='moodscore_mood_intensity_idx'),
+        ),
+    ]
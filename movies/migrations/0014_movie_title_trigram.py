@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:02
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+INDEX_NAME = 'movie_title_trgm_idx'
+
+
+def create_trigram_index(apps, schema_editor):
+    # trigram GIN index สำหรับ title__icontains (admin_movies, ค้นหาตามอารมณ์) มีเฉพาะ PostgreSQL
+    # Django แปลง icontains เป็น UPPER("title"::text) LIKE UPPER('%...%') ที่ B-tree ใช้ไม่ได้
+    # เลยต้องสร้างบน expression เดียวกันเป๊ะ ๆ ไม่อย่างนั้น planner จะไม่เลือก / DB อื่นข้ามไป
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON movies_movie '
+        f'USING gin (UPPER(title::text) gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0013_hot_query_indexes'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
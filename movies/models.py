@@ -1,11 +1,24 @@
+import datetime
+import functools
+
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth.models import User
+from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
 # --- 1. Core Models ---
 
+class Genre(models.Model):
+    """ประเภทหนังตาม TMDb (เก็บไว้ให้กรองหนังตามประเภทใน DB ได้เอง)"""
+    tmdb_id = models.IntegerField(unique=True)
+    name = models.CharField(max_length=100)
+
+    def __str__(self):
+        return self.name
+
 class Movie(models.Model):
     tmdb_id = models.IntegerField(unique=True)
     title = models.CharField(max_length=255)
@@ -13,23 +26,46 @@ class Movie(models.Model):
     overview = models.TextField(null=True, blank=True)
     release_date = models.DateField(null=True, blank=True)
     vote_average = models.FloatField(default=0.0)
+    runtime = models.PositiveIntegerField(null=True, blank=True) # ความยาว (นาที)
+    genres = models.ManyToManyField(Genre, related_name='movies', blank=True)
+    # ข้อมูลดิบจาก /movie/{id} ล่าสุด เผื่อใช้ field อื่นโดยไม่ต้องเรียก TMDb ซ้ำ
+    tmdb_payload = models.JSONField(null=True, blank=True)
+    # เวลาที่ดึงรายละเอียดจาก TMDb มาอัปเดตล่าสุด (null = ยังไม่เคย sync)
+    last_synced_at = models.DateTimeField(null=True, blank=True, db_index=True)
 
     def __str__(self):
         return self.title
 
+    def needs_sync(self, max_age):
+        """ข้อมูลเก่ากว่า max_age (วินาที) หรือยังไม่เคย sync เลย"""
+        if self.last_synced_at is None:
+            return True
+        return timezone.now() - self.last_synced_at > datetime.timedelta(seconds=max_age)
+
+# emoji ตามคำในชื่ออารมณ์ (เช็กตามลำดับ เจอคำแรกก่อนใช้อันนั้น)
+MOOD_EMOJIS = (
+    ('Happy', '😊'),
+    ('Sad', '😭'),
+    ('Scary', '😨'),
+    ('Surprised', '😲'),
+    ('Heartwarming', '🥰'),
+    ('Tense', '😬'),
+    ('Funny', '🤣'),
+)
+
+@functools.lru_cache(maxsize=256)
+def mood_emoji(name):
+    for keyword, emoji in MOOD_EMOJIS:
+        if keyword in name:
+            return emoji
+    return '😐'
+
 class Mood(models.Model):
     name = models.CharField(max_length=50, unique=True)
 
     @property
     def emoji(self):
-        if 'Happy' in self.name: return '😊'
-        elif 'Sad' in self.name: return '😭'
-        elif 'Scary' in self.name: return '😨'
-        elif 'Surprised' in self.name: return '😲'
-        elif 'Heartwarming' in self.name: return '🥰'
-        elif 'Tense' in self.name: return '😬'
-        elif 'Funny' in self.name: return '🤣'
-        return '😐'
+        return mood_emoji(self.name)
 
     def __str__(self):
         return self.name
@@ -40,6 +76,13 @@ class Review(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reviews')
     comment = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # รีวิวของหนังเรื่องหนึ่งเรียงใหม่สุดก่อน แบ่งหน้าแบบ keyset (หน้า detail) / ของผู้ใช้หนึ่งคน (หน้าโปรไฟล์)
+            models.Index(fields=['movie', '-created_at', '-id'], name='review_movie_keyset_idx'),
+            models.Index(fields=['user', '-created_at'], name='review_user_created_idx'),
+        ]
     
     def __str__(self):
         return f"Review by {self.user.username} on {self.movie.title}"
@@ -58,6 +101,50 @@ class ReviewMoodScore(models.Model):
 
     class Meta:
         unique_together = ('review', 'mood')
+        indexes = [
+            # ค้นหาตามอารมณ์/สรุปคะแนนอ่านเฉพาะคะแนน > 0 ของ mood เดียว (partial index เล็กกว่าทั้งตาราง)
+            # ต่อท้ายด้วย review ให้ได้ review_id จาก index เลยไม่ต้องกลับไปอ่านตาราง
+            models.Index(fields=['mood', 'intensity', 'review'], condition=Q(intensity__gt=0),
+                         name='moodscore_mood_intensity_idx'),
+        ]
+
+class MovieMoodStats(models.Model):
+    """
+    สรุปคะแนนอารมณ์ของหนังแต่ละเรื่อง (denormalized จาก ReviewMoodScore ที่คะแนน > 0)
+    อัปเดตทีละส่วนตอนสร้าง/แก้/ลบรีวิว (ดู movies/mood_stats.py) หน้า detail จะได้อ่านแถวเดียวต่ออารมณ์
+    ถ้าข้อมูลเพี้ยน สร้างใหม่ได้ด้วย python manage.py rebuild_mood_stats
+    """
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='mood_stats')
+    mood = models.ForeignKey(Mood, on_delete=models.CASCADE, related_name='movie_stats')
+    score_sum = models.IntegerField(default=0)
+    score_count = models.IntegerField(default=0)
+    avg_intensity = models.FloatField(default=0.0)
+    # คะแนนจัดอันดับแบบ Weighted Rating (v*R + m*C) / (v + m) ใช้ C จาก MoodPrior ล่าสุด
+    weighted_score = models.FloatField(default=0.0)
+    # เวลาที่คะแนนเปลี่ยนล่าสุด ให้ index ความคล้ายของอารมณ์ (movies/similarity.py) ดึงเฉพาะแถวที่เปลี่ยน
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        unique_together = ('movie', 'mood')
+        indexes = [
+            # หน้าแนะนำตามอารมณ์อ่าน top-K ของ mood เดียวจาก index นี้ตรง ๆ
+            models.Index(fields=['mood', '-weighted_score'], name='moodstats_leaderboard_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.movie.title} / {self.mood.name}: {self.avg_intensity:.1f} ({self.score_count})"
+
+class MoodPrior(models.Model):
+    """
+    ค่าเฉลี่ยคะแนนรวมของแต่ละอารมณ์ (C ในสูตร Weighted Rating)
+    คำนวณใหม่เป็นรอบ ๆ ด้วย python manage.py rerank_moods แล้วจัดอันดับ weighted_score ใหม่ทั้ง mood
+    """
+    mood = models.OneToOneField(Mood, on_delete=models.CASCADE, related_name='prior')
+    mean = models.FloatField(default=5.0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.mood.name}: C={self.mean:.2f}"
 
 # --- 2. User Interactions ---
 
@@ -68,6 +155,10 @@ class Favorite(models.Model):
 
     class Meta:
         unique_together = ('user', 'movie')
+        indexes = [
+            # หน้าโปรไฟล์แสดงรายการล่าสุดของผู้ใช้
+            models.Index(fields=['user', '-created_at'], name='favorite_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} likes {self.movie.title}"
@@ -79,6 +170,10 @@ class Bookmark(models.Model):
 
     class Meta:
         unique_together = ('user', 'movie')
+        indexes = [
+            # หน้าโปรไฟล์แสดงรายการล่าสุดของผู้ใช้
+            models.Index(fields=['user', '-created_at'], name='bookmark_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} bookmarked {self.movie.title}"
@@ -91,6 +186,15 @@ class CustomList(models.Model):
     is_public = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # ลิสต์ของฉัน เรียงใหม่สุดก่อน
+            models.Index(fields=['user', '-created_at'], name='customlist_user_created_idx'),
+            # ลิสต์สาธารณะในหน้าโปรไฟล์คนอื่น (partial: Django ส่ง WHERE "is_public" เฉย ๆ
+            # ซึ่ง composite (user, is_public, ...) ใช้เป็นเงื่อนไขเท่ากับไม่ได้ในทุก DB)
+            models.Index(fields=['user', '-created_at'], condition=Q(is_public=True), name='customlist_public_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name} by {self.user.username}"
 
@@ -0,0 +1,160 @@
+# movies/mood_stats.py
+"""
+ดูแลตาราง MovieMoodStats (ผลรวม/จำนวน/ค่าเฉลี่ยคะแนนอารมณ์ต่อหนัง)
+
+ทุกครั้งที่คะแนนอารมณ์ของรีวิวเปลี่ยน ให้เรียก apply_score_changes() ด้วยคะแนนก่อน/หลัง
+ในรูป {mood_id: intensity} ระบบจะบวก/ลบเฉพาะส่วนต่างด้วย F() (ไม่ต้อง aggregate ใหม่ทั้งเรื่อง)
+นับเฉพาะคะแนน > 0 เหมือนที่ Radar Chart และหน้าแนะนำใช้
+
+weighted_score (สูตร Weighted Rating แบบ IMDb) ก็อัปเดตไปพร้อมกันโดยใช้ C ที่เก็บไว้ใน MoodPrior
+ส่วน C เองคำนวณใหม่เป็นรอบ ๆ ด้วย rerank() (python manage.py rerank_moods)
+"""
+from django.db import transaction
+from django.db.models import Avg, Case, Count, F, FloatField, IntegerField, Sum, Value, When
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .models import Mood, MoodPrior, Movie, MovieMoodStats, ReviewMoodScore
+
+# m = จำนวนรีวิวขั้นต่ำในสูตร Weighted Rating, C เริ่มต้นเมื่ออารมณ์นั้นยังไม่มีคะแนนเลย
+MIN_VOTES = 1
+DEFAULT_PRIOR = 5.0
+
+
+def weighted_score(prior, m=MIN_VOTES):
+    """expression (v*R + m*C) / (v + m) ซึ่ง v*R ก็คือ score_sum"""
+    return (Cast('score_sum', FloatField()) + m * prior) / (F('score_count') + m)
+
+
+def mood_priors(mood_ids):
+    """C ปัจจุบันของแต่ละอารมณ์ {mood_id: C}"""
+    priors = dict(MoodPrior.objects.filter(mood_id__in=mood_ids).values_list('mood_id', 'mean'))
+    return {mood_id: priors.get(mood_id, DEFAULT_PRIOR) for mood_id in mood_ids}
+
+
+def review_scores(review):
+    """คะแนนอารมณ์ปัจจุบันของรีวิว {mood_id: intensity} (เฉพาะที่ > 0)"""
+    return dict(
+        ReviewMoodScore.objects.filter(review=review, intensity__gt=0).values_list('mood_id', 'intensity')
+    )
+
+
+def score_deltas(old_scores, new_scores):
+    """ส่วนต่างของผลรวม/จำนวนต่ออารมณ์ {mood_id: (delta_sum, delta_count)}"""
+    deltas = {}
+    for mood_id in set(old_scores) | set(new_scores):
+        old = old_scores.get(mood_id) or 0
+        new = new_scores.get(mood_id) or 0
+        delta_count = (new > 0) - (old > 0)
+        if new != old or delta_count:
+            deltas[mood_id] = (new - old, delta_count)
+    return deltas
+
+
+def _per_mood(values, output_field):
+    """CASE mood_id WHEN ... THEN ... ไว้อัปเดตหลายอารมณ์ใน UPDATE เดียว"""
+    return Case(*[When(mood_id=mood_id, then=Value(value)) for mood_id, value in values.items()],
+                default=Value(0), output_field=output_field)
+
+
+def apply_score_changes(movie_id, old_scores, new_scores):
+    """
+    อัปเดต MovieMoodStats ของหนังตามคะแนนก่อน/หลัง (เรียกภายใน transaction เดียวกับการเขียนคะแนนได้)
+    ใช้จำนวน query คงที่ไม่ว่าจะเปลี่ยนกี่อารมณ์ (INSERT 1 + SELECT prior 1 + UPDATE 3)
+    """
+    deltas = score_deltas(old_scores, new_scores)
+    if not deltas:
+        return
+
+    with transaction.atomic():
+        # สร้างแถวที่ยังไม่มี (ชนกันก็ข้าม) แล้วค่อยบวกส่วนต่างแบบ atomic
+        MovieMoodStats.objects.bulk_create(
+            [MovieMoodStats(movie_id=movie_id, mood_id=mood_id) for mood_id in deltas],
+            ignore_conflicts=True,
+        )
+        priors = mood_priors(list(deltas))
+        stats = MovieMoodStats.objects.filter(movie_id=movie_id, mood_id__in=list(deltas))
+        stats.update(
+            score_sum=F('score_sum') + _per_mood({m: d[0] for m, d in deltas.items()}, IntegerField()),
+            score_count=F('score_count') + _per_mood({m: d[1] for m, d in deltas.items()}, IntegerField()),
+            updated_at=timezone.now(),
+        )
+        # UPDATE เดียวกันอ่านค่าเก่าของคอลัมน์ เลยคำนวณค่าเฉลี่ย/อันดับอีกรอบหลังบวกเสร็จ
+        stats.filter(score_count__gt=0).update(
+            avg_intensity=Cast('score_sum', FloatField()) / F('score_count'),
+            weighted_score=weighted_score(_per_mood(priors, FloatField())),
+        )
+        # ไม่มีคะแนนเหลือแล้ว -> เก็บแถวไว้เป็น 0 (ไม่ลบ) index ความคล้ายจะได้เห็นว่าค่าเปลี่ยน
+        stats.filter(score_count__lte=0).update(score_sum=0, score_count=0, avg_intensity=0.0, weighted_score=0.0)
+
+
+def remove_review(review):
+    """หักคะแนนของรีวิวออกจากสถิติ (services.remove_review_stats เรียกตอน pre_delete ของ Review)"""
+    apply_score_changes(review.movie_id, review_scores(review), {})
+
+
+def rebuild_mood_stats(movie_ids=None):
+    """คำนวณ MovieMoodStats ใหม่ทั้งหมดจาก ReviewMoodScore (หรือเฉพาะหนังที่ระบุ) คืนจำนวนแถวที่สร้าง"""
+    scores = ReviewMoodScore.objects.filter(intensity__gt=0)
+    stats = MovieMoodStats.objects.all()
+    if movie_ids is not None:
+        scores = scores.filter(review__movie_id__in=movie_ids)
+        stats = stats.filter(movie_id__in=movie_ids)
+
+    rows = scores.values('review__movie_id', 'mood_id').annotate(
+        total=Sum('intensity'), count=Count('id'), avg=Avg('intensity'),
+    )
+    priors = mood_priors(list(Mood.objects.values_list('id', flat=True)))
+    with transaction.atomic():
+        stats.delete()
+        created = MovieMoodStats.objects.bulk_create([
+            MovieMoodStats(
+                movie_id=row['review__movie_id'], mood_id=row['mood_id'],
+                score_sum=row['total'], score_count=row['count'], avg_intensity=row['avg'],
+                weighted_score=(row['total'] + MIN_VOTES * priors[row['mood_id']]) / (row['count'] + MIN_VOTES),
+            ) for row in rows.iterator()
+        ], batch_size=2000)
+    return len(created)
+
+
+def rerank(mood_ids=None):
+    """
+    คำนวณ C (ค่าเฉลี่ยคะแนน > 0 ทั้งหมดของอารมณ์) ใหม่จาก MovieMoodStats
+    แล้วอัปเดต weighted_score ของทุกหนังในอารมณ์นั้น (UPDATE เดียวต่ออารมณ์) คืน {mood_id: C}
+    """
+    moods = Mood.objects.all()
+    if mood_ids is not None:
+        moods = moods.filter(id__in=mood_ids)
+    totals = {
+        row['mood_id']: row for row in
+        MovieMoodStats.objects.values('mood_id').annotate(total=Sum('score_sum'), count=Sum('score_count'))
+    }
+
+    priors = {}
+    for mood_id in moods.values_list('id', flat=True):
+        row = totals.get(mood_id)
+        prior = row['total'] / row['count'] if row and row['count'] else DEFAULT_PRIOR
+        with transaction.atomic():
+            MoodPrior.objects.update_or_create(mood_id=mood_id, defaults={'mean': prior})
+            MovieMoodStats.objects.filter(mood_id=mood_id).update(weighted_score=weighted_score(prior))
+        priors[mood_id] = prior
+    return priors
+
+
+def leaderboard(mood, limit=20):
+    """
+    หนังที่เข้ากับอารมณ์มากที่สุด limit เรื่อง (อ่านจาก index mood, -weighted_score) mood เป็น Mood/MoodRecord หรือ id ก็ได้
+    แต่ละเรื่องมี v (จำนวนคะแนน), R (ค่าเฉลี่ย) และ mood_score ติดมาด้วยสำหรับ template
+    """
+    mood_id = getattr(mood, 'id', mood)
+    return Movie.objects.filter(mood_stats__mood_id=mood_id, mood_stats__score_count__gte=MIN_VOTES).annotate(
+        v=F('mood_stats__score_count'),
+        R=F('mood_stats__avg_intensity'),
+        mood_score=F('mood_stats__weighted_score'),
+    ).order_by('-mood_score')[:limit]
+
+
+def radar_stats(movie, moods):
+    """ข้อมูล Radar Chart [{'name', 'score'}] ตามลำดับ moods (1 query)"""
+    averages = dict(MovieMoodStats.objects.filter(movie=movie).values_list('mood_id', 'avg_intensity'))
+    return [{'name': mood.name, 'score': round(averages.get(mood.id, 0), 1)} for mood in moods]
@@ -0,0 +1,149 @@
+# movies/moods.py
+"""
+ทะเบียนอารมณ์ (Mood) ในหน่วยความจำของ process แทนการ query Mood.objects.all() ทุกหน้า
+
+- เก็บเป็น MoodRecord (dataclass แบบ frozen + slots) ที่คำนวณ emoji ไว้แล้ว พร้อม map id -> mood, name -> mood
+- อารมณ์แทบไม่เปลี่ยน จึงโหลดครั้งเดียวแล้วใช้ซ้ำ เช็ก "เลขเวอร์ชัน" ใน Django cache (ใช้ร่วมกันทุก worker)
+  อย่างมากทุก MOOD_REGISTRY_CHECK_INTERVAL วินาที ถ้าเลขเปลี่ยนค่อยโหลดจาก DB ใหม่
+- บันทึก/ลบ Mood (หน้า admin_moods, admin_delete_mood, Django admin) จะเพิ่มเลขเวอร์ชันผ่าน signal หลัง commit
+  ส่วน bulk_create ที่ไม่ส่ง signal ให้เรียก mood_registry.invalidate() เอง
+"""
+import threading
+import time
+from dataclasses import dataclass
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Mood, mood_emoji
+
+VERSION_KEY = 'moods:version'
+
+
+@dataclass(frozen=True, slots=True)
+class MoodRecord:
+    """ข้อมูลอารมณ์แบบอ่านอย่างเดียว ใช้ใน template ได้เหมือน Mood (id, name, emoji)"""
+    id: int
+    name: str
+    emoji: str
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __str__(self):
+        return self.name
+
+
+@dataclass(frozen=True, slots=True)
+class _Snapshot:
+    version: int
+    moods: tuple
+    by_id: dict
+    by_name: dict
+
+
+class MoodRegistry:
+    def __init__(self, check_interval=2.0):
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _version(self):
+        return cache.get(VERSION_KEY, 0)
+
+    def _current(self):
+        """snapshot ที่ยังใช้ได้โดยไม่ต้องแตะ DB (None = ต้องโหลดใหม่)"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return snapshot
+        if self._version() != snapshot.version:
+            return None
+        self._checked_at = now
+        return snapshot
+
+    def _load(self):
+        with self._lock:
+            snapshot = self._current()
+            if snapshot is not None:
+                return snapshot
+            # อ่านเลขเวอร์ชันก่อน query ถ้ามีคนแก้ระหว่างโหลด รอบหน้าจะเห็นเลขใหม่แล้วโหลดซ้ำเอง
+            version = self._version()
+            moods = tuple(MoodRecord(id=mood.id, name=mood.name, emoji=mood_emoji(mood.name))
+                          for mood in Mood.objects.order_by('id'))
+            snapshot = _Snapshot(
+                version=version, moods=moods,
+                by_id={mood.id: mood for mood in moods}, by_name={mood.name: mood for mood in moods},
+            )
+            # สลับทั้งชุดทีเดียว คนที่อ่านอยู่จะเห็นชุดเก่าหรือชุดใหม่ ไม่ปนกัน
+            self._snapshot, self._checked_at = snapshot, time.monotonic()
+            return snapshot
+
+    def _get(self):
+        return self._current() or self._load()
+
+    def all(self):
+        """อารมณ์ทั้งหมดเรียงตาม id (list ของ MoodRecord)"""
+        return list(self._get().moods)
+
+    async def _aget(self):
+        """เหมือน _get() สำหรับ async view: เช็กเวอร์ชันด้วย cache.aget แตะ DB ใน thread เฉพาะตอนต้องโหลดใหม่"""
+        snapshot = self._snapshot
+        if snapshot is not None:
+            now = time.monotonic()
+            if now - self._checked_at < self.check_interval:
+                return snapshot
+            if await cache.aget(VERSION_KEY, 0) == snapshot.version:
+                self._checked_at = now
+                return snapshot
+        return await sync_to_async(self._load)()
+
+    async def aall(self):
+        """เหมือน all() สำหรับ async view"""
+        return list((await self._aget()).moods)
+
+    async def aget(self, mood_id, default=None):
+        """เหมือน get() สำหรับ async view"""
+        try:
+            return (await self._aget()).by_id.get(int(mood_id), default)
+        except (TypeError, ValueError):
+            return default
+
+    def get(self, mood_id, default=None):
+        try:
+            return self._get().by_id.get(int(mood_id), default)
+        except (TypeError, ValueError):
+            return default
+
+    def by_name(self, name, default=None):
+        return self._get().by_name.get(name, default)
+
+    def names(self):
+        """dict id -> name"""
+        return {mood.id: mood.name for mood in self._get().moods}
+
+    def invalidate(self):
+        """เพิ่มเลขเวอร์ชัน ทุก worker จะโหลดใหม่ภายใน check_interval (worker นี้โหลดใหม่ทันที)"""
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.set(VERSION_KEY, 1, None)
+        self._snapshot = None
+
+
+mood_registry = MoodRegistry(
+    check_interval=getattr(settings, 'MOOD_REGISTRY_CHECK_INTERVAL', 2.0),
+)
+
+
+@receiver([post_save, post_delete], sender=Mood)
+def invalidate_mood_registry(sender, **kwargs):
+    transaction.on_commit(mood_registry.invalidate)
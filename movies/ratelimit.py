@@ -0,0 +1,206 @@
+# movies/ratelimit.py
+"""
+จำกัดอัตราการยิง TMDb ฝั่งเราเอง (token bucket) ใช้ร่วมกันทุก worker ผ่าน Django cache
+
+- ทุกช่วง per วินาทีมี token ให้ rate ใบ แจกด้วย cache.incr (atomic ใน Redis/Memcached/LocMem)
+  Django cache ไม่มี compare-and-swap เลยเติม token เป็นรอบ ๆ ตามช่วงเวลาแทนการเติมต่อเนื่อง
+- มี 2 เลน: interactive (request จากผู้ใช้) ใช้ได้ทั้งถัง
+  background (งาน sync/import) ใช้ได้ไม่เกิน background_share ของถัง (ที่เหลือกันไว้ให้ interactive) และรอคิวได้นานกว่า
+  interactive ที่ต้องรอจะจองรอบที่ตัวเองจะลองใหม่ไว้ ในรอบนั้น background ต้องหลีกทางจนกว่า interactive จะได้ token
+- ต้องตั้ง CACHES ของ cache_alias เป็น backend ที่ใช้ร่วมกันได้ (Redis/Memcached) ถ้าเป็น LocMem
+  แต่ละ worker จะมีถังของตัวเอง N worker ยิงได้ N เท่าของ rate (manage.py check --deploy จะเตือน)
+- ถ้าโดน TMDb ตอบ 429 ให้เรียก penalize() ทุก worker จะหยุดยิงจนพ้นช่วง Retry-After
+- เก็บสถิติ (acquired / queued / throttled) ไว้ดูได้จาก metrics()
+"""
+import contextvars
+import math
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.checks import Tags, Warning, register
+
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+
+_current_lane = contextvars.ContextVar('tmdb_rate_lane', default=INTERACTIVE)
+
+
+@contextmanager
+def rate_limit_lane(lane):
+    """ให้ทุก request TMDb ภายใน block นี้ใช้เลนที่กำหนด เช่น with rate_limit_lane(BACKGROUND):"""
+    token = _current_lane.set(lane)
+    try:
+        yield
+    finally:
+        _current_lane.reset(token)
+
+
+class RateLimiter:
+    def __init__(self, rate=40, per=1.0, background_share=0.5, max_wait=None,
+                 cache_alias='default', key_prefix='tmdb:rl'):
+        self.rate = rate
+        self.per = per
+        self.background_share = background_share
+        self.max_wait = {INTERACTIVE: 1.0, BACKGROUND: 30.0, **(max_wait or {})}
+        self.cache_alias = cache_alias
+        self.key_prefix = key_prefix
+        self._counts = Counter()
+        self._wait_seconds = Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def limit_for(self, lane):
+        if lane == BACKGROUND:
+            return max(1, int(self.rate * self.background_share))
+        return self.rate
+
+    def _record(self, lane, name, shared=False):
+        with self._lock:
+            self._counts[(lane, name)] += 1
+        if shared:
+            key = f'{self.key_prefix}:m:{lane}:{name}'
+            self.cache.add(key, 0, timeout=None)
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                pass
+
+    def _window_ttl(self):
+        return math.ceil(self.per * 2) + 1
+
+    def _waiting_key(self, window):
+        return f'{self.key_prefix}:iw:{window}'
+
+    def _mark_waiting(self, at):
+        """interactive จะลองใหม่ตอนเวลา at จองรอบนั้นไว้ให้ background หลีกทาง คืน key ไว้ยกเลิก"""
+        key = self._waiting_key(int(at // self.per))
+        self.cache.add(key, 0, timeout=self._window_ttl())
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            self.cache.set(key, 1, timeout=self._window_ttl())
+        return key
+
+    def _unmark_waiting(self, key):
+        try:
+            self.cache.decr(key)
+        except ValueError:
+            pass
+
+    def _try_acquire(self, lane, now):
+        """คืน (ได้ token ไหม, ควรรออีกกี่วินาทีก่อนลองใหม่)"""
+        window = int(now // self.per)
+        blocked_key = f'{self.key_prefix}:blocked_until'
+        waiting_key = self._waiting_key(window)
+        state = self.cache.get_many([blocked_key, waiting_key])
+        blocked_until = state.get(blocked_key)
+        if blocked_until and now < blocked_until:
+            return False, blocked_until - now
+        if lane == BACKGROUND and state.get(waiting_key, 0) > 0:
+            # มี interactive รอ token ของรอบนี้อยู่ ให้ไปก่อน background ค่อยลองรอบหน้า
+            return False, (window + 1) * self.per - now
+
+        key = f'{self.key_prefix}:w:{window}'
+        ttl = self._window_ttl()
+        self.cache.add(key, 0, timeout=ttl)
+        try:
+            count = self.cache.incr(key)
+        except ValueError:
+            # key หมดอายุไปพอดีระหว่าง add กับ incr
+            self.cache.set(key, 1, timeout=ttl)
+            count = 1
+
+        if count <= self.limit_for(lane):
+            return True, 0.0
+        # คืน token ที่เกินไป ไม่ให้เลน background กินโควตาของ interactive
+        try:
+            self.cache.decr(key)
+        except ValueError:
+            pass
+        return False, (window + 1) * self.per - now
+
+    def acquire(self, lane=None):
+        """ขอ token 1 ใบ (รอคิวได้ไม่เกิน max_wait ของเลนนั้น) ได้ True / หมดเวลารอ False"""
+        lane = lane or _current_lane.get()
+        started = time.time()
+        deadline = started + self.max_wait.get(lane, 0)
+        queued = False
+        waiting_key = None
+        try:
+            while True:
+                now = time.time()
+                ok, wait = self._try_acquire(lane, now)
+                if ok:
+                    self._record(lane, 'acquired')
+                    if queued:
+                        with self._lock:
+                            self._wait_seconds[lane] += now - started
+                    return True
+                if not queued:
+                    queued = True
+                    self._record(lane, 'queued', shared=True)
+                if now + wait > deadline:
+                    self._record(lane, 'throttled', shared=True)
+                    return False
+                if lane == INTERACTIVE:
+                    if waiting_key is not None:
+                        self._unmark_waiting(waiting_key)
+                    waiting_key = self._mark_waiting(now + wait)
+                # jitter กันทุก worker ตื่นมาแย่ง token พร้อมกันตอนขึ้นรอบใหม่
+                time.sleep(wait + random.uniform(0, self.per * 0.05))
+        finally:
+            if waiting_key is not None:
+                self._unmark_waiting(waiting_key)
+
+    def penalize(self, retry_after):
+        """TMDb ตอบ 429 -> ให้ทุก worker หยุดยิงไป retry_after วินาที"""
+        until = time.time() + retry_after
+        self.cache.set(f'{self.key_prefix}:blocked_until', until, timeout=math.ceil(retry_after) + 1)
+        self._record(INTERACTIVE, 'upstream_429', shared=True)
+
+    def metrics(self):
+        """สถิติของ process นี้ + ตัวนับรวมทุก worker (queued / throttled / upstream_429)"""
+        with self._lock:
+            local = {f'{lane}.{name}': value for (lane, name), value in self._counts.items()}
+            local.update({f'{lane}.wait_seconds': round(value, 3) for lane, value in self._wait_seconds.items()})
+        shared_keys = [f'{self.key_prefix}:m:{lane}:{name}'
+                       for lane in (INTERACTIVE, BACKGROUND)
+                       for name in ('queued', 'throttled', 'upstream_429')]
+        shared = {key.split(':m:', 1)[1].replace(':', '.'): value
+                  for key, value in self.cache.get_many(shared_keys).items()}
+        return {
+            'rate': self.rate,
+            'per': self.per,
+            'background_limit': self.limit_for(BACKGROUND),
+            'process': local,
+            'all_workers': shared,
+        }
+
+
+# backend ที่แต่ละ process มีของตัวเอง ใช้เป็นถังร่วมของทุก worker ไม่ได้
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_rate_limit_cache(app_configs, **kwargs):
+    alias = getattr(settings, 'TMDB_RATE_LIMIT', {}).get('cache_alias', 'default')
+    backend = settings.CACHES.get(alias, {}).get('BACKEND')
+    if backend in PROCESS_LOCAL_CACHES:
+        return [Warning(
+            f"TMDb rate limiter uses CACHES['{alias}'] ({backend}), which is not shared between workers.",
+            hint="Each worker gets its own bucket, so N workers send N x TMDB_RATE_LIMIT['rate']. "
+                 "Point it at Redis/Memcached.",
+            id='movies.W001',
+        )]
+    return []
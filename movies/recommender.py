@@ -0,0 +1,218 @@
+# movies/recommender.py
+"""
+แนะนำหนังเฉพาะบุคคลด้วย Matrix Factorization แบบ implicit feedback (ALS ของ Hu, Koren & Volinsky)
+
+- สร้าง matrix ผู้ใช้ x หนัง (sparse แบบ CSR ด้วย NumPy ล้วน) จาก Favorite, Bookmark, CustomList และรีวิว
+  ค่าในช่อง = ความแรงของ interaction, confidence = 1 + alpha * ค่านั้น
+- train_als() สลับแก้ factor ของผู้ใช้/หนังทีละฝั่ง (ฝั่งละ 1 linear solve ขนาด factors x factors ต่อแถว)
+  เวลาเป็นเส้นตรงตามจำนวน interaction ใช้ CPU อย่างเดียวได้ถึงหลักล้าน interaction
+- บันทึก factor เป็นไฟล์ .npz (python manage.py train_recommender) แล้ว Recommender โหลดมาให้คะแนนด้วย dot product
+  ผลของแต่ละผู้ใช้เก็บใน Django cache ตามเวอร์ชันของโมเดล
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Bookmark, CustomList, Favorite, Movie, ReviewMoodScore, Review
+
+logger = logging.getLogger(__name__)
+
+# น้ำหนักของ interaction แต่ละแบบ (รีวิวได้เพิ่มตามค่าเฉลี่ยคะแนนอารมณ์ที่ให้ไว้)
+INTERACTION_WEIGHTS = {
+    'favorite': 4.0,
+    'bookmark': 2.0,
+    'list': 2.0,
+    'review': 2.0,
+}
+
+MODEL_PATH = Path(getattr(settings, 'RECOMMENDER_MODEL_PATH', settings.BASE_DIR / 'var' / 'recommender.npz'))
+CACHE_TTL = getattr(settings, 'RECOMMENDER_CACHE_TTL', 15 * 60)
+
+
+# ---------- เตรียมข้อมูล ----------
+
+def load_interactions():
+    """คืน (user_ids, movie_ids, values) เป็น NumPy array แบบ coordinate (user, movie) ซ้ำได้ เดี๋ยวรวมทีหลัง"""
+    parts = []
+
+    def add(pairs, weight):
+        pairs = list(pairs)
+        if pairs:
+            array = np.array(pairs, dtype=np.int64)
+            parts.append((array[:, 0], array[:, 1], np.full(len(array), weight, dtype=np.float32)))
+
+    add(Favorite.objects.values_list('user_id', 'movie_id').iterator(chunk_size=10000), INTERACTION_WEIGHTS['favorite'])
+    add(Bookmark.objects.values_list('user_id', 'movie_id').iterator(chunk_size=10000), INTERACTION_WEIGHTS['bookmark'])
+    add(CustomList.movies.through.objects.values_list('customlist__user_id', 'movie_id').iterator(chunk_size=10000),
+        INTERACTION_WEIGHTS['list'])
+
+    # รีวิว: น้ำหนักพื้นฐาน + ค่าเฉลี่ยคะแนนอารมณ์ (0-5) / 5
+    review_rows = list(Review.objects.order_by('id').values_list('id', 'user_id', 'movie_id').iterator(chunk_size=10000))
+    if review_rows:
+        reviews = np.array(review_rows, dtype=np.int64)
+        score_rows = list(ReviewMoodScore.objects.filter(intensity__gt=0)
+                          .values_list('review_id', 'intensity').iterator(chunk_size=10000))
+        bonus = np.zeros(len(reviews), dtype=np.float32)
+        if score_rows:
+            scores = np.array(score_rows, dtype=np.int64)
+            position = np.searchsorted(reviews[:, 0], scores[:, 0])
+            position = np.clip(position, 0, len(reviews) - 1)
+            valid = reviews[position, 0] == scores[:, 0]
+            totals = np.bincount(position[valid], weights=scores[valid, 1], minlength=len(reviews))
+            counts = np.bincount(position[valid], minlength=len(reviews))
+            bonus = np.divide(totals, counts, out=np.zeros(len(reviews)), where=counts > 0).astype(np.float32) / 5
+        parts.append((reviews[:, 1], reviews[:, 2], INTERACTION_WEIGHTS['review'] + bonus))
+
+    if not parts:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0, dtype=np.float32)
+    return tuple(np.concatenate(column) for column in zip(*parts))
+
+
+def to_csr(rows, cols, values, n_rows):
+    """รวมค่าที่ (row, col) ซ้ำกันแล้วแปลงเป็น CSR (indptr, indices, data)"""
+    n_cols = int(cols.max()) + 1 if len(cols) else 1
+    keys, inverse = np.unique(rows * n_cols + cols, return_inverse=True)
+    data = np.bincount(inverse, weights=values).astype(np.float32)
+    rows, cols = keys // n_cols, keys % n_cols
+    indptr = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n_rows), out=indptr[1:])
+    return indptr, cols.astype(np.int64), data
+
+
+# ---------- ALS ----------
+
+def _solve_side(indptr, indices, confidence, fixed, regularization):
+    """แก้ factor ของทุกแถวฝั่งหนึ่ง โดยถือ factor อีกฝั่ง (fixed) คงที่"""
+    n_factors = fixed.shape[1]
+    gram = fixed.T @ fixed + regularization * np.eye(n_factors, dtype=fixed.dtype)
+    solved = np.zeros((len(indptr) - 1, n_factors), dtype=fixed.dtype)
+    for row in range(len(indptr) - 1):
+        start, end = indptr[row], indptr[row + 1]
+        if start == end:
+            continue
+        factors = fixed[indices[start:end]]
+        c = confidence[start:end]
+        # (YtY + Yt(C - I)Y + λI) x = Yt C p  โดย p = 1 ทุกช่องที่มี interaction
+        a = gram + (factors.T * (c - 1)) @ factors
+        b = factors.T @ c
+        solved[row] = np.linalg.solve(a, b)
+    return solved
+
+
+def train_als(user_index, item_index, values, n_users, n_items, factors=32, regularization=0.1,
+              alpha=10.0, iterations=10, seed=0, callback=None):
+    """
+    เทรน implicit ALS จาก interaction แบบ coordinate (ดัชนีแถว/คอลัมน์เริ่มที่ 0)
+    คืน (user_factors, item_factors) เป็น float32
+    callback(iteration, seconds) ถูกเรียกหลังจบแต่ละรอบ (ใช้แสดงความคืบหน้า)
+    """
+    user_csr = to_csr(user_index, item_index, values, n_users)
+    item_csr = to_csr(item_index, user_index, values, n_items)
+    user_conf = 1 + alpha * user_csr[2]
+    item_conf = 1 + alpha * item_csr[2]
+
+    rng = np.random.default_rng(seed)
+    user_factors = (rng.standard_normal((n_users, factors)) * 0.01).astype(np.float32)
+    item_factors = (rng.standard_normal((n_items, factors)) * 0.01).astype(np.float32)
+
+    for iteration in range(1, iterations + 1):
+        started = time.monotonic()
+        user_factors = _solve_side(user_csr[0], user_csr[1], user_conf, item_factors, regularization)
+        item_factors = _solve_side(item_csr[0], item_csr[1], item_conf, user_factors, regularization)
+        if callback:
+            callback(iteration, time.monotonic() - started)
+    return user_factors, item_factors
+
+
+def save_model(path, user_ids, movie_ids, user_factors, item_factors, seen):
+    """บันทึกโมเดลแบบ atomic (เขียนไฟล์ชั่วคราวแล้ว replace) seen = CSR ของหนังที่ผู้ใช้มี interaction แล้ว"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.stem + '.tmp.npz')
+    np.savez(
+        tmp_path,
+        user_ids=user_ids, movie_ids=movie_ids,
+        user_factors=user_factors, item_factors=item_factors,
+        seen_indptr=seen[0], seen_indices=seen[1],
+        trained_at=np.array(time.time()),
+        # เวอร์ชันไม่ซ้ำกันทุกครั้งที่บันทึก (ใช้ใน cache key) เทรนเสร็จสองรอบในวินาทีเดียวกันก็ไม่ชนกัน
+        version=np.array(uuid.uuid4().hex),
+    )
+    os.replace(tmp_path, path)
+
+
+# ---------- ให้บริการ ----------
+
+class Recommender:
+    """โหลดไฟล์โมเดล (โหลดใหม่อัตโนมัติเมื่อไฟล์ถูกเทรนทับ) แล้วให้คะแนนหนังด้วย dot product"""
+
+    def __init__(self, path=MODEL_PATH, cache_ttl=CACHE_TTL):
+        self.path = Path(path)
+        self.cache_ttl = cache_ttl
+        self._lock = threading.Lock()
+        self._stamp = None
+        self.model = None
+
+    def _load(self):
+        try:
+            # os.replace ใน save_model ได้ inode ใหม่เสมอ ไฟล์ที่เขียนทับใน mtime เดียวกันก็ยังรู้ว่าเปลี่ยน
+            stat = self.path.stat()
+            stamp = (stat.st_mtime_ns, stat.st_ino)
+        except OSError:
+            return None
+        if stamp != self._stamp:
+            with self._lock:
+                if stamp != self._stamp:
+                    with np.load(self.path) as data:
+                        model = {name: data[name] for name in data.files}
+                    model['user_rows'] = {int(u): i for i, u in enumerate(model['user_ids'])}
+                    # ไฟล์รุ่นเก่าที่ยังไม่มี version ใช้เวลาที่เทรนแบบเต็มความละเอียดแทน
+                    model['version'] = str(model['version'] if 'version' in model else repr(float(model['trained_at'])))
+                    self.model = model
+                    self._stamp = stamp
+                    logger.info("Loaded recommender model %s (%d users, %d movies)",
+                                self.path, len(model['user_ids']), len(model['movie_ids']))
+        return self.model
+
+    def recommend_ids(self, user_id, n=20):
+        """Movie.id ที่แนะนำให้ผู้ใช้ n เรื่อง (ไม่รวมเรื่องที่เคยกด/รีวิวแล้ว) ผู้ใช้ใหม่ที่ยังไม่อยู่ในโมเดลได้ []"""
+        model = self._load()
+        if model is None:
+            return []
+        key = f"rec:{model['version']}:{user_id}:{n}"
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+        row = model['user_rows'].get(user_id)
+        if row is None:
+            return []
+        scores = model['item_factors'] @ model['user_factors'][row]
+        seen = model['seen_indices'][model['seen_indptr'][row]:model['seen_indptr'][row + 1]]
+        scores[seen] = -np.inf
+
+        k = min(n, len(scores) - len(seen))
+        if k <= 0:
+            return []
+        top = np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(-scores[top])]
+        result = [int(model['movie_ids'][i]) for i in top]
+        cache.set(key, result, self.cache_ttl)
+        return result
+
+    def recommend(self, user, n=20):
+        """Movie object ตามลำดับที่แนะนำ"""
+        ids = self.recommend_ids(user.pk, n)
+        movies = Movie.objects.in_bulk(ids)
+        return [movies[movie_id] for movie_id in ids if movie_id in movies]
+
+
+recommender = Recommender()
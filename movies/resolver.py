@@ -0,0 +1,177 @@
+# movies/resolver.py
+"""
+หา Movie จาก tmdb_id ที่เดียว แทนโค้ด "หาใน DB ไม่เจอก็ดึง TMDb แล้วสร้าง" ที่เคยก๊อปไว้ใน view หลายตัว
+
+ลำดับการหา: LRU ในหน่วยความจำของ process (tmdb_id -> pk) -> DB -> ดึงจาก TMDb แล้ว upsert
+- "ดึง + เขียน" ของหนังเรื่องเดียวกันรวมเป็นครั้งเดียวด้วย SingleFlight key ('movie', tmdb_id)
+  ใช้ร่วมกันทั้ง view แบบ sync (resolve) และ async (aresolve) ส่วนการดึงข้ามหลาย worker TMDbClient รวมให้อยู่แล้ว
+- การเขียนเป็น INSERT ... ON CONFLICT (upsert_movie_from_tmdb) ต่อให้หลาย worker สร้างพร้อมกันก็ไม่เจอ IntegrityError
+- LRU เก็บแค่ pk (ไม่เก็บ object ที่ข้อมูลเปลี่ยนได้) และเป็นของ process ใครใช้ต้องรับมือกับ pk ที่ตายไปแล้ว
+  - resolve/aresolve อ่านแถวจาก DB ด้วย pk นั้นอยู่แล้ว ถ้าไม่เจอก็หาใหม่ตาม tmdb_id
+  - with_movie_id ให้ view ที่ใช้แค่ id (ปุ่ม Favorite ฯลฯ) ไม่ต้อง query หนัง ถ้า pk ตาย (worker อื่นลบหนังไป)
+    จะเจอ IntegrityError จาก FK แล้วหาใหม่ลองอีกรอบเดียว
+  ไม่พึ่ง version key ใน cache เพราะ cache ค่าเริ่มต้น (LocMem) ไม่ได้ใช้ร่วมกันข้าม worker
+- resolve_many / resolve_pks หาหลายเรื่องใน query เดียว (ไม่ดึง TMDb ให้เรื่องที่ยังไม่มี)
+"""
+import copy
+import threading
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import Movie
+from .singleflight import SingleFlight
+from .utils import get_movie_details_tmdb, aget_movie_details_tmdb, upsert_movie_from_tmdb
+
+
+class MovieResolver:
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self.flight = SingleFlight()
+        self._pks = OrderedDict()
+        self._lock = threading.Lock()
+
+    # ---------- LRU ----------
+
+    def _cached_pk(self, tmdb_id):
+        with self._lock:
+            pk = self._pks.get(tmdb_id)
+            if pk is not None:
+                self._pks.move_to_end(tmdb_id)
+            return pk
+
+    def _remember(self, pairs):
+        with self._lock:
+            for tmdb_id, pk in pairs:
+                self._pks[tmdb_id] = pk
+                self._pks.move_to_end(tmdb_id)
+            while len(self._pks) > self.max_size:
+                self._pks.popitem(last=False)
+
+    def forget(self, tmdb_id):
+        with self._lock:
+            self._pks.pop(tmdb_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._pks.clear()
+
+    # ---------- หาทีละเรื่อง ----------
+
+    def _store(self, tmdb_data):
+        movie = upsert_movie_from_tmdb(tmdb_data)
+        # แถวที่เพิ่ง upsert ยังไม่ commit ถ้า rollback ต้องไม่หลงเหลือ pk ใน LRU
+        pair = (movie.tmdb_id, movie.pk)
+        transaction.on_commit(lambda: self._remember([pair]))
+        return movie
+
+    def _fetch_and_store(self, tmdb_id):
+        # เช็ก DB อีกรอบ เผื่อ leader รอบก่อนเพิ่งสร้างเสร็จระหว่างที่เรายังไม่ได้เข้ามารอ
+        movie = Movie.objects.filter(tmdb_id=tmdb_id).first()
+        if movie is not None:
+            return movie
+        tmdb_data = get_movie_details_tmdb(tmdb_id)
+        return self._store(tmdb_data) if tmdb_data else None
+
+    async def _afetch_and_store(self, tmdb_id):
+        movie = await Movie.objects.filter(tmdb_id=tmdb_id).afirst()
+        if movie is not None:
+            return movie
+        # รอ TMDb ใน thread pool ของ TMDb แล้วค่อยเขียนใน thread ของ ORM
+        tmdb_data = await aget_movie_details_tmdb(tmdb_id)
+        return await sync_to_async(self._store)(tmdb_data) if tmdb_data else None
+
+    def _lookup(self, tmdb_id, pk):
+        movie = Movie.objects.filter(pk=pk).first() if pk is not None else None
+        if movie is None:
+            movie = Movie.objects.filter(tmdb_id=tmdb_id).first()
+            if movie is not None:
+                self._remember([(tmdb_id, movie.pk)])
+        return movie
+
+    def resolve(self, tmdb_id, fetch=True):
+        """Movie ของ tmdb_id นี้ ถ้ายังไม่มีใน DB จะดึงจาก TMDb มาสร้าง (fetch=False ไม่ดึง) ไม่เจอคืน None"""
+        tmdb_id = int(tmdb_id)
+        movie = self._lookup(tmdb_id, self._cached_pk(tmdb_id))
+        if movie is None and fetch:
+            movie = self.flight.do(('movie', tmdb_id), lambda: self._fetch_and_store(tmdb_id))
+            # ทุกคนที่รอได้ object เดียวกัน แยกสำเนาให้แต่ละ request แก้ของตัวเองได้
+            movie = copy.copy(movie)
+        return movie
+
+    async def aresolve(self, tmdb_id, fetch=True):
+        """เหมือน resolve() สำหรับ async view (ใช้ SingleFlight key เดียวกัน คนรอไม่กิน thread)"""
+        tmdb_id = int(tmdb_id)
+        movie = await sync_to_async(self._lookup)(tmdb_id, self._cached_pk(tmdb_id))
+        if movie is None and fetch:
+            movie = await self.flight.ado(('movie', tmdb_id), lambda: self._afetch_and_store(tmdb_id))
+            movie = copy.copy(movie)
+        return movie
+
+    def resolve_pk(self, tmdb_id, fetch=True):
+        """แค่ pk ของหนัง (LRU hit ไม่แตะ DB อาจเป็น pk ของหนังที่ถูกลบไปแล้ว ใช้ผ่าน with_movie_id)"""
+        pk = self._cached_pk(int(tmdb_id))
+        if pk is not None:
+            return pk
+        movie = self.resolve(tmdb_id, fetch=fetch)
+        return movie.pk if movie is not None else None
+
+    def with_movie_id(self, tmdb_id, action, fetch=True):
+        """
+        เรียก action(movie_id) ใน transaction แล้วคืนผลของมัน ไม่เจอหนัง raise Movie.DoesNotExist
+        pk จาก LRU อาจเป็นของหนังที่ worker อื่นลบไปแล้ว -> FK ไม่ผ่าน (IntegrityError)
+        ลืม pk นั้น หาใหม่จาก DB/TMDb แล้วลองอีกครั้งเดียว
+        """
+        tmdb_id = int(tmdb_id)
+        pk = self.resolve_pk(tmdb_id, fetch=fetch)
+        if pk is None:
+            raise Movie.DoesNotExist(f"tmdb_id={tmdb_id}")
+        try:
+            with transaction.atomic():
+                return action(pk)
+        except IntegrityError:
+            self.forget(tmdb_id)
+            movie = self.resolve(tmdb_id, fetch=fetch)
+            if movie is None:
+                raise Movie.DoesNotExist(f"tmdb_id={tmdb_id}")
+            if movie.pk == pk:
+                # pk ยังใช้ได้ แปลว่าเป็น IntegrityError จากเรื่องอื่น
+                raise
+        with transaction.atomic():
+            return action(movie.pk)
+
+    # ---------- หาหลายเรื่อง ----------
+
+    def resolve_many(self, tmdb_ids):
+        """dict tmdb_id -> Movie ของเรื่องที่มีใน DB (query เดียว) เรื่องที่ไม่มีจะไม่อยู่ใน dict"""
+        tmdb_ids = {int(tmdb_id) for tmdb_id in tmdb_ids}
+        if not tmdb_ids:
+            return {}
+        movies = {movie.tmdb_id: movie for movie in Movie.objects.filter(tmdb_id__in=tmdb_ids)}
+        self._remember((tmdb_id, movie.pk) for tmdb_id, movie in movies.items())
+        return movies
+
+    def resolve_pks(self, tmdb_ids):
+        """dict tmdb_id -> pk จาก DB (query เดียว ไม่เชื่อ LRU) แล้วเติม LRU ให้"""
+        tmdb_ids = {int(tmdb_id) for tmdb_id in tmdb_ids}
+        if not tmdb_ids:
+            return {}
+        pks = dict(Movie.objects.filter(tmdb_id__in=tmdb_ids).values_list('tmdb_id', 'id'))
+        self._remember(pks.items())
+        return pks
+
+
+movie_resolver = MovieResolver(
+    max_size=getattr(settings, 'MOVIE_RESOLVER_SIZE', 10000),
+)
+
+
+@receiver(post_delete, sender=Movie)
+def forget_deleted_movie(sender, instance, **kwargs):
+    # ลืมได้แค่ใน process นี้ worker อื่นจะรู้เองตอนเจอ IntegrityError (ดู with_movie_id)
+    tmdb_id = instance.tmdb_id
+    transaction.on_commit(lambda: movie_resolver.forget(tmdb_id))
@@ -0,0 +1,86 @@
+# movies/reviews.py
+"""
+รีวิวของหนังแบบแบ่งหน้าด้วย keyset (created_at, id) แทนการโหลดทุกรีวิวในหน้า detail
+
+- review_page() อ่าน limit + 1 แถวถัดจาก cursor ตาม index (movie, -created_at, -id)
+  ต้นทุนต่อหน้าคงที่ ไม่ว่าหนังจะมีรีวิวกี่พันรายการ และไม่มีปัญหาแถวซ้ำ/หายแบบ OFFSET ตอนมีรีวิวใหม่เข้ามา
+- cursor เป็นสตริง base64 ของ "created_at|id" ของแถวสุดท้ายในหน้าก่อน
+- review_total() นับจำนวนรีวิวแล้วเก็บใน Django cache ล้างเมื่อมีการเพิ่ม/ลบรีวิว (forget_review_total)
+"""
+import base64
+import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Review
+
+REVIEWS_PER_PAGE = getattr(settings, 'REVIEWS_PER_PAGE', 10)
+REVIEW_TOTAL_TTL = getattr(settings, 'REVIEW_TOTAL_TTL', 10 * 60)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(review):
+    raw = f"{review.created_at.isoformat()}|{review.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """คืน (created_at, id) ถ้า cursor ผิดรูปแบบ raise InvalidCursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, review_id = raw.rsplit('|', 1)
+        created_at, review_id = datetime.datetime.fromisoformat(created_at), int(review_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(cursor) from e
+    # id นอกช่วง bigint ส่งต่อไปถึง DB จะได้ OverflowError/DataError (500) แทนที่จะเป็น 400
+    if not 0 < review_id < 2 ** 63:
+        raise InvalidCursor(cursor)
+    return created_at, review_id
+
+
+def review_queryset(movie, cursor=None):
+    """รีวิวของหนังใหม่สุดก่อน ต่อจาก cursor (ถ้ามี) เหมือนกันทุกผู้ใช้ (หน้าแรก cache ไว้ใช้ร่วมกันได้)"""
+    reviews = movie.reviews.select_related('user', 'user__profile') \
+                           .prefetch_related('mood_scores__mood') \
+                           .order_by('-created_at', '-id')
+    if cursor:
+        created_at, review_id = decode_cursor(cursor)
+        # created_at <= ... ซ้ำไว้ให้ DB ใช้เป็นเงื่อนไขของ index ได้ (OR อย่างเดียว planner จะกรองทีหลัง)
+        reviews = reviews.filter(created_at__lte=created_at).filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=review_id)
+        )
+    return reviews
+
+
+def review_page_queryset(movie, cursor=None, limit=REVIEWS_PER_PAGE):
+    """query ของหนึ่งหน้า (อ่านเกิน 1 แถวไว้ดูว่ามีหน้าถัดไปไหม)"""
+    return review_queryset(movie, cursor)[:limit + 1]
+
+
+def review_page(movie, cursor=None, limit=REVIEWS_PER_PAGE):
+    """รีวิวทีละ limit รายการ คืน (reviews, next_cursor) next_cursor เป็น None เมื่อหมดแล้ว"""
+    rows = list(review_page_queryset(movie, cursor, limit))
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def _total_key(movie_id):
+    return f"reviews:total:{movie_id}"
+
+
+def review_total(movie_id):
+    """จำนวนรีวิวทั้งหมดของหนัง (cache ไว้ ไม่ต้อง COUNT ทุกครั้งที่เปิดหน้า)"""
+    return cache.get_or_set(
+        _total_key(movie_id), lambda: Review.objects.filter(movie_id=movie_id).count(), REVIEW_TOTAL_TTL,
+    )
+
+
+def forget_review_total(movie_id):
+    """ล้างจำนวนที่ cache ไว้หลัง transaction ปัจจุบัน commit (rollback ก็ไม่ล้าง)"""
+    transaction.on_commit(lambda: cache.delete(_total_key(movie_id)))
@@ -0,0 +1,126 @@
+# movies/services.py
+"""
+เขียนรีวิวพร้อมคะแนนอารมณ์ (ใช้ทั้งหน้า detail และหน้าแก้ไขรีวิว)
+
+- parse_mood_scores() ตรวจช่อง mood_score_<id> ทุกช่องในครั้งเดียว ผิดตรงไหนแจ้งทั้งหมดเป็น ValidationError
+- create_review()/update_review()/delete_review() เขียนรีวิว คะแนน และ MovieMoodStats ใน transaction เดียว
+  แล้วเพิ่มเวอร์ชันของหนังให้ fragment ในหน้า detail render ใหม่ (movies/fragments.py)
+  คะแนนเขียนด้วย bulk upsert 1 ครั้ง + DELETE 1 ครั้ง จำนวน query คงที่ไม่ว่าจะมีกี่อารมณ์
+- การลบรีวิวทุกทาง (delete_review, ลบผู้ใช้แล้ว cascade, Django admin) ผ่าน pre_delete ของ Review
+  สถิติ/จำนวนรีวิว/เวอร์ชันของหนังจึงไม่เพี้ยน ส่วนการแก้คะแนนนอก service ให้เรียก scores_changed()
+"""
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from . import mood_stats
+from .fragments import bump_movie_version
+from .reviews import forget_review_total
+from .models import Movie, Review, ReviewMoodScore
+from .moods import mood_registry
+
+SCORE_PREFIX = 'mood_score_'
+MAX_INTENSITY = 5
+
+
+def parse_mood_scores(data):
+    """
+    อ่านช่อง mood_score_<id> จาก POST คืน {mood_id: intensity} (0 = ไม่มีอารมณ์นี้/ลบทิ้ง)
+    ช่องที่ไม่ได้ส่งมาหรือเว้นว่างจะไม่อยู่ใน dict (ตอนแก้ไขรีวิวถือว่าคงค่าเดิม)
+    """
+    moods = mood_registry.names()
+    scores, errors = {}, []
+    for key in data:
+        if not key.startswith(SCORE_PREFIX):
+            continue
+        value = data.get(key, '').strip()
+        mood_id = key[len(SCORE_PREFIX):]
+        if not mood_id.isdigit() or int(mood_id) not in moods:
+            errors.append(f'ไม่พบอารมณ์ที่ให้คะแนน ({key})')
+            continue
+        if value == '':
+            continue
+        if not value.isdigit() or int(value) > MAX_INTENSITY:
+            errors.append(f'คะแนนอารมณ์ {moods[int(mood_id)]} ต้องเป็นตัวเลข 0-{MAX_INTENSITY}')
+            continue
+        scores[int(mood_id)] = int(value)
+    if errors:
+        raise ValidationError(errors)
+    return scores
+
+
+def _write_scores(review, old_scores, scores):
+    """บันทึกคะแนนที่เปลี่ยนแบบ bulk (upsert 1 + DELETE 1) แล้วอัปเดตสถิติ คืนคะแนนใหม่ (เฉพาะ > 0)"""
+    new_scores = {mood_id: intensity for mood_id, intensity in {**old_scores, **scores}.items() if intensity > 0}
+
+    changed = [
+        ReviewMoodScore(review=review, mood_id=mood_id, intensity=intensity)
+        for mood_id, intensity in new_scores.items() if old_scores.get(mood_id) != intensity
+    ]
+    if changed:
+        ReviewMoodScore.objects.bulk_create(
+            changed, update_conflicts=True, unique_fields=['review', 'mood'], update_fields=['intensity'],
+        )
+    removed = [mood_id for mood_id in old_scores if mood_id not in new_scores]
+    if removed:
+        ReviewMoodScore.objects.filter(review=review, mood_id__in=removed).delete()
+
+    mood_stats.apply_score_changes(review.movie_id, old_scores, new_scores)
+    return new_scores
+
+
+def create_review(user, movie, comment, scores):
+    """สร้างรีวิวใหม่พร้อมคะแนนอารมณ์ (scores จาก parse_mood_scores)"""
+    with transaction.atomic():
+        review = Review.objects.create(user=user, movie=movie, comment=comment)
+        _write_scores(review, {}, scores)
+        forget_review_total(movie.id)
+        bump_movie_version(movie.id)
+    return review
+
+
+def update_review(review, comment, scores):
+    """แก้ comment และคะแนนอารมณ์ของรีวิวเดิม อารมณ์ที่ไม่ได้ส่งมาคงค่าเดิม ส่ง 0 = ลบคะแนนนั้น"""
+    with transaction.atomic():
+        review.comment = comment
+        review.save(update_fields=['comment'])
+        _write_scores(review, mood_stats.review_scores(review), scores)
+        bump_movie_version(review.movie_id)
+    return review
+
+
+def scores_changed(review, old_scores, created=False):
+    """
+    คะแนนของรีวิวถูกเขียนตรง ๆ (เช่น inline ใน Django admin) ไม่ผ่าน _write_scores
+    ปรับสถิติตามคะแนนก่อน/หลัง แล้วล้างจำนวนรีวิว (ถ้าเป็นรีวิวใหม่) และเพิ่มเวอร์ชันของหนัง
+    """
+    with transaction.atomic():
+        mood_stats.apply_score_changes(review.movie_id, old_scores, mood_stats.review_scores(review))
+        if created:
+            forget_review_total(review.movie_id)
+        bump_movie_version(review.movie_id)
+
+
+def delete_review(review):
+    """ลบรีวิว (หักคะแนนออกจากสถิติและล้างจำนวนรีวิวใน remove_review_stats ตอน pre_delete)"""
+    with transaction.atomic():
+        review.delete()
+
+
+def _deleting_movie(origin):
+    return isinstance(origin, Movie) or (isinstance(origin, QuerySet) and origin.model is Movie)
+
+
+@receiver(pre_delete, sender=Review)
+def remove_review_stats(sender, instance, origin=None, **kwargs):
+    """
+    ตอนนี้คะแนนของรีวิวยังอยู่ใน DB (Django ส่ง pre_delete ก่อนลบแถวใน cascade) หักออกจากสถิติได้
+    ถ้าต้นทางคือการลบหนัง สถิติของหนังเรื่องนั้นถูกลบไปด้วยอยู่แล้ว ไม่ต้องหักทีละรีวิว
+    """
+    if _deleting_movie(origin):
+        return
+    mood_stats.remove_review(instance)
+    forget_review_total(instance.movie_id)
+    bump_movie_version(instance.movie_id)
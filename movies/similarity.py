@@ -0,0 +1,261 @@
+# movies/similarity.py
+"""
+หาหนังที่ "ให้อารมณ์คล้ายกัน" จาก mood profile ของแต่ละเรื่อง
+(ค่าเฉลี่ยคะแนนแต่ละอารมณ์ใน MovieMoodStats แบบเดียวกับ Radar Chart)
+
+- โหลด profile ทุกเรื่องเป็น matrix NumPy ใน memory ของแต่ละ process (แถว = หนัง, คอลัมน์ = อารมณ์)
+- similar(): cosine similarity = dot product ของแถวที่ normalize แล้ว + argpartition หา top-K
+- blend(): จัดอันดับหนังตามระยะห่างจาก profile เป้าหมายหลายอารมณ์ (เช่น ตลก ≥ 3, น่ากลัว ≤ 1, อบอุ่น ~4)
+- refresh(): ทุก refresh_interval วินาที ดึงเฉพาะแถว MovieMoodStats ที่ updated_at ใหม่กว่ารอบก่อน
+  ถ้ารายการอารมณ์เปลี่ยน (เพิ่ม/ลบ Mood) หรือมีแถวถูกลบ (ลบหนัง, rebuild_mood_stats) จะโหลดใหม่ทั้งหมด
+"""
+import datetime
+import math
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .models import Mood, Movie, MovieMoodStats
+
+# ดึงแถวที่เปลี่ยนย้อนหลังเผื่อไว้นิดหน่อย กัน transaction ที่ commit ช้ากว่า timestamp ของตัวเอง
+REFRESH_OVERLAP = datetime.timedelta(seconds=5)
+
+
+class MoodVectorIndex:
+    def __init__(self, refresh_interval=5.0):
+        self.refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+        self.loaded = False
+        self.checked_at = 0.0
+        self._reset([])
+
+    def _reset(self, mood_ids, capacity=1024):
+        self.mood_ids = list(mood_ids)
+        self.columns = {mood_id: i for i, mood_id in enumerate(self.mood_ids)}
+        self.movie_ids = np.zeros(capacity, dtype=np.int64)
+        self.profiles = np.zeros((capacity, len(self.mood_ids)), dtype=np.float32)
+        self.normalized = np.zeros_like(self.profiles)
+        self.rows = {}
+        self.size = 0
+        self.watermark = None
+        # (movie_id, mood_id) ที่เคยเห็น ไว้เทียบจำนวนกับ DB ว่ามีแถวหายไปไหม
+        self.entries = set()
+
+    # ---------- โหลด/อัปเดต ----------
+
+    def refresh(self, force=False):
+        """โหลดครั้งแรก หรืออัปเดตเฉพาะหนังที่คะแนนเปลี่ยน (ไม่เกินทุก refresh_interval วินาที)"""
+        if not force and self.loaded and time.monotonic() - self.checked_at < self.refresh_interval:
+            return
+        with self._lock:
+            if not force and self.loaded and time.monotonic() - self.checked_at < self.refresh_interval:
+                return
+            mood_ids = list(Mood.objects.order_by('id').values_list('id', flat=True))
+            if force or not self.loaded or mood_ids != self.mood_ids:
+                self._load_all(mood_ids)
+            else:
+                self._load_changes()
+            self.loaded = True
+            self.checked_at = time.monotonic()
+
+    def _load_all(self, mood_ids):
+        rows = list(MovieMoodStats.objects.values_list('movie_id', 'mood_id', 'avg_intensity', 'updated_at'))
+        movie_count = len({r[0] for r in rows})
+        self._reset(mood_ids, capacity=max(1024, int(movie_count * 1.25)))
+        self._apply(rows)
+
+    def _load_changes(self):
+        stats = MovieMoodStats.objects.all()
+        if self.watermark is not None:
+            stats = stats.filter(updated_at__gte=self.watermark - REFRESH_OVERLAP)
+        self._apply(list(stats.values_list('movie_id', 'mood_id', 'avg_intensity', 'updated_at')))
+        # แถวที่ถูกลบไม่มี updated_at ให้ดึง ถ้าเหลือใน DB น้อยกว่าที่เราเคยเห็นแปลว่ามีแถวหาย
+        # โหลดใหม่ทั้งหมด ไม่งั้นค่าเก่า/หนังที่ถูกลบจะค้างใน index จน restart
+        if MovieMoodStats.objects.filter(mood_id__in=self.mood_ids).count() < len(self.entries):
+            self._load_all(self.mood_ids)
+
+    def _row_for(self, movie_id):
+        row = self.rows.get(movie_id)
+        if row is None:
+            if self.size == len(self.movie_ids):
+                self._grow(self.size * 2)
+            row = self.size
+            self.rows[movie_id] = row
+            self.movie_ids[row] = movie_id
+            self.size += 1
+        return row
+
+    def _grow(self, capacity):
+        for name in ('movie_ids', 'profiles', 'normalized'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def _apply(self, rows):
+        if not rows:
+            return
+        touched = set()
+        for movie_id, mood_id, avg, updated_at in rows:
+            column = self.columns.get(mood_id)
+            if column is None:
+                continue
+            row = self._row_for(movie_id)
+            self.profiles[row, column] = avg
+            self.entries.add((movie_id, mood_id))
+            touched.add(row)
+            if self.watermark is None or updated_at > self.watermark:
+                self.watermark = updated_at
+
+        touched = np.fromiter(touched, dtype=np.int64, count=len(touched))
+        vectors = self.profiles[touched]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.normalized[touched] = np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+    # ---------- query ----------
+
+    def profile(self, movie_id):
+        """mood profile ของหนัง {mood_id: avg} (None ถ้ายังไม่มีคะแนน)"""
+        self.refresh()
+        row = self.rows.get(movie_id)
+        if row is None:
+            return None
+        return dict(zip(self.mood_ids, self.profiles[row].tolist()))
+
+    def similar(self, movie_id, k=10):
+        """[(movie_id, cosine similarity)] ของหนังที่ใกล้ที่สุด k เรื่อง (ไม่รวมตัวเอง, similarity > 0)"""
+        self.refresh()
+        with self._lock:
+            row = self.rows.get(movie_id)
+            if row is None:
+                return []
+            matrix = self.normalized[:self.size]
+            query = matrix[row]
+            if not query.any():
+                return []
+            scores = matrix @ query
+            movie_ids = self.movie_ids[:self.size]
+        scores[row] = -1.0
+
+        k = min(k, len(scores) - 1)
+        if k <= 0:
+            return []
+        top = np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(-scores[top])]
+        return [(int(movie_ids[i]), float(scores[i])) for i in top if scores[i] > 0]
+
+    def blend(self, targets, offset=0, limit=20, movie_ids=None):
+        """
+        จัดอันดับหนังตามความใกล้กับเป้าหมาย targets = [(mood_id, op, value, weight)]
+        op: 'gte' (อย่างน้อย), 'lte' (ไม่เกิน), 'near' (ประมาณ)
+        ระยะห่าง = sqrt(sum(weight * ส่วนที่ขาด/เกินเป้า^2)) ยิ่งน้อยยิ่งตรง
+        movie_ids (ถ้าระบุ) จำกัดเฉพาะหนังในชุดนี้
+        คืน (จำนวนหนังที่เข้าข่ายทั้งหมด, [(movie_id, distance)] ของช่วง offset..offset+limit)
+        """
+        self.refresh()
+        with self._lock:
+            profiles = self.profiles[:self.size]
+            ids = self.movie_ids[:self.size]
+            # เฉพาะหนังที่มีคะแนนอารมณ์อย่างน้อยหนึ่งอย่าง
+            mask = profiles.any(axis=1)
+            if movie_ids is not None:
+                mask &= np.isin(ids, np.asarray(list(movie_ids), dtype=np.int64))
+            candidates = np.flatnonzero(mask)
+
+            distance = np.zeros(len(candidates), dtype=np.float32)
+            for mood_id, op, value, weight in targets:
+                column = self.columns.get(mood_id)
+                if column is None:
+                    continue
+                values = profiles[candidates, column]
+                if op == 'gte':
+                    gap = np.maximum(value - values, 0)
+                elif op == 'lte':
+                    gap = np.maximum(values - value, 0)
+                else:
+                    gap = values - value
+                distance += weight * gap * gap
+            candidate_ids = ids[candidates]
+        distance = np.sqrt(distance)
+
+        total = len(candidates)
+        end = min(offset + limit, total)
+        if offset >= end:
+            return total, []
+        # เรียงแค่ส่วนที่ต้องใช้ (argpartition) ไม่ต้อง sort ทั้งแคตตาล็อก
+        # ระยะที่เท่ากับตัวสุดท้ายต้องเอามาให้ครบ argpartition เลือกตัวที่เสมอกันแบบไม่แน่นอน
+        # ถ้าไม่เอามาทั้งหมด แต่ละหน้าอาจได้คนละชุดจนหนังบางเรื่องซ้ำ/หายระหว่างหน้า
+        if end < total:
+            boundary = distance[np.argpartition(distance, end - 1)[end - 1]]
+            top = np.flatnonzero(distance <= boundary)
+        else:
+            top = np.arange(total)
+        top = top[np.lexsort((candidate_ids[top], distance[top]))][offset:end]
+        return total, [(int(candidate_ids[i]), float(distance[i])) for i in top]
+
+
+mood_index = MoodVectorIndex(refresh_interval=getattr(settings, 'MOOD_INDEX_REFRESH_INTERVAL', 5.0))
+
+
+def similar_movies(movie, limit=8):
+    """หนังที่อารมณ์คล้าย movie (Movie object มี .similarity เป็น % ติดมาด้วย) เรียงจากคล้ายมากไปน้อย"""
+    neighbours = mood_index.similar(movie.pk, k=limit)
+    movies = Movie.objects.in_bulk([movie_id for movie_id, _ in neighbours])
+    results = []
+    for movie_id, score in neighbours:
+        if movie_id in movies:
+            similar = movies[movie_id]
+            similar.similarity = round(score * 100)
+            results.append(similar)
+    return results
+
+
+# ตัวดำเนินการของ blend search (ค่าใน query string -> สัญลักษณ์ที่แสดงในหน้าเว็บ)
+BLEND_OPS = {'gte': '≥', 'lte': '≤', 'near': '~'}
+MAX_INTENSITY = 5
+
+
+def parse_blend(params, moods):
+    """
+    อ่านเป้าหมาย blend จาก GET: op_<mood_id>=gte|lte|near, t_<mood_id>=0-5, w_<mood_id>=น้ำหนัก (ไม่ใส่ = 1)
+    คืน [(mood_id, op, value, weight)] เฉพาะอารมณ์ที่เลือกไว้
+    """
+    targets = []
+    for mood in moods:
+        op = params.get(f'op_{mood.id}')
+        if op not in BLEND_OPS:
+            continue
+        try:
+            value = float(params.get(f't_{mood.id}', ''))
+            weight = float(params.get(f'w_{mood.id}') or 1)
+        except ValueError:
+            continue
+        # float() รับ 'nan'/'inf' ได้ ค่าแบบนี้ทำให้ระยะห่างเป็น nan ทั้งหมดจนจัดอันดับไม่ได้
+        if not (math.isfinite(value) and math.isfinite(weight)):
+            continue
+        targets.append((mood.id, op, min(max(value, 0), MAX_INTENSITY), max(weight, 0)))
+    return targets
+
+
+def blend_search(targets, page=1, per_page=20, movie_ids=None):
+    """
+    หน้า page ของผล blend search คืน dict: movies (Movie มี .match เป็น %), total, page, num_pages
+    match = 100% เมื่อตรงเป้าทุกข้อ และลดลงตามระยะห่างเทียบกับระยะที่ไกลที่สุดที่เป็นไปได้
+    """
+    total, ranked = mood_index.blend(targets, offset=(page - 1) * per_page, limit=per_page, movie_ids=movie_ids)
+    max_distance = MAX_INTENSITY * math.sqrt(sum(weight for _, _, _, weight in targets) or 1)
+    movies = Movie.objects.in_bulk([movie_id for movie_id, _ in ranked])
+    results = []
+    for movie_id, distance in ranked:
+        if movie_id in movies:
+            movie = movies[movie_id]
+            movie.match = round(100 * max(0.0, 1 - distance / max_distance))
+            results.append(movie)
+    return {
+        'movies': results,
+        'total': total,
+        'page': page,
+        'num_pages': max(1, math.ceil(total / per_page)),
+    }
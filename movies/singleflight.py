@@ -0,0 +1,170 @@
+# movies/singleflight.py
+"""
+รวม request ที่ซ้ำกันให้เหลือการเรียกจริงครั้งเดียว (request coalescing)
+
+- SingleFlight: ภายใน process เดียว ใครขอ key เดียวกันพร้อมกันจะรอผลจากการเรียกครั้งแรก
+- coalesce_across_workers: ข้าม process (หลาย gunicorn worker) ผ่าน Django cache
+  ใช้ cache.add เป็น lock แล้วฝากผล (หรือ error) ไว้ใน cache ช่วงสั้น ๆ ให้ worker อื่นหยิบไปใช้
+  (ต้องตั้ง CACHES เป็น backend ที่ใช้ร่วมกันได้ เช่น Redis/Memcached ถึงจะเห็นผลข้าม worker)
+"""
+import asyncio
+import hashlib
+import logging
+import random
+import threading
+import time
+import uuid
+
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        # (loop, future) ของคนที่รอแบบ async
+        self.waiters = []
+
+    def outcome(self):
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class SingleFlight:
+    """
+    ใช้ได้ทั้งจากโค้ด sync (do) และ async (ado) โดยใช้ key ชุดเดียวกัน
+    คนรอแบบ sync รอบน threading.Event คนรอแบบ async รอ future ของ event loop ตัวเอง (ไม่กิน thread)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def _join(self, key, loop=None):
+        """คืน (call, leader, future) future มีเฉพาะคนรอแบบ async"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                return call, True, None
+            future = None
+            if loop is not None:
+                future = loop.create_future()
+                call.waiters.append((loop, future))
+            return call, False, future
+
+    def _finish(self, key, call):
+        # ลบ key กับ set event ใน lock เดียวกัน คนที่ _join เข้ามาหลังจากนี้จะเป็น leader รอบใหม่ ไม่ตกหล่น
+        with self._lock:
+            del self._calls[key]
+            call.event.set()
+            waiters, call.waiters = call.waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+    def do(self, key, fn):
+        """เรียก fn() สำหรับ key นี้ ถ้ามีคนกำลังเรียกอยู่แล้วให้รอผลเดียวกัน"""
+        call, leader, _ = self._join(key)
+        if not leader:
+            call.event.wait()
+            return call.outcome()
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            self._finish(key, call)
+
+    async def ado(self, key, afn):
+        """เหมือน do() แต่ afn เป็น coroutine function รอผลร่วมกับคนที่เรียก do()/ado() ด้วย key เดียวกัน"""
+        call, leader, future = self._join(key, asyncio.get_running_loop())
+        if not leader:
+            await future
+            return call.outcome()
+
+        try:
+            call.result = await afn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            self._finish(key, call)
+
+
+def _digest(key):
+    return hashlib.md5(repr(key).encode('utf-8')).hexdigest()
+
+
+class CoalesceTimeout(TimeoutError):
+    """รอผลจาก worker ที่ถือ lock อยู่นานเกินเวลาที่ยอมรอ"""
+
+
+def _remember_failure(cache, error_key, error, error_ttl):
+    try:
+        cache.set(error_key, error, error_ttl)
+    except Exception:  # exception บางตัว pickle ไม่ได้ ก็ไม่ต้องฝาก คนรอจะแย่ง lock ต่อเอง
+        logger.debug("Could not cache coalesced failure %r", error, exc_info=True)
+
+
+def coalesce_across_workers(key, fn, cache_alias='default', lock_ttl=10, wait=5.0,
+                            result_ttl=30, error_ttl=2, poll_interval=0.05, max_poll_interval=0.5):
+    """
+    ให้มีแค่ worker เดียวที่เรียก fn() สำหรับ key นี้ในช่วงเวลาหนึ่ง
+    - คนที่ได้ lock (cache.add) เรียก fn() แล้วฝากผลไว้ result_ttl วินาที
+      ถ้า fn() พังจะฝาก exception ไว้ error_ttl วินาที คนที่รออยู่ได้ exception นั้นไปเลย ไม่แห่กันเรียกซ้ำ
+    - คนอื่นรอดูผลแบบ backoff (เริ่ม poll_interval เพิ่มเท่าตัวจนถึง max_poll_interval)
+      ถ้า lock หายไปแต่ไม่มีผล (เจ้าของตาย/lock หมดอายุ) ก็แย่ง lock ใหม่ด้วย cache.add ได้คนเดียวที่เรียก fn()
+    - รอเกิน wait วินาทียังไม่มีผล raise CoalesceTimeout (ไม่เรียก fn() เองพร้อมกันทุกคน)
+    ภายใน process ควรครอบด้วย SingleFlight ก่อน ต่อ key จะมี thread ที่รออยู่ตรงนี้แค่ตัวเดียว
+    """
+    cache = caches[cache_alias]
+    digest = _digest(key)
+    result_key = f'sf:result:{digest}'
+    error_key = f'sf:error:{digest}'
+    lock_key = f'sf:lock:{digest}'
+
+    deadline = time.monotonic() + wait
+    delay = poll_interval
+    while True:
+        found = cache.get_many([result_key, error_key])
+        if found.get(result_key) is not None:
+            return found[result_key]
+        if found.get(error_key) is not None:
+            raise found[error_key]
+
+        token = uuid.uuid4().hex
+        if cache.add(lock_key, token, lock_ttl):
+            try:
+                try:
+                    value = fn()
+                except Exception as e:
+                    _remember_failure(cache, error_key, e, error_ttl)
+                    raise
+                # ฝากผลก่อนปลด lock คนที่รออยู่จะไม่เห็นช่วงที่ไม่มีทั้ง lock และผล
+                cache.set(result_key, value, result_ttl)
+                return value
+            finally:
+                # ปลด lock เฉพาะของตัวเอง (เผื่อ lock หมดอายุแล้วมีคนอื่นถือต่อ)
+                if cache.get(lock_key) == token:
+                    cache.delete(lock_key)
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise CoalesceTimeout(f"Coalesced call for {key!r} not ready after {wait}s")
+        time.sleep(min(random.uniform(delay / 2, delay), remaining))
+        delay = min(delay * 2, max_poll_interval)
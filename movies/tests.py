@@ -1,3 +1,1689 @@
-from django.test import TestCase
+import asyncio
+import base64
+import datetime
+import json
+import math
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+from wsgiref.simple_server import make_server
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts import views as account_views
+from . import cache as ttl_cache, evaluation, fragments, mood_stats, recommender, services, tmdb, tmdb_standin, utils, views
+from .genres import GenreRegistry
+from .moods import mood_registry
+from .ratelimit import BACKGROUND, INTERACTIVE, RateLimiter
+from .resolver import movie_resolver
+from .management.commands.evaluate_recommenders import Command as EvaluateCommand
+from .management.commands.generate_synthetic_data import (
+    DEFAULT_MOODS, SYNTHETIC_TMDB_BASE, Command as SyntheticDataCommand,
+)
+from .management.commands.tmdb_standin import QuietHandler, ThreadingWSGIServer
+from .tmdb import CircuitBreaker, TMDbClient, TMDbHTTPError, TMDbNotFound, TMDbTimeout, TMDbUnavailable
+from .similarity import MoodVectorIndex, blend_search, parse_blend
+from .singleflight import CoalesceTimeout, SingleFlight, _digest, coalesce_across_workers
+from .utils import upsert_movie_from_tmdb
+from .models import (
+    Bookmark, CustomList, Favorite, Genre, Mood, Movie, MovieMoodStats, Profile, Review, ReviewMoodScore,
+)
+from .reviews import (InvalidCursor, decode_cursor, encode_cursor, review_page, review_page_queryset,
+                      review_total)
+
+
+class HotQueryIndexTests(TestCase):
+    """
+    ตรวจจาก EXPLAIN ว่า query หลักของแต่ละหน้าใช้ index ที่สร้างไว้ใน 0013/0014 จริง
+    PostgreSQL ปิด seq scan ก่อน (ข้อมูลทดสอบน้อย ถ้าไม่ปิด planner อ่านทั้งตารางถูกกว่า)
+    ถ้า index ไม่ตรงกับรูปแบบ query ก็ยังจะเห็นว่าไม่ได้ใช้ index นั้นอยู่ดี
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.moods = Mood.objects.bulk_create([Mood(name=name) for name in ('Happy', 'Sad', 'Tense')])
+        cls.users = User.objects.bulk_create([User(username=f'index_user_{i}') for i in range(20)])
+        cls.movies = Movie.objects.bulk_create([
+            Movie(tmdb_id=900000 + i, title=f'Index Movie {i}') for i in range(50)
+        ])
+        reviews = Review.objects.bulk_create([
+            Review(user=user, movie=cls.movies[(u * 7 + m) % len(cls.movies)])
+            for u, user in enumerate(cls.users) for m in range(10)
+        ])
+        ReviewMoodScore.objects.bulk_create([
+            ReviewMoodScore(review=review, mood=mood, intensity=(review.pk + m) % 6)
+            for review in reviews for m, mood in enumerate(cls.moods)
+        ])
+        Favorite.objects.bulk_create([
+            Favorite(user=user, movie=cls.movies[(u + m) % len(cls.movies)])
+            for u, user in enumerate(cls.users) for m in range(5)
+        ])
+        Bookmark.objects.bulk_create([
+            Bookmark(user=user, movie=cls.movies[(u * 3 + m) % len(cls.movies)])
+            for u, user in enumerate(cls.users) for m in range(5)
+        ])
+        CustomList.objects.bulk_create([
+            CustomList(user=user, name=f'List {i}', is_public=bool(i % 2))
+            for user in cls.users for i in range(4)
+        ])
+        mood_stats.rebuild_mood_stats()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def plan(self, queryset):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = self.plan(queryset)
+        self.assertIn(index_name, plan, f'ไม่ได้ใช้ {index_name}:\n{plan}')
+
+    def test_mood_search_uses_partial_mood_intensity_index(self):
+        self.assertUsesIndex(views._mood_search_queryset(self.moods[0].id), 'moodscore_mood_intensity_idx')
+
+    def test_mood_leaderboard_uses_leaderboard_index(self):
+        self.assertUsesIndex(mood_stats.leaderboard(self.moods[0]), 'moodstats_leaderboard_idx')
+
+    def test_movie_reviews_use_keyset_index(self):
+        self.assertUsesIndex(review_page_queryset(self.movies[0]), 'review_movie_keyset_idx')
+
+    def test_next_review_page_uses_keyset_index(self):
+        _, cursor = review_page(self.movies[0], limit=2)
+        self.assertUsesIndex(review_page_queryset(self.movies[0], cursor=cursor), 'review_movie_keyset_idx')
+
+    def test_profile_lists_use_user_created_indexes(self):
+        activity = account_views._profile_activity(self.users[0])
+        for name, index_name in (('recent_reviews', 'review_user_created_idx'),
+                                 ('favorites', 'favorite_user_created_idx'),
+                                 ('bookmarks', 'bookmark_user_created_idx')):
+            with self.subTest(name):
+                self.assertUsesIndex(activity[name], index_name)
+
+    def test_my_lists_use_user_created_index(self):
+        self.assertUsesIndex(views._my_lists_queryset(self.users[0]), 'customlist_user_created_idx')
+
+    def test_public_lists_use_partial_public_index(self):
+        self.assertUsesIndex(views._public_lists_queryset(self.users[0]), 'customlist_public_idx')
+
+    @skipUnless(connection.vendor == 'postgresql', 'trigram GIN index มีเฉพาะ PostgreSQL')
+    def test_title_search_uses_trigram_index(self):
+        movies = views._filter_movies(Movie.objects.all(), 'movie 4', None, None)
+        self.assertUsesIndex(movies, 'movie_title_trgm_idx')
+
+
+class DetailFragmentCacheTests(TestCase):
+    """fragment ของหน้า detail ต้องไม่ถูก cache แบบข้อมูลว่าง ต่อให้หลุดจาก cache หลังเช็กไปแล้ว"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = Movie.objects.create(tmdb_id=910001, title='Fragment Movie', last_synced_at=timezone.now())
+        cls.movie.genres.add(Genre.objects.create(tmdb_id=18, name='FragmentGenre'))
+        user = User.objects.create(username='fragment_reviewer')
+        Review.objects.create(user=user, movie=cls.movie, comment='fragment review text')
+
+    def setUp(self):
+        cache.clear()
+        caches['template_fragments'].clear()
+        self.url = reverse('movie_detail', args=[self.movie.tmdb_id])
+
+    def cached_fragment(self, name):
+        version = fragments.movie_version(self.movie.id)
+        return caches['template_fragments'].get(fragments.fragment_key(name, self.movie.id, version))
+
+    def test_fragment_evicted_before_render_is_rendered_with_data(self):
+        self.client.get(self.url)
+        build_context = views._movie_detail_context
+
+        def evict_after_check(*args, **kwargs):
+            context = build_context(*args, **kwargs)
+            caches['template_fragments'].clear()
+            return context
+
+        with mock.patch.object(views, '_movie_detail_context', evict_after_check):
+            response = self.client.get(self.url)
+
+        self.assertContains(response, 'FragmentGenre')
+        self.assertContains(response, 'fragment review text')
+        self.assertIn('FragmentGenre', self.cached_fragment(fragments.HEADER))
+        self.assertIn('fragment review text', self.cached_fragment(fragments.REVIEWS))
+
+    def test_cached_fragments_skip_shared_queries(self):
+        self.client.get(self.url)
+        with mock.patch.object(views, 'review_page', side_effect=AssertionError('review_page ถูกเรียก')), \
+             mock.patch.object(views.mood_stats, 'radar_stats', side_effect=AssertionError('radar_stats ถูกเรียก')):
+            response = self.client.get(self.url)
+        self.assertContains(response, 'fragment review text')
+
+    def test_new_version_renders_fresh_fragments(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            fragments.bump_movie_version(self.movie.id)
+        Review.objects.create(user=User.objects.create(username='late_reviewer'), movie=self.movie, comment='later review')
+        self.assertContains(self.client.get(self.url), 'later review')
+
+
+def _tmdb_detail(tmdb_id, title='Resolved Movie'):
+    """ผลของ get_movie_details_tmdb แบบย่อ สำหรับทดสอบ"""
+    payload = {'id': tmdb_id, 'title': title, 'poster_path': None, 'overview': '', 'release_date': '2020-01-01',
+               'vote_average': 7.0, 'runtime': 100, 'genres': [{'id': 18, 'name': 'Drama'}]}
+    return {'tmdb_id': tmdb_id, 'title': title, 'poster_path': None, 'payload': payload}
+
+
+class MovieResolverStalePkTests(TransactionTestCase):
+    """pk ใน LRU ของ worker อื่นที่หนังถูกลบแล้วนำเข้าใหม่ ต้องไม่ทำให้ปุ่ม Favorite/List พัง"""
+
+    def setUp(self):
+        movie_resolver.clear()
+        self.user = User.objects.create(username='stale_pk_user')
+        self.client.force_login(self.user)
+        old = Movie.objects.create(tmdb_id=920001, title='Old Row')
+        self.dead_pk = old.pk
+        old.delete()
+        self.movie = Movie.objects.create(tmdb_id=920001, title='Re-imported Row')
+        # เหมือน LRU ของ worker ที่ไม่เห็นการลบ
+        movie_resolver._remember([(920001, self.dead_pk)])
+
+    def tearDown(self):
+        movie_resolver.clear()
+
+    def test_toggle_favorite_retries_with_fresh_pk(self):
+        response = self.client.post(reverse('toggle_favorite', args=[920001]))
+        self.assertEqual(response.json(), {'status': 'added'})
+        self.assertTrue(Favorite.objects.filter(user=self.user, movie=self.movie).exists())
+        self.assertEqual(movie_resolver._cached_pk(920001), self.movie.pk)
+
+    def test_toggle_list_movie_retries_with_fresh_pk(self):
+        custom_list = CustomList.objects.create(user=self.user, name='Stale')
+        response = self.client.post(reverse('toggle_list_movie', args=[custom_list.id, 920001]))
+        self.assertEqual(response.json()['status'], 'added')
+        self.assertEqual(list(custom_list.movies.all()), [self.movie])
+
+    def test_resolve_ignores_dead_pk(self):
+        self.assertEqual(movie_resolver.resolve(920001, fetch=False), self.movie)
+
+
+class MovieResolverFetchTests(TestCase):
+    def setUp(self):
+        movie_resolver.clear()
+
+    def test_sync_fetch_upserts_full_fields(self):
+        with mock.patch('movies.resolver.get_movie_details_tmdb', return_value=_tmdb_detail(920101)):
+            movie = movie_resolver.resolve(920101)
+        self.assertEqual(movie.vote_average, 7.0)
+        self.assertEqual([g.name for g in movie.genres.all()], ['Drama'])
+        self.assertIsNotNone(movie.last_synced_at)
+
+    def test_missing_movie_raises_does_not_exist(self):
+        with mock.patch('movies.resolver.get_movie_details_tmdb', return_value=None):
+            with self.assertRaises(Movie.DoesNotExist):
+                movie_resolver.with_movie_id(920102, lambda movie_id: None)
+
+    def test_resolve_pks_uses_one_query(self):
+        movies = Movie.objects.bulk_create([Movie(tmdb_id=920200 + i, title=f'Bulk {i}') for i in range(5)])
+        with self.assertNumQueries(1):
+            pks = movie_resolver.resolve_pks([m.tmdb_id for m in movies] + [999999999])
+        self.assertEqual(pks, {m.tmdb_id: m.pk for m in movies})
+
+    async def test_concurrent_async_first_hits_fetch_and_upsert_once(self):
+        calls = []
+
+        async def slow_fetch(tmdb_id):
+            calls.append(tmdb_id)
+            await asyncio.sleep(0.05)
+            return _tmdb_detail(tmdb_id)
+
+        with mock.patch('movies.resolver.aget_movie_details_tmdb', slow_fetch), \
+             mock.patch('movies.resolver.upsert_movie_from_tmdb', wraps=upsert_movie_from_tmdb) as upsert:
+            movies = await asyncio.gather(*(movie_resolver.aresolve(920301) for _ in range(5)))
+
+        self.assertEqual(calls, [920301])
+        self.assertEqual(upsert.call_count, 1)
+        self.assertEqual({movie.pk for movie in movies}, {movies[0].pk})
+        self.assertEqual(len({id(movie) for movie in movies}), 5)
+
+
+class CoalesceAcrossWorkersTests(SimpleTestCase):
+    """หลาย thread ใช้ LocMem ตัวเดียวกัน (แทนหลาย worker ที่ใช้ cache ร่วมกัน)"""
+    threads = 8
+
+    def setUp(self):
+        cache.clear()
+
+    def run_together(self, call):
+        barrier = threading.Barrier(self.threads)
+
+        def worker():
+            barrier.wait()
+            try:
+                return call()
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=self.threads) as pool:
+            return list(pool.map(lambda _: worker(), range(self.threads)))
+
+    def test_one_call_serves_all_waiters(self):
+        calls = []
+
+        def fn():
+            calls.append(1)
+            time.sleep(0.1)
+            return {'ok': True}
+
+        results = self.run_together(lambda: coalesce_across_workers('same-key', fn))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'ok': True}] * self.threads)
+
+    def test_leader_failure_is_shared_not_retried_by_every_waiter(self):
+        calls = []
+
+        def fn():
+            calls.append(1)
+            time.sleep(0.1)
+            raise ValueError('upstream down')
+
+        results = self.run_together(lambda: coalesce_across_workers('failing-key', fn))
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(isinstance(r, ValueError) for r in results), results)
+
+    def test_waiters_recontend_when_lock_owner_dies(self):
+        # worker อื่นถือ lock แล้วตายไปโดยไม่ฝากผล lock หมดอายุใน 1 วินาที
+        cache.add(f"sf:lock:{_digest('orphan-key')}", 'dead-worker', 1)
+        calls = []
+
+        def fn():
+            calls.append(1)
+            return 'fresh'
+
+        results = self.run_together(lambda: coalesce_across_workers('orphan-key', fn, wait=3.0))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['fresh'] * self.threads)
+
+    def test_gives_up_with_timeout_instead_of_calling_fn(self):
+        cache.add(f"sf:lock:{_digest('slow-key')}", 'slow-worker', 10)
+        fn = mock.Mock(return_value='x')
+        with self.assertRaises(CoalesceTimeout):
+            coalesce_across_workers('slow-key', fn, wait=0.2)
+        fn.assert_not_called()
+
+
+class SingleFlightTests(SimpleTestCase):
+    def test_threads_share_one_call(self):
+        flight, calls = SingleFlight(), []
+        barrier = threading.Barrier(6)
+
+        def fn():
+            calls.append(1)
+            time.sleep(0.1)
+            return 42
+
+        def worker():
+            barrier.wait()
+            return flight.do('k', fn)
+
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            results = list(pool.map(lambda _: worker(), range(6)))
+        self.assertEqual(results, [42] * 6)
+        self.assertEqual(len(calls), 1)
+
+    def test_async_waiter_joins_sync_leader(self):
+        flight, started = SingleFlight(), threading.Event()
+
+        def fn():
+            started.set()
+            time.sleep(0.1)
+            return 'shared'
+
+        async def follower():
+            await asyncio.get_running_loop().run_in_executor(None, started.wait)
+            return await flight.ado('k', mock.AsyncMock(side_effect=AssertionError('ไม่ควรเรียกซ้ำ')))
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            leader = pool.submit(flight.do, 'k', fn)
+            self.assertEqual(asyncio.run(follower()), 'shared')
+            self.assertEqual(leader.result(), 'shared')
+
+
+class GetPagesDeadlineTests(SimpleTestCase):
+    def setUp(self):
+        self.client_ = TMDbClient(api_key='x', base_url='http://127.0.0.1:9/3', page_workers=4)
+        self.release = threading.Event()
+        self.addCleanup(self.client_.close)
+        self.addCleanup(self.release.set)
+
+    def fake_get(self, slow_pages):
+        def get(path, params=None, endpoint=None, use_cache=True):
+            page = params['page']
+            if page in slow_pages:
+                self.release.wait(5)
+            return {'total_pages': 3, 'results': [{'id': page * 10 + i} for i in range(2)]}
+        return get
+
+    def test_slow_page_is_cut_off_at_deadline(self):
+        self.client_.get = self.fake_get({3})
+        started = time.monotonic()
+        items = self.client_.get_pages('discover/movie', max_pages=3, deadline=0.3)
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual([item['id'] for item in items], [10, 11, 20, 21])
+
+    def test_slow_first_page_counts_against_deadline(self):
+        self.client_.get = self.fake_get({1})
+        started = time.monotonic()
+        with self.assertRaises(TMDbTimeout):
+            self.client_.get_pages('discover/movie', max_pages=3, deadline=0.3)
+        self.assertLess(time.monotonic() - started, 1.0)
+
+    def test_busy_page_pool_does_not_hold_caller_past_deadline(self):
+        # request อื่นยึด page worker ไว้หมด หน้าของเราได้แค่ต่อคิว ต้องคืน thread ตามเวลา
+        self.client_.get = self.fake_get(set())
+        for _ in range(4):
+            self.client_.page_executor.submit(self.release.wait, 5)
+        started = time.monotonic()
+        with self.assertRaises(TMDbTimeout):
+            self.client_.get_pages('discover/movie', max_pages=3, deadline=0.3)
+        self.assertLess(time.monotonic() - started, 1.0)
+
+
+class TMDbStandInIntegrationTests(SimpleTestCase):
+    """TMDbClient ยิง HTTP จริงไปที่ TMDb stand-in (เซิร์ฟเวอร์เดียวกับ manage.py tmdb_standin) ใน thread แยก"""
+
+    def setUp(self):
+        self.app = tmdb_standin.TMDbStandIn(seed=1)
+        self.requests = []
+
+        def recording_app(environ, start_response):
+            self.requests.append(environ['PATH_INFO'])
+            return self.app(environ, start_response)
+
+        server = make_server('127.0.0.1', 0, recording_app,
+                             server_class=ThreadingWSGIServer, handler_class=QuietHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.client_ = TMDbClient(api_key='x', base_url=f'http://127.0.0.1:{server.server_port}/3',
+                                  backoff_base=0.01, backoff_max=0.02)
+        self.addCleanup(self.client_.close)
+
+    def test_get_pages_merges_all_pages(self):
+        items = self.client_.get_pages('movie/popular', max_pages=5, use_cache=False)
+        expected = sorted(self.app.movies, key=lambda m: -m['popularity'])
+        self.assertEqual([item['id'] for item in items], [m['id'] for m in expected])
+        self.assertEqual(len(self.requests), math.ceil(len(expected) / tmdb_standin.PAGE_SIZE))
+
+    def test_rate_limited_request_is_retried(self):
+        # ครั้งแรกโดน 429 (Retry-After) ครั้งที่สองผ่าน
+        self.app.rate_limit_rate = 0.5
+        self.app.random = mock.Mock(random=mock.Mock(side_effect=[0.1, 0.9]))
+        movie = self.app.movies[0]
+        with self.assertLogs('movies.tmdb', 'INFO'):
+            data = self.client_.get(f"movie/{movie['id']}", endpoint='movie/{id}', use_cache=False)
+        self.assertEqual(data['title'], movie['title'])
+        self.assertEqual(len(self.requests), 2)
+
+    def test_server_errors_give_up_after_max_retries(self):
+        self.app.error_rate = 1.0
+        with self.assertLogs('movies.tmdb', 'INFO'), self.assertRaises(TMDbHTTPError) as raised:
+            self.client_.get('movie/popular', use_cache=False)
+        self.assertIn(raised.exception.status_code, (500, 502, 503))
+        self.assertEqual(len(self.requests), self.client_.max_retries + 1)
+
+    def test_unknown_movie_is_not_retried(self):
+        with self.assertRaises(TMDbNotFound):
+            self.client_.get('movie/1', endpoint='movie/{id}', use_cache=False)
+        self.assertEqual(len(self.requests), 1)
+
+
+class FakeClock:
+    """
+    แทนโมดูล time (movies.ratelimit, movies.cache, movies.tmdb) sleep แค่เลื่อนเวลา
+    แล้วเรียก on_sleep (แทน worker อื่นที่ทำงานระหว่างนั้น)
+    """
+
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.on_sleep = None
+
+    def time(self):
+        return self.now
+
+    monotonic = time
+
+    def sleep(self, seconds):
+        self.now += seconds
+        if self.on_sleep:
+            self.on_sleep()
+
+
+class RateLimiterLaneTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.clock = FakeClock()
+        patcher = mock.patch('movies.ratelimit.time', SimpleNamespace(time=self.clock.time, sleep=self.clock.sleep))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.limiter = RateLimiter(rate=4, per=1.0, background_share=0.5,
+                                   max_wait={INTERACTIVE: 2.0, BACKGROUND: 0}, key_prefix='test:rl')
+
+    def test_background_is_capped_and_rest_is_reserved_for_interactive(self):
+        self.assertEqual([self.limiter.acquire(BACKGROUND) for _ in range(3)], [True, True, False])
+        self.assertEqual([self.limiter.acquire(INTERACTIVE) for _ in range(2)], [True, True])
+
+    def test_background_yields_while_interactive_is_waiting(self):
+        for _ in range(4):
+            self.assertTrue(self.limiter.acquire(INTERACTIVE))
+        background_attempts = []
+        # ระหว่างที่ interactive หลับรอรอบหน้า มีงาน background ของ worker อื่นมาแย่ง
+        self.clock.on_sleep = lambda: background_attempts.append(
+            self.limiter._try_acquire(BACKGROUND, self.clock.now)[0])
+
+        self.assertTrue(self.limiter.acquire(INTERACTIVE))
+        self.assertEqual(background_attempts, [False])
+        # interactive ได้แล้ว background ใช้รอบนี้ต่อได้
+        self.assertTrue(self.limiter._try_acquire(BACKGROUND, self.clock.now)[0])
+
+    def test_interactive_that_gives_up_releases_its_reservation(self):
+        self.limiter.max_wait[INTERACTIVE] = 0
+        for _ in range(4):
+            self.limiter.acquire(INTERACTIVE)
+        self.assertFalse(self.limiter.acquire(INTERACTIVE))
+        self.clock.now += 1.0
+        self.assertTrue(self.limiter.acquire(BACKGROUND))
+
+    def test_penalize_blocks_every_lane_until_retry_after(self):
+        self.limiter.penalize(3.0)
+        self.assertFalse(self.limiter.acquire(INTERACTIVE))  # รอได้แค่ 2 วินาที ไม่พอ
+        self.assertFalse(self.limiter.acquire(BACKGROUND))
+        self.clock.now += 3.0
+        self.assertTrue(self.limiter.acquire(INTERACTIVE))
+        self.assertEqual(self.limiter.metrics()['all_workers']['interactive.upstream_429'], 1)
+
+    def test_penalize_shorter_than_max_wait_waits_it_out(self):
+        self.limiter.penalize(1.5)
+        started = self.clock.now
+        self.assertTrue(self.limiter.acquire(INTERACTIVE))
+        self.assertGreaterEqual(self.clock.now - started, 1.5)
+
+
+class AsyncRegistryTests(TestCase):
+    """ทะเบียนใน memory ที่ async view เรียก ต้องไม่ทำ I/O บน thread ของ event loop"""
+
+    def test_genre_registry_cold_refresh_runs_off_the_loop(self):
+        registry = GenreRegistry(snapshot_path='/nonexistent/genres.json')
+        loop_thread, refresh_threads = threading.current_thread(), []
+
+        def refresh():
+            refresh_threads.append(threading.current_thread())
+            registry._replace([{'id': 18, 'name': 'Drama'}], time.time())
+            return True
+
+        with mock.patch.object(registry, 'refresh', refresh):
+            genres = asyncio.run(registry.aall())
+        self.assertEqual(genres, [{'id': 18, 'name': 'Drama'}])
+        self.assertEqual(len(refresh_threads), 1)
+        self.assertIsNot(refresh_threads[0], loop_thread)
+
+    async def test_mood_registry_aget(self):
+        mood = await Mood.objects.acreate(name='Happy')
+        await sync_to_async(mood_registry.invalidate)()
+        self.assertEqual((await mood_registry.aget(mood.id)).name, 'Happy')
+        self.assertIsNone(await mood_registry.aget('not-a-number'))
+        self.assertIsNone(await mood_registry.aget(mood.id + 1000))
+
+
+class ReviewServiceTests(TestCase):
+    """create/update/delete_review ต้องเขียนรีวิว คะแนน สถิติ จำนวนรีวิว และเวอร์ชันของหนังไปพร้อมกัน"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.happy, cls.sad, cls.tense = Mood.objects.bulk_create([Mood(name=n) for n in ('Happy', 'Sad', 'Tense')])
+        cls.movie = Movie.objects.create(tmdb_id=920001, title='Service Movie')
+        cls.alice = User.objects.create(username='service_alice')
+        cls.bob = User.objects.create(username='service_bob')
+
+    def setUp(self):
+        cache.clear()
+
+    def stats(self):
+        return {
+            row.mood_id: (row.score_sum, row.score_count, row.avg_intensity)
+            for row in MovieMoodStats.objects.filter(movie=self.movie)
+        }
+
+    def create(self, user, scores, comment='ok'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return services.create_review(user, self.movie, comment, scores)
+
+    def test_create_review_adds_scores_to_stats(self):
+        self.assertEqual(review_total(self.movie.id), 0)
+        version = fragments.movie_version(self.movie.id)
+
+        self.create(self.alice, {self.happy.id: 4, self.sad.id: 2})
+        self.create(self.bob, {self.happy.id: 2, self.tense.id: 0})
+
+        self.assertEqual(self.stats(), {self.happy.id: (6, 2, 3.0), self.sad.id: (2, 1, 2.0)})
+        self.assertEqual(review_total(self.movie.id), 2)
+        self.assertGreater(fragments.movie_version(self.movie.id), version)
+
+    def test_update_review_applies_only_the_difference(self):
+        review = self.create(self.alice, {self.happy.id: 4, self.sad.id: 2})
+        self.create(self.bob, {self.happy.id: 2})
+        version = fragments.movie_version(self.movie.id)
+
+        # sad ไม่ได้ส่งมา = คงค่าเดิม, happy 0 = ลบคะแนน, tense เพิ่มใหม่
+        with self.captureOnCommitCallbacks(execute=True):
+            services.update_review(review, 'edited', {self.happy.id: 0, self.tense.id: 5})
+
+        self.assertEqual(self.stats(), {
+            self.happy.id: (2, 1, 2.0), self.sad.id: (2, 1, 2.0), self.tense.id: (5, 1, 5.0),
+        })
+        self.assertEqual(dict(review.mood_scores.values_list('mood_id', 'intensity')),
+                         {self.sad.id: 2, self.tense.id: 5})
+        self.assertEqual(review_total(self.movie.id), 2)
+        self.assertGreater(fragments.movie_version(self.movie.id), version)
+
+    def test_delete_review_removes_scores_and_total(self):
+        review = self.create(self.alice, {self.happy.id: 4, self.sad.id: 2})
+        self.create(self.bob, {self.happy.id: 2})
+        self.assertEqual(review_total(self.movie.id), 2)
+        version = fragments.movie_version(self.movie.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            services.delete_review(review)
+
+        # แถวของอารมณ์ที่ไม่มีคะแนนเหลือยังอยู่ แต่เป็น 0
+        self.assertEqual(self.stats(), {self.happy.id: (2, 1, 2.0), self.sad.id: (0, 0, 0.0)})
+        self.assertEqual(review_total(self.movie.id), 1)
+        self.assertGreater(fragments.movie_version(self.movie.id), version)
+
+    def test_failed_write_rolls_back_everything(self):
+        review = self.create(self.alice, {self.happy.id: 4})
+        self.assertEqual(review_total(self.movie.id), 1)
+        version, stats = fragments.movie_version(self.movie.id), self.stats()
+
+        failing = mock.patch.object(services.mood_stats, 'apply_score_changes', side_effect=RuntimeError('db down'))
+        with failing, self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError):
+                services.create_review(self.bob, self.movie, 'lost', {self.sad.id: 3})
+            with self.assertRaises(RuntimeError):
+                services.update_review(review, 'lost edit', {self.happy.id: 1})
+
+        self.assertEqual(callbacks, [])
+        self.assertFalse(Review.objects.filter(user=self.bob).exists())
+        review.refresh_from_db()
+        self.assertEqual(review.comment, 'ok')
+        self.assertEqual(dict(review.mood_scores.values_list('mood_id', 'intensity')), {self.happy.id: 4})
+        self.assertEqual(self.stats(), stats)
+        self.assertEqual(review_total(self.movie.id), 1)
+        self.assertEqual(fragments.movie_version(self.movie.id), version)
+
+
+class ReviewStatsConsistencyTests(TestCase):
+    """รีวิวที่ถูกลบ/แก้นอก services (ลบผู้ใช้, ลบหนัง, Django admin) ต้องไม่ทำให้ MovieMoodStats เพี้ยน"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.happy, cls.sad = Mood.objects.bulk_create([Mood(name='Happy'), Mood(name='Sad')])
+        cls.movies = Movie.objects.bulk_create([Movie(tmdb_id=925000 + i, title=f'Cascade {i}') for i in range(2)])
+        cls.alice = User.objects.create(username='cascade_alice')
+        cls.bob = User.objects.create(username='cascade_bob')
+        for user, scores in ((cls.alice, {cls.happy.id: 5, cls.sad.id: 1}), (cls.bob, {cls.happy.id: 3})):
+            for movie in cls.movies:
+                services.create_review(user, movie, 'x', scores)
+
+    def setUp(self):
+        cache.clear()
+
+    def stats(self):
+        return {
+            (row.movie_id, row.mood_id): (row.score_sum, row.score_count, round(row.weighted_score, 6))
+            for row in MovieMoodStats.objects.filter(score_count__gt=0)
+        }
+
+    def assertMatchesRebuild(self):
+        incremental = self.stats()
+        mood_stats.rebuild_mood_stats()
+        self.assertEqual(incremental, self.stats())
+
+    def test_deleting_user_removes_their_scores(self):
+        movie = self.movies[0]
+        self.assertEqual(review_total(movie.id), 2)
+        version = fragments.movie_version(movie.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.alice.delete()
+
+        self.assertEqual(self.stats()[(movie.id, self.happy.id)][:2], (3, 1))
+        self.assertNotIn((movie.id, self.sad.id), self.stats())
+        self.assertEqual(review_total(movie.id), 1)
+        self.assertGreater(fragments.movie_version(movie.id), version)
+        self.assertMatchesRebuild()
+
+    def test_deleting_movie_keeps_other_movies_stats(self):
+        other = self.stats()
+        deleted_id = self.movies[0].id
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movies[0].delete()
+        self.assertEqual(self.stats(), {key: value for key, value in other.items() if key[0] != deleted_id})
+
+    def test_admin_inline_score_edit_updates_stats(self):
+        admin = User.objects.create_superuser('cascade_admin', 'admin@example.com', 'pw')
+        self.client.force_login(admin)
+        review = Review.objects.get(user=self.bob, movie=self.movies[1])
+        score = review.mood_scores.get()
+        version = fragments.movie_version(self.movies[1].id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('admin:movies_review_change', args=[review.pk]), {
+                'comment': 'edited in admin',
+                'mood_scores-TOTAL_FORMS': '2', 'mood_scores-INITIAL_FORMS': '1',
+                'mood_scores-MIN_NUM_FORMS': '0', 'mood_scores-MAX_NUM_FORMS': '1000',
+                'mood_scores-0-id': score.pk, 'mood_scores-0-review': review.pk,
+                'mood_scores-0-mood': self.happy.id, 'mood_scores-0-intensity': '1',
+                'mood_scores-1-review': review.pk, 'mood_scores-1-mood': self.sad.id, 'mood_scores-1-intensity': '4',
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.stats()[(self.movies[1].id, self.happy.id)][:2], (6, 2))
+        self.assertEqual(self.stats()[(self.movies[1].id, self.sad.id)][:2], (5, 2))
+        self.assertGreater(fragments.movie_version(self.movies[1].id), version)
+        self.assertMatchesRebuild()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('admin:movies_review_delete', args=[review.pk]), {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.assertMatchesRebuild()
+
+
+class TTLCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(ttl_cache, 'time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = ttl_cache.TTLCache(maxsize=3)
+        # เก็บงาน refresh ไว้ก่อน จะได้ดูว่าสั่งกี่ครั้งแล้วค่อยรันเอง
+        self.refreshes = []
+        patcher = mock.patch.object(ttl_cache._refresh_executor, 'submit',
+                                    lambda fn, *args: self.refreshes.append((fn, args)))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_refreshes(self):
+        for fn, args in self.refreshes:
+            fn(*args)
+        self.refreshes.clear()
+
+    def test_fresh_then_stale_then_miss(self):
+        self.cache.set('k', 'v', ttl=10, stale_ttl=20)
+        self.assertEqual(self.cache.lookup('k'), ('v', ttl_cache.FRESH))
+        self.clock.now += 10
+        self.assertEqual(self.cache.lookup('k'), ('v', ttl_cache.STALE))
+        self.clock.now += 20
+        self.assertEqual(self.cache.lookup('k'), (None, ttl_cache.MISS))
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual((self.cache.hits, self.cache.stale_hits, self.cache.misses), (1, 1, 1))
+
+    def test_get_or_fetch_serves_stale_and_refreshes_once(self):
+        fetch = mock.Mock(side_effect=['v1', 'v2'])
+        self.assertEqual(self.cache.get_or_fetch('k', fetch, ttl=10, stale_ttl=20), 'v1')
+        self.assertEqual(self.cache.get_or_fetch('k', fetch, ttl=10, stale_ttl=20), 'v1')
+        self.assertEqual(fetch.call_count, 1)
+
+        self.clock.now += 15
+        for _ in range(3):
+            self.assertEqual(self.cache.get_or_fetch('k', fetch, ttl=10, stale_ttl=20), 'v1')
+        self.assertEqual(len(self.refreshes), 1)
+        self.run_refreshes()
+        self.assertEqual(self.cache.lookup('k'), ('v2', ttl_cache.FRESH))
+
+    def test_failed_refresh_keeps_stale_value(self):
+        self.cache.set('k', 'old', ttl=10, stale_ttl=20)
+        self.clock.now += 15
+        fetch = mock.Mock(side_effect=RuntimeError('tmdb down'))
+        self.assertEqual(self.cache.get_or_fetch('k', fetch, ttl=10, stale_ttl=20), 'old')
+        with self.assertLogs('movies.cache', 'WARNING'):
+            self.run_refreshes()
+        self.assertEqual(self.cache.lookup('k'), ('old', ttl_cache.STALE))
+        # refresh รอบใหม่สั่งได้อีก (ไม่ค้างอยู่ใน _refreshing)
+        self.cache.get_or_fetch('k', fetch, ttl=10, stale_ttl=20)
+        self.assertEqual(len(self.refreshes), 1)
+
+    def test_evicts_least_recently_used(self):
+        for key in 'abc':
+            self.cache.set(key, key, ttl=10)
+        self.cache.lookup('a')
+        self.cache.set('d', 'd', ttl=10)
+        self.assertEqual(self.cache.lookup('b'), (None, ttl_cache.MISS))
+        for key in 'acd':
+            self.assertEqual(self.cache.lookup(key), (key, ttl_cache.FRESH))
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(tmdb, 'time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(failure_rate=0.5, min_calls=4, window=30, open_timeout=10,
+                                      half_open_max_calls=1)
+
+    def record(self, *outcomes):
+        for ok in outcomes:
+            self.breaker.record_success() if ok else self.breaker.record_failure()
+
+    def test_opens_only_after_min_calls_at_failure_rate(self):
+        with self.assertLogs('movies.tmdb', 'WARNING'):
+            self.record(False, True, False)
+            self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+            self.record(True, False)
+            self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test_old_failures_fall_out_of_window(self):
+        self.record(False, False, False)
+        self.clock.now += 31
+        self.record(False, True, True, True)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_probe_closes_or_reopens(self):
+        with self.assertLogs('movies.tmdb', 'INFO'):
+            self.record(False, False, False, False)
+            self.clock.now += 10
+            self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+            self.assertTrue(self.breaker.allow())
+            self.assertFalse(self.breaker.allow())
+            self.record(False)
+            self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+            self.clock.now += 10
+            self.assertTrue(self.breaker.allow())
+            self.record(True)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(self.breaker.allow())
+
+    def test_skipped_probe_is_returned(self):
+        with self.assertLogs('movies.tmdb', 'WARNING'):
+            self.record(False, False, False, False)
+        self.clock.now += 10
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_skipped()
+        self.assertTrue(self.breaker.allow())
+
+    def test_client_fails_fast_while_open_and_ignores_4xx(self):
+        client = TMDbClient(api_key='x', base_url='http://127.0.0.1:9/3', breaker=self.breaker)
+        self.addCleanup(client.close)
+        with mock.patch.object(client, '_fetch_with_retry', side_effect=TMDbNotFound('nope', status_code=404)):
+            for _ in range(4):
+                with self.assertRaises(TMDbNotFound):
+                    client.get('movie/1', use_cache=False)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+        with mock.patch.object(client, '_fetch_with_retry', side_effect=TMDbTimeout('slow')) as fetch, \
+             self.assertLogs('movies.tmdb', 'WARNING'):
+            for _ in range(4):
+                with self.assertRaises(TMDbTimeout):
+                    client.get('movie/1', use_cache=False)
+            with self.assertRaises(TMDbUnavailable):
+                client.get('movie/1', use_cache=False)
+        self.assertEqual(fetch.call_count, 4)
+
+
+class MoodStatsTests(TestCase):
+    """สถิติที่บวก/ลบทีละส่วนต้องเท่ากับที่คำนวณใหม่ทั้งหมดจาก ReviewMoodScore"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.moods = Mood.objects.bulk_create([Mood(name=n) for n in ('Happy', 'Sad', 'Tense', 'Calm')])
+        cls.movies = Movie.objects.bulk_create([Movie(tmdb_id=930000 + i, title=f'Stats {i}') for i in range(3)])
+        cls.users = User.objects.bulk_create([User(username=f'stats_user_{i}') for i in range(8)])
+
+    def snapshot(self, movie_ids=None):
+        rows = MovieMoodStats.objects.filter(score_count__gt=0)
+        if movie_ids is not None:
+            rows = rows.filter(movie_id__in=movie_ids)
+        return {
+            (row.movie_id, row.mood_id): (row.score_sum, row.score_count,
+                                          round(row.avg_intensity, 6), round(row.weighted_score, 6))
+            for row in rows
+        }
+
+    def random_history(self, seed):
+        rng = random.Random(seed)
+        reviews = []
+        for _ in range(60):
+            action = rng.random()
+            scores = {mood.id: rng.randint(0, 5) for mood in rng.sample(self.moods, rng.randint(0, 4))}
+            if reviews and action < 0.3:
+                services.update_review(rng.choice(reviews), 'edited', scores)
+            elif reviews and action < 0.4:
+                services.delete_review(reviews.pop(rng.randrange(len(reviews))))
+            else:
+                user, movie = rng.choice(self.users), rng.choice(self.movies)
+                if Review.objects.filter(user=user, movie=movie).exists():
+                    continue
+                reviews.append(services.create_review(user, movie, 'random', scores))
+
+    def test_incremental_stats_match_rebuild(self):
+        for seed in range(3):
+            with self.subTest(seed=seed):
+                Review.objects.all().delete()
+                MovieMoodStats.objects.all().delete()
+                self.random_history(seed)
+                incremental = self.snapshot()
+                self.assertTrue(incremental)
+                mood_stats.rebuild_mood_stats()
+                self.assertEqual(self.snapshot(), incremental)
+
+    def test_rebuild_subset_leaves_other_movies_alone(self):
+        self.random_history(7)
+        first, rest = self.movies[0].id, [movie.id for movie in self.movies[1:]]
+        untouched = self.snapshot(rest)
+        MovieMoodStats.objects.filter(movie_id__in=rest).update(score_sum=999)
+        mood_stats.rebuild_mood_stats([first])
+        self.assertNotEqual(self.snapshot(rest), untouched)
+        mood_stats.rebuild_mood_stats(rest)
+        self.assertEqual(self.snapshot(rest), untouched)
+
+    def test_rerank_updates_weighted_score_and_leaderboard(self):
+        happy = self.moods[0]
+        one, two, three = self.movies
+        services.create_review(self.users[0], one, 'x', {happy.id: 5})
+        for user in self.users[:4]:
+            services.create_review(user, two, 'x', {happy.id: 5})
+        services.create_review(self.users[0], three, 'x', {happy.id: 1})
+
+        priors = mood_stats.rerank([happy.id])
+        self.assertAlmostEqual(priors[happy.id], 26 / 6)
+        # ค่าเฉลี่ยเท่ากัน แต่เรื่องที่ 2 มีคนให้คะแนนมากกว่าจึงขึ้นก่อน
+        self.assertEqual([movie.id for movie in mood_stats.leaderboard(happy)], [two.id, one.id, three.id])
+        expected = (20 + priors[happy.id]) / 5
+        self.assertAlmostEqual(MovieMoodStats.objects.get(movie=two, mood=happy).weighted_score, expected)
+        # rebuild ใช้ C เดียวกันกับ rerank
+        before = self.snapshot()
+        mood_stats.rebuild_mood_stats()
+        self.assertEqual(self.snapshot(), before)
+
+
+class MoodVectorIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.moods = Mood.objects.bulk_create([Mood(name=n) for n in ('Happy', 'Sad', 'Tense')])
+        cls.movies = Movie.objects.bulk_create([Movie(tmdb_id=940000 + i, title=f'Vector {i}') for i in range(40)])
+        rng = random.Random(15)
+        MovieMoodStats.objects.bulk_create([
+            MovieMoodStats(movie=movie, mood=mood, score_count=1, avg_intensity=rng.choice([0, 1, 2.5, 4, 5]))
+            for movie in cls.movies[:30] for mood in cls.moods
+        ])
+
+    def setUp(self):
+        self.index = MoodVectorIndex(refresh_interval=0)
+
+    def brute_force(self, movie_id, k):
+        profiles = {}
+        for row in MovieMoodStats.objects.all():
+            profiles.setdefault(row.movie_id, {})[row.mood_id] = row.avg_intensity
+        query = [profiles[movie_id].get(mood.id, 0) for mood in self.moods]
+        scores = []
+        for other, profile in profiles.items():
+            vector = [profile.get(mood.id, 0) for mood in self.moods]
+            norm = math.hypot(*query) * math.hypot(*vector)
+            if other != movie_id and norm:
+                score = sum(a * b for a, b in zip(query, vector)) / norm
+                if score > 0:
+                    scores.append((other, score))
+        scores.sort(key=lambda item: -item[1])
+        return scores[:k]
+
+    def assertSameScores(self, got, expected):
+        # ค่าที่เท่ากันสลับลำดับกันได้ เทียบคะแนนตามลำดับแทน movie_id
+        self.assertEqual([round(score, 5) for _, score in got], [round(score, 5) for _, score in expected])
+
+    def test_similar_matches_brute_force_cosine(self):
+        for movie in self.movies[:30:7]:
+            with self.subTest(movie=movie.id):
+                got = self.index.similar(movie.id, k=5)
+                self.assertNotIn(movie.id, [movie_id for movie_id, _ in got])
+                self.assertSameScores(got, self.brute_force(movie.id, k=5))
+
+    def test_unknown_or_empty_profile_has_no_neighbours(self):
+        self.assertEqual(self.index.similar(self.movies[35].id), [])
+        MovieMoodStats.objects.filter(movie=self.movies[0]).update(avg_intensity=0)
+        self.index.refresh(force=True)
+        self.assertEqual(self.index.similar(self.movies[0].id), [])
+
+    def test_refresh_picks_up_changed_rows_only(self):
+        self.index.refresh()
+        newcomer = self.movies[35]
+        MovieMoodStats.objects.create(movie=newcomer, mood=self.moods[0], score_count=1, avg_intensity=3)
+        with mock.patch.object(self.index, '_load_all', side_effect=AssertionError('ไม่ควรโหลดใหม่ทั้งหมด')):
+            self.index.refresh()
+        self.assertEqual(self.index.profile(newcomer.id), {self.moods[0].id: 3.0, self.moods[1].id: 0.0,
+                                                          self.moods[2].id: 0.0})
+        self.assertSameScores(self.index.similar(newcomer.id, k=40), self.brute_force(newcomer.id, k=40))
+
+    def test_new_mood_reloads_everything(self):
+        self.index.refresh()
+        calm = Mood.objects.create(name='Calm')
+        MovieMoodStats.objects.create(movie=self.movies[0], mood=calm, score_count=1, avg_intensity=2)
+        self.index.refresh()
+        self.assertEqual(self.index.mood_ids, [mood.id for mood in self.moods] + [calm.id])
+        self.assertEqual(self.index.profile(self.movies[0].id)[calm.id], 2.0)
+
+    def test_deleted_last_review_leaves_no_ghost(self):
+        movie, user = self.movies[36], User.objects.create(username='vector_reviewer')
+        with self.captureOnCommitCallbacks(execute=True):
+            review = services.create_review(user, movie, 'x', {self.moods[0].id: 5, self.moods[1].id: 5})
+        self.index.refresh()
+        self.assertTrue(self.index.similar(movie.id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            services.delete_review(review)
+        self.index.refresh()
+        self.assertEqual(self.index.similar(movie.id), [])
+        self.assertNotIn(movie.id, [movie_id for movie_id, _ in self.index.similar(self.movies[0].id, k=40)])
+        total, _ = self.index.blend([(self.moods[0].id, 'gte', 0, 1)], limit=100)
+        self.assertEqual(total, 30)
+
+    def test_deleted_rows_are_dropped_from_index(self):
+        self.index.refresh()
+        ghost = self.movies[0]
+        ghost.delete()
+        # แถวที่เหลือ updated_at ไม่เปลี่ยน ต้องรู้จากจำนวนแถวว่ามีของหาย
+        self.index.refresh()
+        self.assertIsNone(self.index.profile(ghost.id))
+        for movie in self.movies[1:30]:
+            self.assertNotIn(ghost.id, [movie_id for movie_id, _ in self.index.similar(movie.id, k=40)])
+        self.assertEqual(self.index.blend([(self.moods[0].id, 'gte', 0, 1)], limit=100)[0],
+                         MovieMoodStats.objects.filter(avg_intensity__gt=0).values('movie').distinct().count())
+
+    def test_grows_past_initial_capacity(self):
+        # capacity ตอนโหลดจริงอย่างน้อย 1024 เริ่มเล็ก ๆ เองจะได้เห็นตอนขยาย
+        self.index._reset([mood.id for mood in self.moods], capacity=4)
+        self.index._apply(list(MovieMoodStats.objects.values_list('movie_id', 'mood_id', 'avg_intensity', 'updated_at')))
+        self.index.loaded, self.index.checked_at, self.index.refresh_interval = True, time.monotonic(), 3600
+        self.assertEqual(self.index.size, 30)
+        movie = self.movies[3]
+        self.assertSameScores(self.index.similar(movie.id, k=5), self.brute_force(movie.id, k=5))
+
+
+class BlendSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.happy, cls.sad, cls.tense = Mood.objects.bulk_create([Mood(name=n) for n in ('Happy', 'Sad', 'Tense')])
+        cls.movies = Movie.objects.bulk_create([Movie(tmdb_id=950000 + i, title=f'Blend {i}') for i in range(25)])
+        rng = random.Random(16)
+        cls.profiles = {}
+        for movie in cls.movies[:20]:
+            cls.profiles[movie.id] = {mood.id: rng.choice([0, 1, 2, 3, 4, 5]) for mood in (cls.happy, cls.sad, cls.tense)}
+        cls.profiles[cls.movies[0].id] = {cls.happy.id: 1, cls.sad.id: 0, cls.tense.id: 0}
+        MovieMoodStats.objects.bulk_create([
+            MovieMoodStats(movie_id=movie_id, mood_id=mood_id, score_count=1, avg_intensity=avg)
+            for movie_id, profile in cls.profiles.items() for mood_id, avg in profile.items()
+        ])
+
+    def setUp(self):
+        self.index = MoodVectorIndex(refresh_interval=0)
+        patcher = mock.patch('movies.similarity.mood_index', self.index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def brute_force(self, targets, movie_ids=None):
+        ranked = []
+        for movie_id, profile in self.profiles.items():
+            if not any(profile.values()) or (movie_ids is not None and movie_id not in movie_ids):
+                continue
+            distance = 0.0
+            for mood_id, op, value, weight in targets:
+                actual = profile[mood_id]
+                gap = {'gte': max(value - actual, 0), 'lte': max(actual - value, 0)}.get(op, actual - value)
+                distance += weight * gap * gap
+            ranked.append((math.sqrt(distance), movie_id))
+        ranked.sort()
+        return [(movie_id, distance) for distance, movie_id in ranked]
+
+    def assertRanking(self, got, expected):
+        self.assertEqual([movie_id for movie_id, _ in got], [movie_id for movie_id, _ in expected])
+        for (_, got_distance), (_, expected_distance) in zip(got, expected):
+            self.assertAlmostEqual(got_distance, expected_distance, places=5)
+
+    def test_ranking_matches_brute_force(self):
+        targets = [(self.happy.id, 'gte', 3, 1), (self.sad.id, 'lte', 1, 2), (self.tense.id, 'near', 4, 0.5)]
+        total, ranked = self.index.blend(targets, limit=100)
+        expected = self.brute_force(targets)
+        self.assertEqual(total, len(expected))
+        self.assertRanking(ranked, expected)
+
+    def test_pages_concatenate_to_full_ranking(self):
+        targets = [(self.happy.id, 'near', 2, 1), (self.tense.id, 'gte', 4, 1)]
+        expected = self.brute_force(targets)
+        pages = []
+        for offset in range(0, 30, 7):
+            total, ranked = self.index.blend(targets, offset=offset, limit=7)
+            self.assertEqual(total, len(expected))
+            pages += ranked
+        self.assertRanking(pages, expected)
+
+    def test_restricts_to_movie_ids_and_skips_empty_profiles(self):
+        allowed = {movie.id for movie in self.movies[:5]} | {self.movies[22].id}
+        targets = [(self.sad.id, 'gte', 5, 1)]
+        total, ranked = self.index.blend(targets, limit=100, movie_ids=allowed)
+        self.assertRanking(ranked, self.brute_force(targets, movie_ids=allowed))
+        self.assertNotIn(self.movies[22].id, [movie_id for movie_id, _ in ranked])
+
+    def test_blend_search_reports_match_and_pages(self):
+        targets = [(self.happy.id, 'near', 1, 1), (self.sad.id, 'near', 0, 1), (self.tense.id, 'near', 0, 1)]
+        result = blend_search(targets, page=1, per_page=8)
+        self.assertEqual(result['movies'][0].id, self.movies[0].id)
+        self.assertEqual(result['movies'][0].match, 100)
+        self.assertEqual((result['total'], result['num_pages']), (len(self.brute_force(targets)), 3))
+
+    def test_parse_blend(self):
+        params = {
+            f'op_{self.happy.id}': 'gte', f't_{self.happy.id}': '9', f'w_{self.happy.id}': '2',
+            f'op_{self.sad.id}': 'near', f't_{self.sad.id}': '-1',
+            f'op_{self.tense.id}': 'lte', f't_{self.tense.id}': 'abc',
+        }
+        self.assertEqual(parse_blend(params, [self.happy, self.sad, self.tense]), [
+            (self.happy.id, 'gte', 5, 2.0), (self.sad.id, 'near', 0, 1.0),
+        ])
+        self.assertEqual(parse_blend({f'op_{self.happy.id}': 'eq', f't_{self.happy.id}': '3'}, [self.happy]), [])
+
+    def test_parse_blend_skips_non_finite_values(self):
+        for target, weight in (('nan', '1'), ('inf', '1'), ('3', 'nan'), ('3', 'inf'), ('-inf', '1')):
+            with self.subTest(target=target, weight=weight):
+                params = {f'op_{self.happy.id}': 'near', f't_{self.happy.id}': target, f'w_{self.happy.id}': weight}
+                self.assertEqual(parse_blend(params, [self.happy]), [])
+
+
+class ALSTests(SimpleTestCase):
+    def test_to_csr_sums_duplicates(self):
+        rows, cols = np.array([0, 2, 0, 2, 0]), np.array([1, 0, 1, 3, 0])
+        indptr, indices, data = recommender.to_csr(rows, cols, np.array([1, 2, 3, 4, 5], dtype=np.float32), 3)
+        self.assertEqual(indptr.tolist(), [0, 2, 2, 4])
+        self.assertEqual(indices.tolist(), [0, 1, 0, 3])
+        self.assertEqual(data.tolist(), [5, 4, 2, 4])
+
+    def test_solve_side_matches_dense_normal_equations(self):
+        rng = np.random.default_rng(1)
+        items = rng.standard_normal((6, 3)).astype(np.float32)
+        indptr, indices, data = recommender.to_csr(
+            np.array([0, 0, 1, 2, 2, 2]), np.array([1, 4, 2, 0, 3, 5]), np.array([1, 3, 2, 1, 1, 4], dtype=np.float32), 4)
+        confidence = 1 + 10 * data
+        solved = recommender._solve_side(indptr, indices, confidence, items, 0.1)
+
+        for user in range(3):
+            c, p = np.ones(6), np.zeros(6)
+            c[indices[indptr[user]:indptr[user + 1]]] = confidence[indptr[user]:indptr[user + 1]]
+            p[indices[indptr[user]:indptr[user + 1]]] = 1
+            expected = np.linalg.solve(items.T @ (c[:, None] * items) + 0.1 * np.eye(3), items.T @ (c * p))
+            np.testing.assert_allclose(solved[user], expected, rtol=1e-3, atol=1e-4)
+        # ผู้ใช้ที่ไม่มี interaction ได้ factor เป็น 0
+        self.assertFalse(solved[3].any())
+
+    def blocks(self):
+        """ผู้ใช้ 0-9 ชอบหนัง 0-9, ผู้ใช้ 10-19 ชอบหนัง 10-19 แต่ละคนยังไม่เคยเห็นหนังในกลุ่มตัวเองหนึ่งเรื่อง"""
+        users, items = [], []
+        for user in range(20):
+            group = range(0, 10) if user < 10 else range(10, 20)
+            for item in group:
+                if item % 10 != user % 10:
+                    users.append(user)
+                    items.append(item)
+        return np.array(users), np.array(items), np.ones(len(users), dtype=np.float32)
+
+    def test_train_als_ranks_unseen_items_from_own_group_first(self):
+        users, items, values = self.blocks()
+        progress = []
+        user_factors, item_factors = recommender.train_als(
+            users, items, values, 20, 20, factors=4, regularization=1.0, iterations=8,
+            callback=lambda iteration, seconds: progress.append(iteration))
+        self.assertEqual(progress, list(range(1, 9)))
+        self.assertEqual((user_factors.dtype, item_factors.dtype), (np.float32, np.float32))
+
+        scores = user_factors @ item_factors.T
+        for user in range(20):
+            unseen = user % 10 + (0 if user < 10 else 10)
+            other_group = range(10, 20) if user < 10 else range(0, 10)
+            self.assertGreater(scores[user, unseen], max(scores[user, item] for item in other_group))
+
+    def test_recommender_skips_seen_and_unknown_users(self):
+        users, items, values = self.blocks()
+        user_factors, item_factors = recommender.train_als(users, items, values, 20, 20, factors=4,
+                                                           regularization=1.0, iterations=8)
+        seen = recommender.to_csr(users, items, values, 20)
+        user_ids, movie_ids = np.arange(100, 120), np.arange(500, 520)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'model.npz'
+            recommender.save_model(path, user_ids, movie_ids, user_factors, item_factors, seen)
+            self.assertEqual(list(Path(tmp).iterdir()), [path])
+            model = recommender.Recommender(path=path)
+            cache.clear()
+            with self.assertLogs('movies.recommender', 'INFO'):
+                top = model.recommend_ids(100, n=3)
+
+        self.assertEqual(top[0], 500)
+        self.assertEqual(len(top), 3)
+        self.assertTrue(set(top).isdisjoint(movie_ids[items[users == 0]].tolist()))
+        self.assertEqual(model.recommend_ids(999), [])
+        # ผลถูก cache ตามเวอร์ชันของโมเดล
+        with mock.patch.object(model, '_load', return_value=model.model):
+            model.model = {**model.model, 'user_factors': np.zeros_like(user_factors)}
+            self.assertEqual(model.recommend_ids(100, n=3), top)
+
+
+    def test_models_saved_in_the_same_second_get_their_own_cache(self):
+        users, items, values = self.blocks()
+        seen = recommender.to_csr(users, items, values, 20)
+        user_ids, movie_ids = np.arange(100, 120), np.arange(500, 520)
+        factors = np.eye(20, 4, dtype=np.float32)
+        cache.clear()
+
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(recommender.time, 'time', return_value=1700000000.5):
+            path = Path(tmp) / 'model.npz'
+            model = recommender.Recommender(path=path)
+            recommender.save_model(path, user_ids, movie_ids, factors, factors, seen)
+            with self.assertLogs('movies.recommender', 'INFO'):
+                first = model.recommend_ids(100, n=3)
+            first_version = model.model['version']
+
+            # เทรนใหม่ภายในวินาทีเดียวกัน factor ของหนังกลับด้าน ผลต้องเปลี่ยนตาม ไม่ใช่ได้ผลเก่าจาก cache
+            recommender.save_model(path, user_ids, movie_ids, factors, factors[::-1].copy(), seen)
+            with self.assertLogs('movies.recommender', 'INFO'):
+                second = model.recommend_ids(100, n=3)
+
+        self.assertNotEqual(model.model['version'], first_version)
+        self.assertNotEqual(first, second)
+
+
+class InteractionWeightTests(TestCase):
+    def test_load_interactions_weights_each_source(self):
+        user = User.objects.create(username='als_user')
+        happy = Mood.objects.create(name='Happy')
+        movies = Movie.objects.bulk_create([Movie(tmdb_id=960000 + i, title=f'ALS {i}') for i in range(4)])
+        Favorite.objects.create(user=user, movie=movies[0])
+        Bookmark.objects.create(user=user, movie=movies[0])
+        CustomList.objects.create(user=user, name='Mine').movies.add(movies[1])
+        review = Review.objects.create(user=user, movie=movies[2], comment='x')
+        ReviewMoodScore.objects.create(review=review, mood=happy, intensity=4)
+        Review.objects.create(user=user, movie=movies[3], comment='no scores')
+
+        users, items, values = recommender.load_interactions()
+        indptr, indices, data = recommender.to_csr(users, items, values, user.id + 1)
+        row = dict(zip(indices[indptr[user.id]:].tolist(), data[indptr[user.id]:].tolist()))
+        weights = recommender.INTERACTION_WEIGHTS
+        self.assertEqual(row[movies[0].id], weights['favorite'] + weights['bookmark'])
+        self.assertEqual(row[movies[1].id], weights['list'])
+        self.assertAlmostEqual(row[movies[2].id], weights['review'] + 4 / 5, places=5)
+        self.assertEqual(row[movies[3].id], weights['review'])
+
+
+class ReviewCursorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = Movie.objects.create(tmdb_id=970001, title='Cursor Movie')
+        users = User.objects.bulk_create([User(username=f'cursor_user_{i}') for i in range(11)])
+        reviews = Review.objects.bulk_create([Review(user=user, movie=cls.movie, comment='x') for user in users])
+        # 3 ช่วงเวลา ช่วงละหลายรีวิวเวลาเดียวกันเป๊ะ หน้าจะได้ตัดกลางกลุ่มที่เวลาเท่ากัน
+        base = timezone.now().replace(microsecond=123456) - datetime.timedelta(hours=1)
+        for i, review in enumerate(reviews):
+            Review.objects.filter(pk=review.pk).update(created_at=base - datetime.timedelta(minutes=i % 3))
+        cls.expected = list(Review.objects.filter(movie=cls.movie).order_by('-created_at', '-id')
+                            .values_list('id', flat=True))
+
+    def walk(self, limit):
+        seen, cursor = [], None
+        while True:
+            reviews, cursor = review_page(self.movie, cursor=cursor, limit=limit)
+            seen += [review.id for review in reviews]
+            if cursor is None:
+                return seen
+
+    def test_cursor_round_trip(self):
+        review = Review.objects.get(pk=self.expected[0])
+        cursor = encode_cursor(review)
+        self.assertNotIn('=', cursor)
+        self.assertEqual(decode_cursor(cursor), (review.created_at, review.id))
+
+    def test_invalid_cursor(self):
+        garbage = [
+            'not base64!!',
+            encode_cursor(SimpleNamespace(created_at=timezone.now(), id='abc')),
+            base64.urlsafe_b64encode(b'no separator').decode(),
+            base64.urlsafe_b64encode(b'\xff\xfe|1').decode(),
+        ] + [
+            # id ต้องอยู่ในช่วง bigint ที่เป็นบวก ไม่งั้น DB โยน OverflowError
+            encode_cursor(SimpleNamespace(created_at=timezone.now(), id=review_id))
+            for review_id in (0, -1, 2 ** 63, 10 ** 30)
+        ]
+        for cursor in garbage:
+            with self.subTest(cursor=cursor), self.assertRaises(InvalidCursor):
+                decode_cursor(cursor)
+        url = reverse('movie_reviews_json', args=[self.movie.tmdb_id])
+        for cursor in (garbage[0], garbage[-1]):
+            self.assertEqual(self.client.get(url, {'cursor': cursor}).status_code, 400)
+        self.assertEqual(decode_cursor(encode_cursor(SimpleNamespace(created_at=timezone.now(), id=2 ** 63 - 1)))[1],
+                         2 ** 63 - 1)
+
+    def test_pages_split_inside_equal_timestamps(self):
+        for limit in (1, 2, 3, 4, 11, 20):
+            with self.subTest(limit=limit):
+                self.assertEqual(self.walk(limit), self.expected)
+
+    def test_last_full_page_has_no_next_cursor(self):
+        reviews, cursor = review_page(self.movie, limit=11)
+        self.assertEqual(len(reviews), 11)
+        self.assertIsNone(cursor)
+
+    def test_new_review_does_not_shift_later_pages(self):
+        first, cursor = review_page(self.movie, limit=4)
+        Review.objects.create(user=User.objects.create(username='cursor_late'), movie=self.movie, comment='new')
+        rest = []
+        while cursor:
+            reviews, cursor = review_page(self.movie, cursor=cursor, limit=4)
+            rest += [review.id for review in reviews]
+        self.assertEqual([review.id for review in first] + rest, self.expected)
+
+
+class TMDbListHelperTests(SimpleTestCase):
+    """ผลจาก TMDb ที่ขาด field (เช่น item ไม่มี title) ต้องได้ผลว่างแบบเดียวกับตอน TMDb error ไม่ใช่ 500"""
+
+    def test_malformed_items_fall_back_to_empty(self):
+        broken = {'results': [{'id': 1, 'poster_path': '/p.jpg', 'release_date': '2020-01-01'}], 'total_pages': 1}
+        client = mock.Mock()
+        client.get.return_value = broken
+        client.get_pages.return_value = broken['results']
+        calls = [
+            lambda: utils.search_movies_tmdb('query'),
+            lambda: utils.search_movies_tmdb('', year=2020),
+            lambda: utils.get_popular_movies_tmdb(),
+            lambda: utils.get_movies_in_date_range('2020-01-01', '2020-01-31'),
+        ]
+        with mock.patch.object(utils, 'get_client', return_value=client), self.assertLogs('movies.utils', 'WARNING'):
+            for call in calls:
+                self.assertEqual(call(), [])
+
+
+class CatalogCommandTests(TestCase):
+    """management command ที่ดึงแคตตาล็อกจาก TMDb (import_tmdb_catalog, sync_tmdb_changes) โดย mock client"""
+
+    def setUp(self):
+        cache.clear()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = Path(self.tmp.name)
+
+    def item(self, tmdb_id, title, **extra):
+        return {'id': tmdb_id, 'title': title, 'overview': '', 'release_date': '2020-01-01',
+                'vote_average': 7.0, 'genre_ids': [], **extra}
+
+    def write_jsonl(self, items):
+        path = self.dir / 'catalog.jsonl'
+        path.write_text(''.join(json.dumps(item) + '\n' for item in items), encoding='utf-8')
+        return path
+
+    def test_import_bumps_version_of_updated_movies(self):
+        movie = Movie.objects.create(tmdb_id=930001, title='Old title')
+        version = fragments.movie_version(movie.id)
+        path = self.write_jsonl([self.item(930001, 'New title'), self.item(930002, 'Brand new')])
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            call_command('import_tmdb_catalog', jsonl=str(path), checkpoint=str(self.dir / 'ckpt.json'),
+                         stdout=StringIO())
+
+        movie.refresh_from_db()
+        self.assertEqual(movie.title, 'New title')
+        self.assertGreater(fragments.movie_version(movie.id), version)
+        # หนังที่เพิ่งสร้างยังไม่มี fragment ใน cache ไม่ต้อง bump
+        self.assertEqual(len(callbacks), 1)
+
+    def popular_client(self, pages, fail_on=None):
+        """client ปลอมของ movie/popular: pages[n-1] = รายการหนังของหน้า n, หน้า fail_on โยน TMDbUnavailable"""
+        client = mock.Mock()
+
+        def get(path, params=None, **kwargs):
+            page = params['page']
+            if page == fail_on:
+                raise TMDbUnavailable('down', endpoint=path)
+            return {'page': page, 'results': pages[page - 1], 'total_pages': len(pages)}
+        client.get.side_effect = get
+        return client
+
+    def import_pages(self, client, **options):
+        with mock.patch('movies.management.commands.import_tmdb_catalog.get_client', return_value=client):
+            call_command('import_tmdb_catalog', checkpoint=str(self.dir / 'import.json'), stdout=StringIO(),
+                         **options)
+
+    def test_import_keeps_last_duplicate_in_one_batch(self):
+        # popular เลื่อนอันดับระหว่างดึง หนังเรื่องเดียวกันเลยมาสองหน้าใน batch เดียวกัน
+        client = self.popular_client([[self.item(930020, 'First seen'), self.item(930021, 'Other')],
+                                      [self.item(930020, 'Seen again', genre_ids=[28])]])
+        self.import_pages(client, pages=2, batch_size=10)
+        movie = Movie.objects.get(tmdb_id=930020)
+        self.assertEqual(movie.title, 'Seen again')
+        self.assertEqual(list(movie.genres.values_list('tmdb_id', flat=True)), [28])
+        self.assertEqual(Movie.objects.filter(tmdb_id__in=[930020, 930021]).count(), 2)
+
+    def test_import_updates_existing_row_in_place(self):
+        movie = Movie.objects.create(tmdb_id=930022, title='Old', overview='old overview', vote_average=1.0)
+        self.import_pages(self.popular_client([[self.item(930022, 'Renamed', overview='new overview')]]))
+        updated = Movie.objects.get(tmdb_id=930022)
+        self.assertEqual(updated.pk, movie.pk)
+        self.assertEqual((updated.title, updated.overview, updated.vote_average), ('Renamed', 'new overview', 7.0))
+
+    def test_import_resumes_from_checkpoint(self):
+        pages = [[self.item(930030 + page * 2 + i, f'Page {page + 1}') for i in range(2)] for page in range(3)]
+        # batch ละ 2 แถว = flush ทุกหน้า หน้า 3 ล่มหลัง checkpoint หน้า 2
+        with self.assertRaises(CommandError):
+            self.import_pages(self.popular_client(pages, fail_on=3), pages=3, batch_size=2)
+        self.assertEqual(json.loads((self.dir / 'import.json').read_text()), {'page': 2, 'rows': 4})
+        self.assertEqual(Movie.objects.filter(title__startswith='Page').count(), 4)
+
+        client = self.popular_client(pages)
+        self.import_pages(client, pages=3, batch_size=2, resume=True)
+        self.assertEqual([call.args[1]['page'] for call in client.get.call_args_list], [3])
+        self.assertEqual(Movie.objects.filter(title__startswith='Page').count(), 6)
+        self.assertEqual(json.loads((self.dir / 'import.json').read_text()), {'page': 3, 'rows': 6})
+
+    def test_sync_changes_bumps_version(self):
+        movie = Movie.objects.create(tmdb_id=930003, title='Before sync')
+        version = fragments.movie_version(movie.id)
+        client = mock.Mock()
+        client.get.side_effect = lambda path, params=None, **kwargs: (
+            {'results': [{'id': 930003}], 'total_pages': 1} if path == 'movie/changes'
+            else {**self.item(930003, 'After sync'), 'genres': [], 'runtime': 100}
+        )
+
+        with mock.patch('movies.management.commands.sync_tmdb_changes.get_client', return_value=client), \
+                self.captureOnCommitCallbacks(execute=True):
+            call_command('sync_tmdb_changes', checkpoint=str(self.dir / 'sync.json'), stdout=StringIO())
+
+        movie.refresh_from_db()
+        self.assertEqual(movie.title, 'After sync')
+        self.assertGreater(fragments.movie_version(movie.id), version)
+
+    def test_sync_limit_keeps_unprocessed_changes_for_next_run(self):
+        movies = Movie.objects.bulk_create([Movie(tmdb_id=930010 + i, title=f'Changed {i}') for i in range(3)])
+        checkpoint = self.dir / 'sync.json'
+        feeds = [[930010, 930011, 930012], []]
+        client = mock.Mock()
+
+        def get(path, params=None, **kwargs):
+            if path == 'movie/changes':
+                return {'results': [{'id': tmdb_id} for tmdb_id in feeds[0]], 'total_pages': 1}
+            tmdb_id = int(path.split('/')[1])
+            return {**self.item(tmdb_id, f'Synced {tmdb_id}'), 'genres': []}
+        client.get.side_effect = get
+
+        with mock.patch('movies.management.commands.sync_tmdb_changes.get_client', return_value=client):
+            call_command('sync_tmdb_changes', checkpoint=str(checkpoint), limit=2, stdout=StringIO())
+            state = json.loads(checkpoint.read_text())
+            self.assertEqual(len(state['pending']), 1)
+            self.assertEqual(Movie.objects.filter(title__startswith='Synced').count(), 2)
+
+            # รอบถัดไป TMDb ไม่มีอะไรเปลี่ยนเพิ่ม แต่เรื่องที่ค้างต้องถูก refresh
+            feeds.pop(0)
+            call_command('sync_tmdb_changes', checkpoint=str(checkpoint), limit=2, stdout=StringIO())
+        self.assertEqual(json.loads(checkpoint.read_text())['pending'], [])
+        self.assertEqual(Movie.objects.filter(title__startswith='Synced').count(), len(movies))
+
+
+class EvaluationMetricTests(SimpleTestCase):
+    """ค่าที่คำนวณด้วยมือ: แนะนำ [1, 2, 3, 4] ชุดทดสอบ {2, 4, 9} (hit ที่อันดับ 2 และ 4)"""
+
+    recommended = [1, 2, 3, 4]
+    relevant = {2, 4, 9}
+
+    def test_precision_and_recall(self):
+        self.assertEqual(evaluation.precision_at_k(self.recommended, self.relevant, 4), 0.5)
+        self.assertEqual(evaluation.precision_at_k(self.recommended, self.relevant, 2), 0.5)
+        self.assertAlmostEqual(evaluation.recall_at_k(self.recommended, self.relevant, 4), 2 / 3)
+        self.assertAlmostEqual(evaluation.recall_at_k(self.recommended, self.relevant, 2), 1 / 3)
+        # แนะนำได้น้อยกว่า k ยังหารด้วย k
+        self.assertEqual(evaluation.precision_at_k([2], self.relevant, 4), 0.25)
+        self.assertEqual(evaluation.recall_at_k(self.recommended, set(), 4), 0.0)
+
+    def test_ndcg(self):
+        # DCG = 1/log2(3) + 1/log2(5), IDCG@4 = 1 + 1/log2(3) + 1/log2(4) (relevant มีแค่ 3 เรื่อง)
+        self.assertAlmostEqual(evaluation.ndcg_at_k(self.recommended, self.relevant, 4), 0.498189, places=6)
+        # DCG = 1/log2(3), IDCG@2 = 1 + 1/log2(3)
+        self.assertAlmostEqual(evaluation.ndcg_at_k(self.recommended, self.relevant, 2), 0.386853, places=6)
+        self.assertEqual(evaluation.ndcg_at_k([2, 4, 9], self.relevant, 3), 1.0)
+        self.assertEqual(evaluation.ndcg_at_k(self.recommended, set(), 4), 0.0)
+
+    def test_percentiles(self):
+        # numpy ใช้ linear interpolation: p95 ของ 1..100 = 95 + 0.05
+        self.assertEqual(evaluation.percentiles(list(range(1, 101))),
+                         {'p50_ms': 50.5, 'p95_ms': 95.05, 'p99_ms': 99.01, 'max_ms': 100})
+        self.assertEqual(evaluation.percentiles([]), {})
+
+
+class EvaluateRecommendersCommandTests(TestCase):
+    """evaluate_recommenders ตัดรีวิวล่าสุดเป็นชุดทดสอบแล้ว rollback ทุกอย่างตอนจบ"""
+
+    options = {'users': 10, 'min_reviews': 3, 'holdout': 1, 'seed': 1}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.happy, cls.sad = Mood.objects.bulk_create([Mood(name='Happy'), Mood(name='Sad')])
+        cls.movies = Movie.objects.bulk_create([Movie(tmdb_id=940000 + i, title=f'Eval {i}') for i in range(6)])
+        now = timezone.now()
+        cls.users = [User.objects.create(username=f'eval_{i}') for i in range(3)]
+        # eval_0, eval_1 รีวิว 3 เรื่อง (เรื่องหลังสุดใหม่สุด) eval_2 รีวิวแค่ 2 เรื่อง ไม่เข้าเกณฑ์
+        for user, movies in zip(cls.users, (cls.movies[0:3], cls.movies[1:4], cls.movies[4:6])):
+            for hours, movie in enumerate(movies):
+                review = services.create_review(user, movie, 'x', {cls.happy.id: 1 + hours, cls.sad.id: 2})
+                Review.objects.filter(pk=review.pk).update(created_at=now - datetime.timedelta(hours=10 - hours))
+        Favorite.objects.create(user=cls.users[0], movie=cls.movies[2])
+        Favorite.objects.create(user=cls.users[0], movie=cls.movies[5])
+
+    def setUp(self):
+        cache.clear()
+
+    def stats(self):
+        return sorted((movie_id, mood_id, total, count, round(score, 6)) for movie_id, mood_id, total, count, score in
+                      MovieMoodStats.objects.filter(score_count__gt=0).values_list(
+                          'movie_id', 'mood_id', 'score_sum', 'score_count', 'weighted_score'))
+
+    def test_split_holds_out_latest_review(self):
+        m = [movie.id for movie in self.movies]
+        with transaction.atomic():
+            cases, dataset = EvaluateCommand().split(self.options)
+            self.assertEqual(sorted(cases), [
+                # Favorite ของหนังที่ถูกตัดออกต้องหายไปด้วย ไม่งั้นข้อมูลรั่วเข้า seen
+                (self.users[0].id, {m[0], m[1], m[5]}, {m[2]}),
+                (self.users[1].id, {m[1], m[2]}, {m[3]}),
+            ])
+            self.assertEqual(dataset['eligible_users'], 2)
+            self.assertEqual(dataset['heldout_reviews'], 2)
+            self.assertEqual(dataset['reviews'], 6)
+            self.assertFalse(Favorite.objects.filter(user=self.users[0], movie=self.movies[2]).exists())
+            # หักคะแนนของรีวิวที่ตัดออกครั้งเดียว ตรงกับการคำนวณใหม่จากรีวิวที่เหลือ
+            split_stats = self.stats()
+            mood_stats.rebuild_mood_stats()
+            self.assertEqual(split_stats, self.stats())
+            transaction.set_rollback(True)
+
+    def test_command_rolls_back_everything(self):
+        before = (self.stats(), Review.objects.count(), Favorite.objects.count())
+        with tempfile.TemporaryDirectory() as tmp:
+            output = Path(tmp) / 'report.json'
+            call_command('evaluate_recommenders', k=2, output=str(output), stdout=StringIO(),
+                         als_factors=2, als_iterations=2, **self.options)
+            report = json.loads(output.read_text())
+        self.assertEqual(set(report['results']), {'popular', 'mood_leaderboard', 'similar_mood', 'als'})
+        self.assertEqual(report['results']['popular']['users'], 2)
+        self.assertEqual((self.stats(), Review.objects.count(), Favorite.objects.count()), before)
+
+
+class GenerateSyntheticDataTests(TestCase):
+    """generate_synthetic_data ขนาดเล็ก: จำนวนแถว, created_at ย้อนหลัง, MovieMoodStats และการคืน auto_now_add"""
+
+    options = {'users': 12, 'movies': 30, 'reviews_per_user': 4, 'favorites_per_user': 2,
+               'bookmarks_per_user': 2, 'lists_per_user': 1, 'list_size': 3, 'days': 30, 'seed': 3}
+
+    def setUp(self):
+        mood_registry.invalidate()
+        self.addCleanup(mood_registry.invalidate)
+
+    def auto_now_add(self):
+        return [model._meta.get_field('created_at').auto_now_add for model in (Review, Favorite, Bookmark, CustomList)]
+
+    def test_small_run(self):
+        call_command('generate_synthetic_data', stdout=StringIO(), **self.options)
+
+        users = User.objects.filter(username__startswith='synth_')
+        self.assertEqual(users.count(), 12)
+        self.assertEqual(Profile.objects.filter(user__in=users).count(), 12)
+        self.assertEqual(Movie.objects.filter(tmdb_id__gt=SYNTHETIC_TMDB_BASE).count(), 30)
+        self.assertEqual(list(Mood.objects.order_by('id').values_list('name', flat=True)), DEFAULT_MOODS)
+        self.assertGreater(Review.objects.count(), 0)
+        self.assertGreater(ReviewMoodScore.objects.count(), 0)
+        self.assertEqual(CustomList.objects.filter(user__in=users).count(), CustomList.objects.count())
+        # รีวิวของผู้ใช้คนเดียวกันไม่ซ้ำหนัง
+        self.assertEqual(Review.objects.values('user_id', 'movie_id').distinct().count(), Review.objects.count())
+
+        # created_at ที่กำหนดเองต้องไม่ถูก auto_now_add ทับเป็นเวลาปัจจุบัน
+        cutoff = timezone.now() - datetime.timedelta(days=1)
+        for model in (Review, Favorite, Bookmark, CustomList):
+            with self.subTest(model=model.__name__):
+                self.assertTrue(model.objects.filter(created_at__lt=cutoff).exists())
+                self.assertFalse(model.objects.filter(created_at__lt=cutoff - datetime.timedelta(days=30)).exists())
+        self.assertEqual(self.auto_now_add(), [True] * 4)
+
+        stats = sorted(MovieMoodStats.objects.values_list('movie_id', 'mood_id', 'score_sum', 'score_count',
+                                                           'weighted_score'))
+        self.assertEqual(sum(row[3] for row in stats), ReviewMoodScore.objects.count())
+        mood_stats.rebuild_mood_stats()
+        mood_stats.rerank()
+        self.assertEqual(stats, sorted(MovieMoodStats.objects.values_list(
+            'movie_id', 'mood_id', 'score_sum', 'score_count', 'weighted_score')))
+
+    def test_same_seed_same_data(self):
+        call_command('generate_synthetic_data', stdout=StringIO(), **self.options)
+        call_command('generate_synthetic_data', stdout=StringIO(), prefix='again', **self.options)
+        counts = [
+            Review.objects.filter(user__username__startswith=f'{prefix}_').count() for prefix in ('synth', 'again')
+        ]
+        self.assertEqual(counts[0], counts[1])
+        with self.assertRaises(CommandError):
+            call_command('generate_synthetic_data', stdout=StringIO(), **self.options)
+
+    def test_auto_now_add_restored_when_command_fails(self):
+        with mock.patch.object(SyntheticDataCommand, 'create_pairs', side_effect=RuntimeError('boom')), \
+                self.assertRaises(RuntimeError):
+            call_command('generate_synthetic_data', stdout=StringIO(), **self.options)
+        self.assertEqual(self.auto_now_add(), [True] * 4)
+        # รีวิวที่สร้างหลังจากนั้นกลับมาใช้เวลาปัจจุบันตามปกติ
+        review = Review.objects.create(user=User.objects.create(username='after_fail'),
+                                       movie=Movie.objects.create(tmdb_id=950000, title='After'),
+                                       created_at=timezone.now() - datetime.timedelta(days=5))
+        self.assertGreater(review.created_at, timezone.now() - datetime.timedelta(minutes=1))
+
+
+class AsyncViewTests(TestCase):
+    """async view (ค้นหา, หน้า detail, หน้าแรก) ผ่าน AsyncClient โดย mock TMDb client"""
+
+    def setUp(self):
+        cache.clear()
+        caches['template_fragments'].clear()
+        movie_resolver.clear()
+        self.tmdb = mock.Mock()
+        self.tmdb.get.side_effect = AssertionError('ไม่ควรเรียก TMDb')
+        self.tmdb.get_pages.side_effect = AssertionError('ไม่ควรเรียก TMDb')
+        patcher = mock.patch.object(utils, 'get_client', return_value=self.tmdb)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def list_item(self, tmdb_id, title):
+        return {'id': tmdb_id, 'title': title, 'poster_path': f'/{tmdb_id}.jpg', 'release_date': '2020-01-01',
+                'vote_average': 7.0, 'genre_ids': [18]}
+
+    async def test_search_by_title_uses_tmdb(self):
+        self.tmdb.get.side_effect = None
+        self.tmdb.get.return_value = {'results': [self.list_item(960001, 'Async Search Hit')], 'total_pages': 1}
+        response = await self.async_client.get(reverse('search_movies'), {'q': 'async'})
+        self.assertContains(response, 'Async Search Hit')
+        self.assertEqual(self.tmdb.get.call_args.args[0], 'search/movie')
+
+    async def test_search_ignores_non_numeric_filters(self):
+        self.tmdb.get.side_effect = None
+        self.tmdb.get.return_value = {'results': [self.list_item(960009, 'Any Genre Hit')], 'total_pages': 1}
+        response = await self.async_client.get(reverse('search_movies'), {'q': 'hit', 'genre': 'abc', 'year': '20x'})
+        self.assertContains(response, 'Any Genre Hit')
+        self.assertNotIn('primary_release_year', self.tmdb.get.call_args.args[1])
+
+        # ไม่มีตัวกรองที่ใช้ได้เหลือเลย ไม่ต้องยิง TMDb
+        self.tmdb.get.reset_mock()
+        response = await self.async_client.get(reverse('search_movies'), {'genre': 'abc', 'mood': 'x1'})
+        self.assertEqual(response.status_code, 404)
+        response = await self.async_client.get(reverse('search_movies'), {'genre': 'abc', 'op_1': 'gte', 't_1': '3'})
+        self.assertEqual(response.status_code, 200)
+        self.tmdb.get.assert_not_called()
+
+    async def test_search_by_mood_reads_local_db(self):
+        mood = await Mood.objects.acreate(name='Happy')
+        await sync_to_async(mood_registry.invalidate)()
+        movie = await Movie.objects.acreate(tmdb_id=960002, title='Local Mood Hit')
+        await sync_to_async(services.create_review)(await User.objects.acreate(username='async_reviewer'),
+                                                    movie, '', {mood.id: 4})
+        response = await self.async_client.get(reverse('search_movies'), {'mood': mood.id})
+        self.assertContains(response, 'Local Mood Hit')
+        self.tmdb.get.assert_not_called()
+
+    async def test_detail_syncs_stale_movie(self):
+        movie = await Movie.objects.acreate(tmdb_id=960003, title='Stale Title')
+        self.tmdb.get.side_effect = None
+        self.tmdb.get.return_value = {**self.list_item(960003, 'Fresh Title'), 'genres': [{'id': 18, 'name': 'Drama'}],
+                                      'runtime': 99, 'overview': 'fresh overview'}
+        response = await self.async_client.get(reverse('movie_detail', args=[960003]))
+        self.assertContains(response, 'Fresh Title')
+        self.assertNotContains(response, 'Stale Title')
+        await movie.arefresh_from_db()
+        self.assertEqual((movie.title, movie.runtime), ('Fresh Title', 99))
+        self.assertIsNotNone(movie.last_synced_at)
+        self.assertEqual([genre.name async for genre in movie.genres.all()], ['Drama'])
+
+    async def test_detail_of_fresh_movie_skips_tmdb(self):
+        await Movie.objects.acreate(tmdb_id=960004, title='Fresh In DB', last_synced_at=timezone.now())
+        response = await self.async_client.get(reverse('movie_detail', args=[960004]))
+        self.assertContains(response, 'Fresh In DB')
+        self.tmdb.get.assert_not_called()
+
+    async def test_detail_missing_everywhere_is_404(self):
+        self.tmdb.get.side_effect = TMDbNotFound('gone', endpoint='movie/{id}', status_code=404)
+        response = await self.async_client.get(reverse('movie_detail', args=[960005]))
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(await Movie.objects.filter(tmdb_id=960005).aexists())
+
+    async def test_home_falls_back_to_local_popular(self):
+        self.tmdb.get.side_effect = TMDbUnavailable('circuit open', endpoint='movie/popular')
+        movie = await Movie.objects.acreate(tmdb_id=960006, title='Local Favourite', poster_path='/local.jpg')
+        await Favorite.objects.acreate(user=await User.objects.acreate(username='async_fan'), movie=movie)
+        with self.assertLogs('movies.utils', 'WARNING'):
+            response = await self.async_client.get(reverse('home'))
+        self.assertContains(response, 'Local Favourite')
+
+    async def test_home_shows_tmdb_popular(self):
+        self.tmdb.get.side_effect = None
+        self.tmdb.get.return_value = {'results': [self.list_item(960007, 'TMDb Popular')], 'total_pages': 1}
+        await Movie.objects.acreate(tmdb_id=960008, title='Local Only', poster_path='/local.jpg')
+        response = await self.async_client.get(reverse('home'))
+        self.assertContains(response, 'TMDb Popular')
+        self.assertNotContains(response, 'Local Only')
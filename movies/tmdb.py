@@ -0,0 +1,452 @@
+# movies/tmdb.py
+"""
+HTTP client กลางสำหรับคุยกับ TMDb
+
+- ใช้ requests.Session ตัวเดียวต่อ process (keep-alive + connection pool)
+  จะได้ไม่ต้องเสีย TCP/TLS handshake ใหม่ทุกครั้งที่เปิดหน้าเว็บ
+- กำหนด connect/read timeout แยกตาม endpoint
+- retry แบบจำกัดจำนวนครั้ง + exponential backoff แบบ full jitter
+- โยน exception ตามประเภทปัญหา (TMDbError และลูก ๆ) ให้ผู้เรียกตัดสินใจเอง
+- มี read-through cache (TTL/LRU + stale-while-revalidate) คั่นหน้า
+- request ที่ซ้ำกันพร้อม ๆ กันจะถูกรวมเหลือครั้งเดียว ทั้งใน process และข้าม worker
+- มี circuit breaker ถ้า TMDb ล่มจะตัดวงจรแล้วโยน TMDbUnavailable ทันที ไม่ต้องรอ timeout
+- จำกัดอัตราการยิงฝั่งเราเอง (RateLimiter) ร่วมกันทุก worker ถ้ารอ token ไม่ไหวจะโยน TMDbThrottled
+- ผลแบบหลายหน้าดึงหน้าที่เหลือพร้อมกันผ่าน worker pool ที่จำกัดขนาด (get_pages)
+"""
+import contextvars
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+from .cache import TTLCache
+from .singleflight import CoalesceTimeout, SingleFlight, coalesce_across_workers
+from .ratelimit import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+TMDB_API_KEY = getattr(settings, 'TMDB_API_KEY', '8f3fabb4ea55b62b7d611bc956f12b8b')
+TMDB_BASE_URL = getattr(settings, 'TMDB_BASE_URL', 'https://api.themoviedb.org/3')
+TMDB_IMAGE_BASE_URL = 'https://image.tmdb.org/t/p/w500' # ขนาดรูปภาพมาตรฐาน
+
+
+# ==========================================
+# 1. ERRORS
+# ==========================================
+
+class TMDbError(Exception):
+    """ข้อผิดพลาดพื้นฐานของการเรียก TMDb ทุกแบบ"""
+
+    def __init__(self, message, endpoint=None, status_code=None):
+        super().__init__(message)
+        self.endpoint = endpoint
+        self.status_code = status_code
+
+
+class TMDbTimeout(TMDbError):
+    """TMDb ตอบช้าเกิน connect/read timeout"""
+
+
+class TMDbConnectionError(TMDbError):
+    """ต่อ TMDb ไม่ได้ (DNS, connection refused, TLS ฯลฯ)"""
+
+
+class TMDbHTTPError(TMDbError):
+    """TMDb ตอบกลับมาด้วย status code ที่ไม่ใช่ 2xx"""
+
+
+class TMDbNotFound(TMDbHTTPError):
+    """404 - ไม่มี resource นี้ใน TMDb"""
+
+
+class TMDbRateLimited(TMDbHTTPError):
+    """429 - โดน TMDb จำกัดจำนวน request"""
+
+    def __init__(self, message, endpoint=None, status_code=429, retry_after=None):
+        super().__init__(message, endpoint=endpoint, status_code=status_code)
+        self.retry_after = retry_after
+
+
+class TMDbBadResponse(TMDbError):
+    """TMDb ตอบกลับมาแต่ body อ่านเป็น JSON ไม่ได้"""
+
+
+class TMDbUnavailable(TMDbError):
+    """circuit breaker เปิดอยู่ (TMDb มีปัญหาช่วงนี้) เลยไม่ยิง request จริง"""
+
+
+class TMDbThrottled(TMDbError):
+    """rate limiter ฝั่งเราไม่มี token ให้ภายในเวลาที่รอได้ เลยไม่ยิง request จริง"""
+
+
+# ==========================================
+# 2. CIRCUIT BREAKER
+# ==========================================
+
+class CircuitBreaker:
+    """
+    ตัดวงจรเมื่ออัตราการล้มเหลวในช่วง window วินาทีล่าสุดถึง failure_rate
+    (ต้องมีอย่างน้อย min_calls ครั้งก่อน) แล้วรอ open_timeout วินาที
+    จากนั้นเข้า half-open ปล่อย request ทดลองไม่เกิน half_open_max_calls ตัว
+    ทดลองผ่าน = ปิดวงจร, ทดลองพัง = เปิดวงจรต่ออีกรอบ
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_rate=0.5, min_calls=10, window=30, open_timeout=30, half_open_max_calls=1):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.open_timeout = open_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._outcomes = deque()  # (timestamp, ok)
+        self._opened_at = 0.0
+        self._probes = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            return self._state
+
+    def _maybe_half_open(self, now):
+        if self._state == self.OPEN and now - self._opened_at >= self.open_timeout:
+            self._state = self.HALF_OPEN
+            self._probes = 0
+
+    def _trim(self, now):
+        while self._outcomes and now - self._outcomes[0][0] > self.window:
+            self._outcomes.popleft()
+
+    def _open(self, now):
+        self._state = self.OPEN
+        self._opened_at = now
+        self._outcomes.clear()
+        logger.warning("TMDb circuit opened for %ss", self.open_timeout)
+
+    def allow(self):
+        """ยอมให้ยิง request นี้ไหม"""
+        now = time.monotonic()
+        with self._lock:
+            self._maybe_half_open(now)
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and self._probes < self.half_open_max_calls:
+                self._probes += 1
+                return True
+            return False
+
+    def record_success(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._state = self.CLOSED
+                self._outcomes.clear()
+                logger.info("TMDb circuit closed")
+                return
+            self._outcomes.append((now, True))
+            self._trim(now)
+
+    def record_skipped(self):
+        """request ที่ allow() แล้วแต่ไม่ได้ยิงจริง (เช่นโดน rate limit ฝั่งเรา) คืนโควตาทดลองให้"""
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def record_failure(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._open(now)
+                return
+            if self._state == self.OPEN:
+                return
+            self._outcomes.append((now, False))
+            self._trim(now)
+            total = len(self._outcomes)
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            if total >= self.min_calls and failures / total >= self.failure_rate:
+                self._open(now)
+
+
+# ==========================================
+# 3. CLIENT
+# ==========================================
+
+# (connect timeout, read timeout) เป็นวินาที แยกตาม endpoint
+DEFAULT_TIMEOUTS = {
+    'default': (3.05, 5),
+    'genre/movie/list': (3.05, 5),
+    'search/movie': (3.05, 4),
+    'discover/movie': (3.05, 6),
+    'movie/{id}': (3.05, 4),
+    'movie/popular': (3.05, 4),
+}
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# (ttl, stale_ttl) เป็นวินาที แยกตาม endpoint
+# ttl = ช่วงที่ถือว่าสด, stale_ttl = ช่วงต่อท้ายที่ยอมเสิร์ฟของเก่าระหว่าง refresh
+DEFAULT_CACHE_TTLS = {
+    'default': (10 * 60, 10 * 60),
+    'genre/movie/list': (3 * 24 * 3600, 4 * 24 * 3600),  # ประเภทหนังแทบไม่เปลี่ยน
+    'movie/{id}': (6 * 3600, 18 * 3600),
+    'movie/popular': (10 * 60, 50 * 60),
+    'search/movie': (15 * 60, 15 * 60),
+    'discover/movie': (60 * 60, 3 * 3600),  # รวมปฏิทินหนังรายเดือน
+}
+
+
+class TMDbClient:
+    """Client สำหรับ TMDb API v3 (thread-safe ใช้ร่วมกันได้ทั้ง process)"""
+
+    def __init__(self, api_key, base_url, language='th-TH', timeouts=None,
+                 max_retries=2, backoff_base=0.25, backoff_max=2.0, pool_size=10,
+                 cache=None, cache_ttls=None, coalesce_cache_alias=None, breaker=None,
+                 rate_limiter=None, page_workers=4):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.language = language
+        self.timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.cache = cache
+        self.cache_ttls = {**DEFAULT_CACHE_TTLS, **(cache_ttls or {})}
+        # ถ้าระบุ alias ของ Django cache จะรวม request ข้าม worker ด้วย
+        self.coalesce_cache_alias = coalesce_cache_alias
+        self.flight = SingleFlight()
+        self.breaker = breaker
+        self.rate_limiter = rate_limiter
+        # pool กลางสำหรับดึงหลายหน้าพร้อมกัน (ใช้ร่วมกันทุก request ไม่ให้ยิง TMDb ถี่เกิน)
+        self.page_executor = ThreadPoolExecutor(max_workers=page_workers, thread_name_prefix='tmdb-pages')
+
+        self.session = requests.Session()
+        # retry เราจัดการเองด้านล่าง เลยปิด retry ของ urllib3
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def get_timeout(self, endpoint):
+        return self.timeouts.get(endpoint, self.timeouts['default'])
+
+    def build_params(self, params=None):
+        """เติม api_key และ language ให้ทุก request (ถ้าผู้เรียกไม่ได้ระบุเอง)"""
+        merged = {'api_key': self.api_key, 'language': self.language}
+        merged.update(params or {})
+        return merged
+
+    def _backoff(self, attempt, retry_after=None):
+        # full jitter: สุ่มระหว่าง 0 ถึง base * 2^attempt (ไม่เกิน backoff_max)
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    def _request_once(self, url, endpoint, params):
+        if self.rate_limiter is not None and not self.rate_limiter.acquire():
+            raise TMDbThrottled(f"TMDb rate limit reached locally, skipped {endpoint}", endpoint=endpoint)
+        try:
+            response = self.session.get(url, params=params, timeout=self.get_timeout(endpoint))
+        except requests.Timeout as e:
+            raise TMDbTimeout(f"TMDb timeout on {endpoint}: {e}", endpoint=endpoint) from e
+        except requests.RequestException as e:
+            raise TMDbConnectionError(f"TMDb connection error on {endpoint}: {e}", endpoint=endpoint) from e
+
+        status = response.status_code
+        if status == 404:
+            raise TMDbNotFound(f"TMDb 404 on {endpoint}", endpoint=endpoint, status_code=status)
+        if status == 429:
+            retry_after = response.headers.get('Retry-After')
+            try:
+                retry_after = float(retry_after) if retry_after else None
+            except ValueError:
+                retry_after = None
+            if self.rate_limiter is not None:
+                self.rate_limiter.penalize(retry_after or 1.0)
+            raise TMDbRateLimited(f"TMDb 429 on {endpoint}", endpoint=endpoint, retry_after=retry_after)
+        if status >= 400:
+            raise TMDbHTTPError(f"TMDb {status} on {endpoint}", endpoint=endpoint, status_code=status)
+
+        try:
+            return response.json()
+        except ValueError as e:
+            raise TMDbBadResponse(f"TMDb returned invalid JSON on {endpoint}", endpoint=endpoint,
+                                  status_code=status) from e
+
+    def get_cache_ttl(self, endpoint):
+        return self.cache_ttls.get(endpoint, self.cache_ttls['default'])
+
+    def cache_key(self, path, params):
+        # key = path + params ที่เรียงแล้ว (รวม language) โดยไม่เอา api_key มาปน
+        items = tuple(sorted((k, str(v)) for k, v in params.items() if k != 'api_key'))
+        return (path, items)
+
+    def get(self, path, params=None, endpoint=None, use_cache=True):
+        """
+        GET {base_url}/{path} แล้วคืน JSON (dict)
+        endpoint คือชื่อกลางของ path ไว้เลือก timeout/TTL เช่น 'movie/{id}'
+        ถ้าไม่ระบุจะใช้ path ตรง ๆ
+        use_cache=False ใช้ตอนต้องการข้อมูลสดจริง ๆ (เช่นงาน sync)
+        """
+        path = path.strip('/')
+        endpoint = endpoint or path
+        params = self.build_params(params)
+
+        if self.cache is None or not use_cache:
+            return self._fetch(path, endpoint, params)
+
+        key = self.cache_key(path, params)
+        ttl, stale_ttl = self.get_cache_ttl(endpoint)
+        return self.cache.get_or_fetch(
+            key,
+            lambda: self._coalesced_fetch(key, path, endpoint, params),
+            ttl, stale_ttl,
+        )
+
+    def get_pages(self, path, params=None, endpoint=None, max_pages=5, deadline=None, use_cache=True):
+        """
+        ดึงผลแบบแบ่งหน้าหลายหน้าแล้วรวมเป็น list เดียว (ตัดตัวซ้ำตาม id เรียงตามลำดับหน้า)
+        อ่าน total_pages จากหน้าแรกก่อน แล้วดึงหน้าที่เหลือ (ไม่เกิน max_pages) พร้อมกันผ่าน page_executor
+        deadline = เวลาที่ยอมรอรวม (วินาที) นับรวมหน้าแรกด้วย
+        - หน้าแรกไม่เสร็จในเวลาโยน TMDbTimeout, error อื่นของหน้าแรกโยนต่อให้ผู้เรียกเหมือน get()
+        - หน้าที่เหลือที่ยังไม่เสร็จเมื่อหมดเวลาหรือ error จะถูกข้ามไป
+        ผู้เรียกรอได้ไม่เกิน deadline เสมอ ต่อให้ page_executor มีงานของ request อื่นต่อคิวอยู่
+        """
+        started = time.monotonic()
+        params = dict(params or {})
+
+        def remaining():
+            return None if deadline is None else max(0.0, deadline - (time.monotonic() - started))
+
+        def submit(page):
+            # copy context ต่อหน้า จะได้ใช้เลนของ rate limiter เดียวกับผู้เรียก
+            return self.page_executor.submit(
+                contextvars.copy_context().run,
+                self.get, path, {**params, 'page': page}, endpoint, use_cache,
+            )
+
+        first_future = submit(1)
+        done, _ = wait([first_future], timeout=remaining())
+        if not done:
+            first_future.cancel()
+            raise TMDbTimeout(f"TMDb {path}: first page not ready within {deadline}s", endpoint=endpoint or path)
+        first = first_future.result()
+        pages = {1: first.get('results', [])}
+        last_page = min(max_pages, first.get('total_pages') or 1)
+
+        if last_page > 1:
+            futures = {submit(page): page for page in range(2, last_page + 1)}
+            done, not_done = wait(futures, timeout=remaining())
+            for future in not_done:
+                future.cancel()
+            if not_done:
+                logger.info("TMDb %s: deadline reached, skipped %d of %d pages", path, len(not_done), last_page)
+            for future in done:
+                try:
+                    pages[futures[future]] = future.result().get('results', [])
+                except TMDbError as e:
+                    logger.info("TMDb %s page %d failed: %s", path, futures[future], e)
+
+        results = {}
+        for page in sorted(pages):
+            for item in pages[page]:
+                results.setdefault(item['id'], item)
+        return list(results.values())
+
+    def _coalesced_fetch(self, key, path, endpoint, params):
+        # ตอน cache miss/หมดอายุ คนที่ขอ key เดียวกันพร้อมกันจะรอผลจากการยิงครั้งเดียว
+        def fetch():
+            if self.coalesce_cache_alias:
+                try:
+                    return coalesce_across_workers(
+                        ('tmdb', key), lambda: self._fetch(path, endpoint, params),
+                        cache_alias=self.coalesce_cache_alias,
+                    )
+                except CoalesceTimeout as e:
+                    # worker ที่ถือ lock ยังไม่ได้ผล ถือว่า TMDb ช้า (ไม่นับใน circuit breaker เพราะเราไม่ได้ยิงเอง)
+                    raise TMDbTimeout(f"TMDb {endpoint}: gave up waiting for another worker", endpoint=endpoint) from e
+            return self._fetch(path, endpoint, params)
+
+        return self.flight.do(key, fetch)
+
+    def _fetch(self, path, endpoint, params):
+        if self.breaker is None:
+            return self._fetch_with_retry(path, endpoint, params)
+
+        if not self.breaker.allow():
+            raise TMDbUnavailable(f"TMDb circuit open, skipped {endpoint}", endpoint=endpoint)
+        try:
+            data = self._fetch_with_retry(path, endpoint, params)
+        except TMDbError as e:
+            # 404/4xx แปลว่า TMDb ยังตอบได้ปกติ ไม่นับเป็นความล้มเหลวของ upstream
+            if isinstance(e, TMDbThrottled):
+                self.breaker.record_skipped()
+            elif is_upstream_failure(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+        return data
+
+    def _fetch_with_retry(self, path, endpoint, params):
+        url = f"{self.base_url}/{path}"
+        attempt = 0
+        while True:
+            try:
+                return self._request_once(url, endpoint, params)
+            except (TMDbTimeout, TMDbConnectionError, TMDbHTTPError) as e:
+                retryable = not isinstance(e, TMDbHTTPError) or e.status_code in RETRYABLE_STATUS
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt, getattr(e, 'retry_after', None))
+                logger.info("Retrying TMDb %s in %.2fs (attempt %d): %s", endpoint, delay, attempt + 1, e)
+                time.sleep(delay)
+                attempt += 1
+
+    def close(self):
+        self.session.close()
+        self.page_executor.shutdown(wait=False, cancel_futures=True)
+
+
+def is_upstream_failure(error):
+    """error นี้แปลว่า TMDb มีปัญหา (ไม่ใช่แค่ request เราผิด/ไม่มีข้อมูล) หรือไม่"""
+    if isinstance(error, TMDbHTTPError):
+        return error.status_code in RETRYABLE_STATUS
+    return isinstance(error, (TMDbTimeout, TMDbConnectionError, TMDbBadResponse))
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """คืน TMDbClient ตัวกลางของ process (สร้างครั้งแรกตอนถูกเรียก)"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = TMDbClient(
+                    api_key=TMDB_API_KEY,
+                    base_url=TMDB_BASE_URL,
+                    timeouts=getattr(settings, 'TMDB_TIMEOUTS', None),
+                    max_retries=getattr(settings, 'TMDB_MAX_RETRIES', 2),
+                    pool_size=getattr(settings, 'TMDB_POOL_SIZE', 10),
+                    cache=TTLCache(maxsize=getattr(settings, 'TMDB_CACHE_MAXSIZE', 2048)),
+                    cache_ttls=getattr(settings, 'TMDB_CACHE_TTLS', None),
+                    coalesce_cache_alias=getattr(settings, 'TMDB_COALESCE_CACHE_ALIAS', 'default'),
+                    breaker=CircuitBreaker(**getattr(settings, 'TMDB_CIRCUIT_BREAKER', {})),
+                    rate_limiter=RateLimiter(**getattr(settings, 'TMDB_RATE_LIMIT', {})),
+                    page_workers=getattr(settings, 'TMDB_PAGE_WORKERS', 4),
+                )
+    return _client
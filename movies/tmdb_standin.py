@@ -0,0 +1,214 @@
+# movies/tmdb_standin.py
+"""
+TMDb จำลอง (WSGI app) สำหรับ benchmark และทดสอบแบบไม่ต่อเน็ต
+
+เสิร์ฟ endpoint ที่แอปเราใช้จากข้อมูลที่บันทึกไว้ใน movies/data/
+    /genre/movie/list, /movie/popular, /movie/{id}, /movie/changes, /search/movie, /discover/movie
+ตั้งค่าหน่วงเวลา (latency) และสุ่ม error (5xx / 429) ได้
+
+รันด้วย:  python manage.py tmdb_standin --port 8001 --latency-ms 80 --error-rate 0.05
+แล้วตั้ง TMDB_BASE_URL=http://127.0.0.1:8001/3 ก่อนรันเว็บ
+"""
+import datetime
+import json
+import random
+import re
+import time
+from pathlib import Path
+from urllib.parse import parse_qs
+
+DATA_DIR = Path(__file__).resolve().parent / 'data'
+FIXTURE_DIR = DATA_DIR / 'tmdb_fixtures'
+
+PAGE_SIZE = 20
+
+# id ของหนังจำลองในปฏิทิน (สร้างตามวันที่) เริ่มที่เลขนี้ จะได้ไม่ชนกับหนังจริง
+SYNTHETIC_ID_BASE = 900_000_000
+
+
+def load_fixtures(fixture_dir=FIXTURE_DIR):
+    with open(Path(fixture_dir) / 'movies.json', encoding='utf-8') as f:
+        movies = json.load(f)['movies']
+    with open(DATA_DIR / 'tmdb_genres.json', encoding='utf-8') as f:
+        genres = json.load(f)['genres']
+    return movies, genres
+
+
+def to_list_item(movie):
+    """แปลงข้อมูลหนังเต็ม (แบบ /movie/{id}) เป็นรายการย่อ (แบบผลค้นหา)"""
+    item = {k: v for k, v in movie.items() if k not in ('genres', 'runtime')}
+    item['genre_ids'] = [g['id'] for g in movie.get('genres', [])]
+    return item
+
+
+def paginate(items, page):
+    total = len(items)
+    total_pages = max(1, (total + PAGE_SIZE - 1) // PAGE_SIZE)
+    start = (page - 1) * PAGE_SIZE
+    return {
+        'page': page,
+        'results': items[start:start + PAGE_SIZE],
+        'total_pages': total_pages,
+        'total_results': total,
+    }
+
+
+class TMDbStandIn:
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0, rate_limit_rate=0.0,
+                 synthetic_per_day=3, seed=None, fixture_dir=FIXTURE_DIR):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.synthetic_per_day = synthetic_per_day
+        self.random = random.Random(seed)
+        self.movies, self.genres = load_fixtures(fixture_dir)
+        self.movies_by_id = {m['id']: m for m in self.movies}
+        self.genre_names = {g['id']: g['name'] for g in self.genres}
+        self.routes = [
+            (re.compile(r'^genre/movie/list$'), self.genre_list),
+            (re.compile(r'^movie/popular$'), self.popular),
+            (re.compile(r'^movie/changes$'), self.changes),
+            (re.compile(r'^movie/(?P<movie_id>\d+)$'), self.movie_detail),
+            (re.compile(r'^search/movie$'), self.search),
+            (re.compile(r'^discover/movie$'), self.discover),
+        ]
+
+    # ---------- หนังจำลองในปฏิทิน ----------
+
+    def synthetic_movie(self, movie_id):
+        """หนังจำลองที่ผูกกับวันที่ (id = BASE + ordinal * 10 + ลำดับ) ให้ผลเหมือนเดิมทุกครั้ง"""
+        ordinal, slot = divmod(movie_id - SYNTHETIC_ID_BASE, 10)
+        day = datetime.date.fromordinal(ordinal)
+        rng = random.Random(movie_id)
+        genre_ids = rng.sample(sorted(self.genre_names), 2)
+        return {
+            'id': movie_id,
+            'title': f"Stand-in Release {day.isoformat()} #{slot + 1}",
+            'original_title': f"Stand-in Release {day.isoformat()} #{slot + 1}",
+            'release_date': day.isoformat(),
+            'genres': [{'id': g, 'name': self.genre_names[g]} for g in genre_ids],
+            'vote_average': round(rng.uniform(5.0, 8.5), 1),
+            'vote_count': rng.randint(0, 500),
+            'popularity': round(rng.uniform(1, 100), 3),
+            'runtime': rng.randint(85, 150),
+            'overview': 'หนังจำลองจาก TMDb stand-in',
+            'poster_path': f"/standin_{movie_id}.jpg",
+            'backdrop_path': None,
+            'adult': False,
+            'original_language': 'th',
+        }
+
+    def synthetic_releases(self, start, end):
+        movies = []
+        day = start
+        while day <= end:
+            count = random.Random(day.toordinal()).randint(0, self.synthetic_per_day)
+            for slot in range(count):
+                movies.append(self.synthetic_movie(SYNTHETIC_ID_BASE + day.toordinal() * 10 + slot))
+            day += datetime.timedelta(days=1)
+        return movies
+
+    # ---------- endpoints ----------
+
+    def genre_list(self, query):
+        return 200, {'genres': self.genres}
+
+    def popular(self, query):
+        movies = sorted(self.movies, key=lambda m: -m['popularity'])
+        return 200, paginate([to_list_item(m) for m in movies], self.page(query))
+
+    def changes(self, query):
+        # ถือว่าทุกเรื่องใน fixture มีการเปลี่ยนแปลง (TMDb ส่งมาแค่ id กับ adult)
+        items = [{'id': m['id'], 'adult': m.get('adult', False)} for m in self.movies]
+        return 200, paginate(items, self.page(query))
+
+    def movie_detail(self, query, movie_id):
+        movie_id = int(movie_id)
+        if movie_id >= SYNTHETIC_ID_BASE and self.synthetic_per_day:
+            return 200, self.synthetic_movie(movie_id)
+        movie = self.movies_by_id.get(movie_id)
+        if movie is None:
+            return 404, {'success': False, 'status_code': 34,
+                         'status_message': 'The resource you requested could not be found.'}
+        return 200, movie
+
+    def search(self, query):
+        text = query.get('query', '').lower()
+        year = query.get('primary_release_year') or query.get('year')
+        movies = [m for m in self.movies if text and text in m['title'].lower()]
+        if year:
+            movies = [m for m in movies if m['release_date'].startswith(str(year))]
+        return 200, paginate([to_list_item(m) for m in movies], self.page(query))
+
+    def discover(self, query):
+        movies = list(self.movies)
+        gte = query.get('release_date.gte') or query.get('primary_release_date.gte')
+        lte = query.get('release_date.lte') or query.get('primary_release_date.lte')
+        if gte and lte and self.synthetic_per_day:
+            movies += self.synthetic_releases(datetime.date.fromisoformat(gte), datetime.date.fromisoformat(lte))
+        if gte:
+            movies = [m for m in movies if m['release_date'] >= gte]
+        if lte:
+            movies = [m for m in movies if m['release_date'] <= lte]
+        if query.get('primary_release_year'):
+            movies = [m for m in movies if m['release_date'].startswith(str(query['primary_release_year']))]
+        if query.get('with_genres'):
+            # TMDb ใช้ "," = AND และ "|" = OR
+            wanted = query['with_genres']
+            if '|' in wanted:
+                ids = {int(g) for g in wanted.split('|')}
+                movies = [m for m in movies if ids & {g['id'] for g in m['genres']}]
+            else:
+                ids = {int(g) for g in wanted.split(',')}
+                movies = [m for m in movies if ids <= {g['id'] for g in m['genres']}]
+
+        sort_field, _, direction = query.get('sort_by', 'popularity.desc').rpartition('.')
+        sort_field = {'primary_release_date': 'release_date'}.get(sort_field, sort_field)
+        movies.sort(key=lambda m: (m.get(sort_field) or 0, m['id']), reverse=(direction == 'desc'))
+        return 200, paginate([to_list_item(m) for m in movies], self.page(query))
+
+    # ---------- WSGI ----------
+
+    def page(self, query):
+        try:
+            return max(1, int(query.get('page', 1)))
+        except ValueError:
+            return 1
+
+    def inject_latency(self):
+        if self.latency_ms or self.jitter_ms:
+            delay = self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms)
+            time.sleep(max(0.0, delay) / 1000.0)
+
+    def dispatch(self, path, query):
+        path = path.strip('/')
+        if path.startswith('3/'):
+            path = path[2:]
+        for pattern, handler in self.routes:
+            match = pattern.match(path)
+            if match:
+                return handler(query, **match.groupdict())
+        return 404, {'success': False, 'status_code': 34, 'status_message': 'Unknown endpoint.'}
+
+    def __call__(self, environ, start_response):
+        self.inject_latency()
+
+        roll = self.random.random()
+        headers = [('Content-Type', 'application/json;charset=utf-8')]
+        if roll < self.rate_limit_rate:
+            status, body = 429, {'success': False, 'status_code': 25,
+                                 'status_message': 'Your request count is over the allowed limit.'}
+            headers.append(('Retry-After', '1'))
+        elif roll < self.rate_limit_rate + self.error_rate:
+            status, body = self.random.choice([500, 502, 503]), {'success': False, 'status_message': 'Injected error.'}
+        else:
+            query = {k: v[0] for k, v in parse_qs(environ.get('QUERY_STRING', '')).items()}
+            status, body = self.dispatch(environ.get('PATH_INFO', ''), query)
+
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        headers.append(('Content-Length', str(len(payload))))
+        reason = {200: 'OK', 404: 'Not Found', 429: 'Too Many Requests', 500: 'Internal Server Error',
+                  502: 'Bad Gateway', 503: 'Service Unavailable'}[status]
+        start_response(f'{status} {reason}', headers)
+        return [payload]
@@ -5,10 +5,13 @@ urlpatterns = [
     # --- 1. ระบบค้นหาและแนะนำ ---
     path('search/', views.search_movies, name='search_movies'),
     path('recommend/<int:mood_id>/', views.mood_recommendation, name='mood_recommendation'),
+    path('recommend/for-you/', views.personal_recommendations, name='personal_recommendations'),
 
     # --- 2. จัดการภาพยนตร์ ---
     path('movie/<int:tmdb_id>/', views.movie_detail, name='movie_detail'),
     path('movie/<int:tmdb_id>/', views.movie_detail, name='movie_detail'),
+    path('movie/<int:tmdb_id>/similar/', views.movie_similar_json, name='movie_similar_json'),
+    path('movie/<int:tmdb_id>/reviews/', views.movie_reviews_json, name='movie_reviews_json'),
     path('movie/<int:tmdb_id>/favorite/', views.toggle_favorite, name='toggle_favorite'),
     path('movie/<int:tmdb_id>/bookmark/', views.toggle_bookmark, name='toggle_bookmark'),
 
@@ -24,6 +27,7 @@ urlpatterns = [
     path('custom-admin/moods/delete/<int:mood_id>/', views.admin_delete_mood, name='admin_delete_mood'),
     path('custom-admin/reviews/', views.admin_reviews, name='admin_reviews'),
     path('custom-admin/reviews/delete/<int:review_id>/', views.admin_delete_review, name='admin_delete_review'),
+    path('custom-admin/tmdb-metrics/', views.admin_tmdb_metrics, name='admin_tmdb_metrics'),
     path('custom-admin/users/', views.admin_users, name='admin_users'),
     path('custom-admin/users/delete/<int:user_id>/', views.admin_delete_user, name='admin_delete_user'),
 
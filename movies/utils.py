@@ -1,81 +1,84 @@
 # movies/utils.py
-import requests
+import asyncio
+import datetime
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Movie, Genre
+from .fragments import bump_movie_version
+from .genres import genre_registry
+from .tmdb import get_client, TMDbError, TMDB_API_KEY, TMDB_BASE_URL, TMDB_IMAGE_BASE_URL
+
+logger = logging.getLogger(__name__)
 
-TMDB_API_KEY = getattr(settings, 'TMDB_API_KEY', '8f3fabb4ea55b62b7d611bc956f12b8b') 
-TMDB_BASE_URL = 'https://api.themoviedb.org/3'
-TMDB_IMAGE_BASE_URL = 'https://image.tmdb.org/t/p/w500' # ขนาดรูปภาพมาตรฐาน
+# จำนวนหน้าสูงสุดที่ดึงจาก discover และเวลาที่ยอมรอรวมต่อ request (วินาที)
+TMDB_DISCOVER_MAX_PAGES = getattr(settings, 'TMDB_DISCOVER_MAX_PAGES', 3)
+TMDB_CALENDAR_MAX_PAGES = getattr(settings, 'TMDB_CALENDAR_MAX_PAGES', 10)
+TMDB_PAGE_DEADLINE = getattr(settings, 'TMDB_PAGE_DEADLINE', 4.0)
 
 def get_tmdb_genres():
     # ดึงรายชื่อประเภทหนังทั้งหมดจาก TMDb
-    url = f"{TMDB_BASE_URL}/genre/movie/list"
-    params = {'api_key': TMDB_API_KEY, 'language': 'th-TH'}
     try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        return response.json().get('genres', [])
-    except Exception as e:
-        print(f"Error fetching genres: {e}")
+        data = get_client().get('genre/movie/list')
+        return data.get('genres', [])
+    except (TMDbError, KeyError) as e:
+        logger.warning("Error fetching genres: %s", e)
         return []
 
 def search_movies_tmdb(query, year=None, genre_id=None):
     # ค้นหาหนังจาก TMDb (รองรับ ชื่อ, ปี, และประเภท)
     results = []
-    
+
     # กรณี 1: ค้นหาด้วยชื่อ (Search API) -> กรอง Genre ทีหลัง
     if query:
-        url = f"{TMDB_BASE_URL}/search/movie"
         params = {
-            'api_key': TMDB_API_KEY,
             'query': query,
-            'language': 'th-TH',
             'include_adult': 'false'
         }
         if year:
             params['primary_release_year'] = year
-            
+
         try:
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
-            
+            data = get_client().get('search/movie', params)
+
             for item in data.get('results', []):
                 # ถ้ามีการระบุ genre_id ต้องเช็คว่าหนังเรื่องนี้มี genre นั้นไหม
                 if genre_id and int(genre_id) not in item.get('genre_ids', []):
                     continue # ข้ามไปถ้าไม่ตรงประเภท
-                
+
                 if item.get('poster_path'):
                     results.append({
                         'tmdb_id': item['id'],
                         'title': item['title'],
                         'release_date': item.get('release_date', 'N/A'),
                         'poster_url': f"{TMDB_IMAGE_BASE_URL}{item['poster_path']}",
-                        'vote_average': item.get('vote_average', 0.0) 
+                        'vote_average': item.get('vote_average', 0.0)
                     })
-        except Exception as e:
-            print(f"Error searching: {e}")
+        except (TMDbError, KeyError) as e:
+            logger.warning("Error searching: %s", e)
 
     # กรณี 2: ไม่ได้พิมพ์ชื่อ แต่เลือกประเภทหรือปี (Discover API)
     elif genre_id or year:
-        url = f"{TMDB_BASE_URL}/discover/movie"
         params = {
-            'api_key': TMDB_API_KEY,
-            'language': 'th-TH',
             'sort_by': 'popularity.desc', # เอาหนังดังขึ้นก่อน
             'include_adult': 'false',
-            'page': 1
         }
         if genre_id:
             params['with_genres'] = genre_id
         if year:
             params['primary_release_year'] = year
-            
+
         try:
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
-            
-            for item in data.get('results', []):
+            items = get_client().get_pages('discover/movie', params,
+                                           max_pages=TMDB_DISCOVER_MAX_PAGES, deadline=TMDB_PAGE_DEADLINE)
+
+            for item in items:
                 if item.get('poster_path'):
                     results.append({
                         'tmdb_id': item['id'],
@@ -84,19 +87,15 @@ def search_movies_tmdb(query, year=None, genre_id=None):
                         'poster_url': f"{TMDB_IMAGE_BASE_URL}{item['poster_path']}",
                         'vote_average': item.get('vote_average', 0.0)
                     })
-        except Exception as e:
-            print(f"Error discovering: {e}")
+        except (TMDbError, KeyError) as e:
+            logger.warning("Error discovering: %s", e)
 
     return results
 
 def get_movie_details_tmdb(tmdb_id):
     # ดึงรายละเอียดหนังจาก TMDb
-    url = f"{TMDB_BASE_URL}/movie/{tmdb_id}"
-    params = {'api_key': TMDB_API_KEY, 'language': 'th-TH'}
     try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        data = response.json()
+        data = get_client().get(f'movie/{int(tmdb_id)}', endpoint='movie/{id}')
         return {
             'tmdb_id': data['id'],
             'title': data['title'],
@@ -105,20 +104,19 @@ def get_movie_details_tmdb(tmdb_id):
             'overview': data.get('overview', ''),
             'release_date': data.get('release_date'),
             'genres': [g['name'] for g in data.get('genres', [])],
+            'genre_ids': [g['id'] for g in data.get('genres', [])],
             'runtime': data.get('runtime'),
-            'vote_average': data.get('vote_average', 0.0)
+            'vote_average': data.get('vote_average', 0.0),
+            'payload': data, # ข้อมูลดิบทั้งก้อน ไว้เก็บลง Movie.tmdb_payload
         }
-    except Exception as e:
+    except (TMDbError, KeyError) as e:
+        logger.info("Error fetching movie %s: %s", tmdb_id, e)
         return None
 
 def get_popular_movies_tmdb():
     # ดึงหนังยอดนิยม (เหมือนเดิม)
-    url = f"{TMDB_BASE_URL}/movie/popular"
-    params = {'api_key': TMDB_API_KEY, 'language': 'th-TH', 'page': 1}
     try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        data = response.json()
+        data = get_client().get('movie/popular', {'page': 1})
         results = []
         for item in data.get('results', [])[:10]:
             if item.get('poster_path'):
@@ -130,16 +128,114 @@ def get_popular_movies_tmdb():
                     'vote_average': item.get('vote_average', 0.0)
                 })
         return results
-    except Exception as e:
-        print(f"Error fetching popular movies from TMDb: {e}")
+    except (TMDbError, KeyError) as e:
+        logger.warning("Error fetching popular movies from TMDb: %s", e)
         return []
-    
+
+def parse_tmdb_date(value):
+    # TMDb ส่งวันที่เป็น 'YYYY-MM-DD' หรือ '' (ไม่ทราบ)
+    try:
+        return datetime.date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+def movie_fields_from_tmdb(item, detail=False):
+    """
+    แปลงข้อมูลหนังจาก TMDb เป็น field ของ Movie
+    detail=True ใช้กับผลของ /movie/{id} (มี runtime และเก็บ payload ดิบไว้ด้วย)
+    """
+    fields = {
+        'tmdb_id': item['id'],
+        'title': (item.get('title') or item.get('original_title') or '')[:255],
+        'poster_path': item.get('poster_path'),
+        'overview': item.get('overview', ''),
+        'release_date': parse_tmdb_date(item.get('release_date')),
+        'vote_average': item.get('vote_average') or 0.0,
+    }
+    if detail:
+        fields['runtime'] = item.get('runtime') or None
+        fields['tmdb_payload'] = item
+    return fields
+
+def genres_from_tmdb(item):
+    """รายการ genre [{'id', 'name'}] ของหนัง (แบบรายละเอียดมี genres, แบบรายการมีแค่ genre_ids)"""
+    if 'genres' in item:
+        return [{'id': g['id'], 'name': g['name']} for g in item['genres']]
+    return [{'id': gid, 'name': genre_registry.name(gid, f'Genre {gid}')} for gid in item.get('genre_ids', [])]
+
+def bulk_set_movie_genres(movie_genres):
+    """
+    ตั้ง genre ให้หนังหลายเรื่องในไม่กี่ query
+    movie_genres: dict {movie.pk: [{'id': tmdb_genre_id, 'name': ...}, ...]}
+    """
+    if not movie_genres:
+        return
+    all_genres = {g['id']: g['name'] for genres in movie_genres.values() for g in genres}
+    if all_genres:
+        Genre.objects.bulk_create(
+            [Genre(tmdb_id=gid, name=name) for gid, name in all_genres.items()],
+            update_conflicts=True, unique_fields=['tmdb_id'], update_fields=['name'],
+        )
+    genre_pks = dict(Genre.objects.filter(tmdb_id__in=all_genres).values_list('tmdb_id', 'id'))
+
+    Through = Movie.genres.through
+    Through.objects.filter(movie_id__in=movie_genres.keys()).delete()
+    Through.objects.bulk_create([
+        Through(movie_id=movie_pk, genre_id=genre_pks[g['id']])
+        for movie_pk, genres in movie_genres.items()
+        for g in genres
+    ], ignore_conflicts=True)
+
+# field ของ Movie ที่ sync จาก TMDb
+SYNC_FIELDS = ['title', 'poster_path', 'overview', 'release_date', 'vote_average', 'runtime', 'tmdb_payload']
+
+def refresh_movie_from_tmdb(movie, tmdb_data, save=True):
+    """เขียนข้อมูลล่าสุดจาก TMDb (ผลของ get_movie_details_tmdb) ทับแถว Movie เดิม รวมถึง genre"""
+    fields = movie_fields_from_tmdb(tmdb_data['payload'], detail=True)
+    for field in SYNC_FIELDS:
+        setattr(movie, field, fields[field])
+    movie.last_synced_at = timezone.now()
+    if save:
+        movie.save(update_fields=SYNC_FIELDS + ['last_synced_at'])
+        bulk_set_movie_genres({movie.pk: genres_from_tmdb(tmdb_data['payload'])})
+        bump_movie_version(movie.pk)
+    return movie
+
+def upsert_movie_from_tmdb(tmdb_data):
+    """
+    เขียนผลของ get_movie_details_tmdb ลง Movie ด้วย INSERT ... ON CONFLICT (tmdb_id) DO UPDATE (พร้อม genre)
+    สอง request สร้างหนังเรื่องเดียวกันพร้อมกันก็ไม่ชน unique ของ tmdb_id คนมาทีหลังแค่เขียนข้อมูลล่าสุดทับ
+    """
+    movie = Movie(**movie_fields_from_tmdb(tmdb_data['payload'], detail=True), last_synced_at=timezone.now())
+    with transaction.atomic():
+        Movie.objects.bulk_create(
+            [movie], update_conflicts=True, unique_fields=['tmdb_id'],
+            update_fields=SYNC_FIELDS + ['last_synced_at'],
+        )
+        if movie.pk is None:
+            # backend ที่ไม่คืน id จาก bulk insert
+            movie.pk = Movie.objects.only('id').get(tmdb_id=movie.tmdb_id).pk
+        bulk_set_movie_genres({movie.pk: genres_from_tmdb(tmdb_data['payload'])})
+        bump_movie_version(movie.pk)
+    return movie
+
+def get_popular_movies_local(limit=10):
+    # หนังยอดนิยมจาก DB ของเราเอง (ใช้ตอน TMDb ล่ม) วัดจากจำนวน Favorite + รีวิว
+    movies = Movie.objects.exclude(poster_path__isnull=True).exclude(poster_path='').annotate(
+        fav_count=Count('favorited_by', distinct=True),
+        review_count=Count('reviews', distinct=True),
+    ).order_by('-fav_count', '-review_count', '-vote_average')[:limit]
+    return [{
+        'tmdb_id': m.tmdb_id,
+        'title': m.title,
+        'release_date': str(m.release_date) if m.release_date else 'N/A',
+        'poster_url': f"{TMDB_IMAGE_BASE_URL}{m.poster_path}",
+        'vote_average': m.vote_average,
+    } for m in movies]
+
 def get_movies_in_date_range(start_date, end_date):
     """ดึงหนังที่ฉายในไทย ช่วงวันที่กำหนด"""
-    url = f"{TMDB_BASE_URL}/discover/movie"
     params = {
-        'api_key': TMDB_API_KEY,
-        'language': 'th-TH',
         'region': 'TH', # 1. ระบุประเทศ
         'sort_by': 'release_date.asc', # 2. เรียงตามวันฉายในประเทศนั้น
         'release_date.gte': start_date, # 3. ใช้วันฉาย (ไม่ใช่ primary_release_date)
@@ -147,14 +243,14 @@ def get_movies_in_date_range(start_date, end_date):
         'with_release_type': '2|3', # 2=Limited, 3=Theatrical
         'include_adult': 'false'
     }
-    
+
     try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        data = response.json()
-        
+        # เดือนที่หนังเข้าเยอะเกิน 20 เรื่อง -> ดึงทุกหน้าพร้อมกัน
+        items = get_client().get_pages('discover/movie', params,
+                                       max_pages=TMDB_CALENDAR_MAX_PAGES, deadline=TMDB_PAGE_DEADLINE)
+
         results = []
-        for item in data.get('results', []):
+        for item in items:
             if item.get('release_date'):
                 results.append({
                     'tmdb_id': item['id'],
@@ -164,6 +260,41 @@ def get_movies_in_date_range(start_date, end_date):
                     'overview': item.get('overview', '')
                 })
         return results
-    except Exception as e:
-        print(f"Error fetching calendar movies: {e}")
-        return []
\ No newline at end of file
+    except (TMDbError, KeyError) as e:
+        logger.warning("Error fetching calendar movies: %s", e)
+        return []
+
+# ---------- Async (สำหรับ async view) ----------
+# ยิง TMDb ผ่าน client ตัวเดิมบน thread pool ของตัวเอง จะได้ใช้ connection pool / cache /
+# single-flight / circuit breaker / rate limiter ร่วมกับโค้ดฝั่ง sync
+# และไม่ไปแย่ง thread ที่ Django ใช้รัน ORM (sync_to_async) ระหว่างรอ TMDb
+_tmdb_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'TMDB_ASYNC_WORKERS', 16),
+    thread_name_prefix='tmdb-async',
+)
+# งานหลายหน้า (get_pages) แยก pool ไว้ต่างหาก thread พวกนี้นั่งรอ page_executor ได้นานถึง TMDB_PAGE_DEADLINE
+# ถ้าใช้ pool เดียวกัน ปฏิทิน/discover ที่เข้ามาพร้อมกันหลายอันจะกิน thread จนหน้า detail ไม่มี thread ให้ใช้
+# ขนาดเท่า page_executor จะได้ไม่ต่อคิวรอ page worker มากกว่าที่มี
+_tmdb_paged_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'TMDB_PAGED_ASYNC_WORKERS', getattr(settings, 'TMDB_PAGE_WORKERS', 4)),
+    thread_name_prefix='tmdb-paged',
+)
+
+async def run_tmdb(func, *args, executor=None, **kwargs):
+    """รันฟังก์ชัน TMDb แบบ sync ใน thread pool แล้ว await ผลลัพธ์ (ใช้กับ asyncio.gather ได้)"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor or _tmdb_executor, functools.partial(func, *args, **kwargs))
+
+async def aget_movie_details_tmdb(tmdb_id):
+    return await run_tmdb(get_movie_details_tmdb, tmdb_id)
+
+async def asearch_movies_tmdb(query, year=None, genre_id=None):
+    # ไม่มีคำค้นจะไปใช้ discover แบบหลายหน้า
+    executor = None if query else _tmdb_paged_executor
+    return await run_tmdb(search_movies_tmdb, query, year=year, genre_id=genre_id, executor=executor)
+
+async def aget_popular_movies_tmdb():
+    return await run_tmdb(get_popular_movies_tmdb)
+
+async def aget_movies_in_date_range(start_date, end_date):
+    return await run_tmdb(get_movies_in_date_range, start_date, end_date, executor=_tmdb_paged_executor)
@@ -1,51 +1,105 @@
+import asyncio
 import datetime
 import calendar
+import functools
 
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
 from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
-from django.db.models import Count, Avg, Q, F, FloatField, ExpressionWrapper
-from django.http import JsonResponse
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Q
+from django.http import JsonResponse, Http404
 from django.views.decorators.http import require_POST
 from django.contrib.auth.models import User
+from django.conf import settings
 from datetime import date, timedelta
 
-from .models import Movie, Review, Mood, Favorite, Bookmark, CustomList, ReviewMoodScore
+from .models import Movie, Review, Mood, Favorite, Bookmark, CustomList
 from .forms import ReviewForm, CustomListForm
-from .utils import search_movies_tmdb, get_movie_details_tmdb, get_tmdb_genres, get_movies_in_date_range
+from .utils import (
+    asearch_movies_tmdb, aget_movie_details_tmdb, aget_movies_in_date_range, refresh_movie_from_tmdb,
+)
+from .genres import genre_registry
+from . import fragments, mood_stats, services
+from .moods import mood_registry
+from .resolver import movie_resolver
+from .reviews import review_page, review_total, InvalidCursor
+from .similarity import similar_movies, parse_blend, blend_search, BLEND_OPS
+from .recommender import recommender
+from .tmdb import get_client
+
+# ข้อมูลหนังใน DB ที่เก่ากว่านี้ (วินาที) จะดึงจาก TMDb มาอัปเดตตอนเปิดหน้า detail
+TMDB_SYNC_MAX_AGE = getattr(settings, 'TMDB_SYNC_MAX_AGE', 24 * 3600)
 
 # ==========================================
 # 1. PUBLIC VIEWS (ค้นหา, รายละเอียด, แนะนำ)
 # ==========================================
 
-def search_movies(request):
+async def _alist(queryset):
+    """ประเมิน queryset แบบ async (ใช้คู่กับ asyncio.gather)"""
+    return [obj async for obj in queryset]
+
+def _int_param(params, name):
+    """ค่าตัวเลขจาก query string ไม่ได้ใส่หรือไม่ใช่ตัวเลข (เช่น ?genre=abc) คืน None ถือว่าไม่ได้กรอง"""
+    try:
+        return int(params.get(name, ''))
+    except ValueError:
+        return None
+
+def _filter_movies(movies_qs, query, year, genre_id):
+    """กรองชื่อ (icontains ใช้ trigram index บน UPPER(title)) / ปี / ประเภท ใช้ร่วมกันทุกแบบของการค้นหาใน DB"""
+    if query:
+        movies_qs = movies_qs.filter(title__icontains=query)
+    if year:
+        movies_qs = movies_qs.filter(release_date__year=year)
+    if genre_id:
+        # กรองประเภทจาก Genre ที่เก็บไว้ใน DB เอง ไม่ต้องพึ่ง TMDb
+        movies_qs = movies_qs.filter(genres__tmdb_id=genre_id)
+    return movies_qs
+
+def _mood_search_queryset(mood_id, query='', year=None, genre_id=None):
+    """หนังที่มีรีวิวให้คะแนนอารมณ์นี้ > 0 (อ่านจาก partial index ของ ReviewMoodScore)"""
+    movies_qs = Movie.objects.filter(
+        reviews__mood_scores__mood_id=mood_id,
+        reviews__mood_scores__intensity__gt=0
+    ).distinct()
+    return _filter_movies(movies_qs, query, year, genre_id)
+
+async def search_movies(request):
     """ค้นหาภาพยนตร์ (รองรับชื่อ, อารมณ์แบบใหม่ Multi-Mood, ปี, ประเภท)"""
     query = request.GET.get('q', '').strip()
     mood_id = request.GET.get('mood')
-    year = request.GET.get('year')
-    genre_id = request.GET.get('genre')
+    year = _int_param(request.GET, 'year')
+    genre_id = _int_param(request.GET, 'genre')
 
     movies = []
     search_source = ""
+    moods = await mood_registry.aall()
+    blend_targets = parse_blend(request.GET, moods)
+    blend_page = None
+
+    # Case 0: Mood Blend หลายอารมณ์พร้อมกัน (เช่น ตลก ≥ 3, น่ากลัว ≤ 1) จัดอันดับจาก index ใน memory
+    if blend_targets:
+        search_source = "blend"
+        try:
+            page = max(int(request.GET.get('page', 1)), 1)
+        except ValueError:
+            page = 1
+        blend_page = await sync_to_async(_blend_results)(blend_targets, page, query, year, genre_id)
+        movies = blend_page['results']
 
     # Case 1: ค้นหาจาก Local DB (เมื่อมีการเลือก Mood)
-    if mood_id:
+    elif mood_id:
         search_source = "local"
-        mood = get_object_or_404(Mood, id=mood_id)
+        mood = await mood_registry.aget(mood_id)
+        if mood is None:
+            raise Http404('ไม่พบอารมณ์นี้')
         
-        # กรองจากตารางลูก ReviewMoodScore ที่คะแนน > 0 เท่านั้น
-        movies_qs = Movie.objects.filter(
-            reviews__mood_scores__mood=mood,
-            reviews__mood_scores__intensity__gt=0 
-        ).distinct()
-        
-        if query:
-            movies_qs = movies_qs.filter(title__icontains=query)
-        if year:
-            movies_qs = movies_qs.filter(release_date__year=year)
-            
-        for m in movies_qs:
+        movies_qs = _mood_search_queryset(mood.id, query, year, genre_id)
+        async for m in movies_qs:
             movies.append({
                 'tmdb_id': m.tmdb_id,
                 'title': m.title,
@@ -57,132 +111,209 @@ def search_movies(request):
     # Case 2: ค้นหาจาก TMDb API (เมื่อไม่มี Mood)
     elif query or genre_id or year:
         search_source = "tmdb"
-        movies = search_movies_tmdb(query, year=year, genre_id=genre_id)
+        movies = await asearch_movies_tmdb(query, year=year, genre_id=genre_id)
+
+    # ค่าที่เลือกไว้ในแผง Mood Blend + query string สำหรับลิงก์เปลี่ยนหน้า
+    selected_blend = {mood_id: (op, value) for mood_id, op, value, _ in blend_targets}
+    blend_rows = [{
+        'mood': mood,
+        'op': selected_blend.get(mood.id, ('', None))[0],
+        'value': selected_blend.get(mood.id, ('', None))[1],
+    } for mood in moods]
+    querystring = request.GET.copy()
+    querystring.pop('page', None)
 
     # เตรียมข้อมูลสำหรับ Dropdown
-    moods = Mood.objects.all()
-    tmdb_genres = get_tmdb_genres()
+    tmdb_genres = await genre_registry.aall()
     current_year = datetime.date.today().year
     years = range(current_year, 1979, -1)
 
-    return render(request, 'movies/search.html', {
+    return await sync_to_async(render)(request, 'movies/search.html', {
         'movies': movies,
         'query': query,
         'moods': moods,
         'tmdb_genres': tmdb_genres,
         'years': years,
-        'selected_mood': int(mood_id) if mood_id else None,
-        'selected_year': int(year) if year else None,
-        'selected_genre': int(genre_id) if genre_id else None,
-        'search_source': search_source
+        'selected_mood': _int_param(request.GET, 'mood'),
+        'selected_year': year,
+        'selected_genre': genre_id,
+        'search_source': search_source,
+        'blend_rows': blend_rows,
+        'blend_ops': BLEND_OPS.items(),
+        'blend_page': blend_page,
+        'blend_querystring': querystring.urlencode(),
     })
 
-def movie_detail(request, tmdb_id):
-    """แสดงรายละเอียดภาพยนตร์และรีวิว (อัปเดตใหม่ รองรับ Multi-Mood & Radar Chart)"""
-    
-    # 1. จัดการข้อมูลหนัง (หาใน DB หรือดึงจาก TMDB)
-    movie = Movie.objects.filter(tmdb_id=tmdb_id).first()
-    tmdb_data = get_movie_details_tmdb(tmdb_id)
-    
-    if not tmdb_data:
-         return render(request, '404.html')
-
-    # ถ้ายังไม่มีหนังใน DB ให้สร้างใหม่
-    if not movie and tmdb_data:
-        movie = Movie.objects.create(
-            tmdb_id=tmdb_data['tmdb_id'], 
-            title=tmdb_data['title'],
-            poster_path=tmdb_data.get('poster_path'),
-            overview=tmdb_data.get('overview', ''),
-            release_date=tmdb_data.get('release_date') or None,
-            vote_average=tmdb_data.get('vote_average', 0)
-        )
-
-    # 2. Handle Review Submission (POST)
-    if request.method == 'POST' and request.user.is_authenticated:
-        
-        # Check Duplicate Review
-        if Review.objects.filter(user=request.user, movie=movie).exists():
-            messages.warning(request, 'คุณได้รีวิวหนังเรื่องนี้ไปแล้ว หากต้องการเปลี่ยนคะแนน กรุณาแก้ไขรีวิวเดิม')
-            return redirect('movie_detail', tmdb_id=tmdb_id)
+def _blend_results(targets, page, query, year, genre_id):
+    """ผล Mood Blend หน้าที่ page (กรองชื่อ/ปี/ประเภทจาก DB ก่อนถ้ามี) ในรูปแบบเดียวกับผลค้นหาอื่น"""
+    movie_ids = None
+    if query or year or genre_id:
+        movie_ids = _filter_movies(Movie.objects.all(), query, year, genre_id).values_list('id', flat=True)
+
+    result = blend_search(targets, page=page, movie_ids=movie_ids)
+    result['results'] = [{
+        'tmdb_id': m.tmdb_id,
+        'title': m.title,
+        'release_date': str(m.release_date) if m.release_date else 'N/A',
+        'poster_url': f"https://image.tmdb.org/t/p/w500{m.poster_path}" if m.poster_path else None,
+        'overview': m.overview,
+        'match': m.match,
+    } for m in result.pop('movies')]
+    return result
+
+def _submit_review(request, movie):
+    """บันทึกรีวิวจากฟอร์มในหน้า detail คืน (response, form) ถ้า response เป็น None ให้แสดงหน้าพร้อม form เดิม"""
+    # Check Duplicate Review
+    if Review.objects.filter(user=request.user, movie=movie).exists():
+        messages.warning(request, 'คุณได้รีวิวหนังเรื่องนี้ไปแล้ว หากต้องการเปลี่ยนคะแนน กรุณาแก้ไขรีวิวเดิม')
+        return redirect('movie_detail', tmdb_id=movie.tmdb_id), None
+
+    form = ReviewForm(request.POST)
+    if form.is_valid():
+        try:
+            scores = services.parse_mood_scores(request.POST)
+        except ValidationError as e:
+            for message in e.messages:
+                messages.error(request, message)
+            return None, form
+        services.create_review(request.user, movie, form.cleaned_data['comment'], scores)
+        messages.success(request, 'บันทึกรีวิวเรียบร้อยแล้ว!')
+        return redirect('movie_detail', tmdb_id=movie.tmdb_id), None
+    return None, form
+
+def _movie_detail_context(request, movie, lazy=False):
+    """ดึงข้อมูลจาก DB สำหรับหน้า detail (รีวิว, Mood Stats, รายการของผู้ใช้) แบบประเมินผลครบในฟังก์ชันนี้
+    จะได้รันขนานกับการยิง TMDb แล้วค่อย render ทีหลังโดยไม่ต้องแตะ DB อีก
+    lazy=True ส่วนที่ใช้ร่วมกันใน fragment (movies/fragments.py) ส่งเป็น callable ให้ template เรียกตอนใช้
+    fragment ที่ยังอยู่ใน cache ไม่แตะตัวแปรพวกนี้เลยไม่มี query ส่วน fragment ที่หลุดไปก่อน render ก็ยังได้ข้อมูลครบ"""
+    user = request.user
+    all_moods = mood_registry.all()
+    context = {
+        'movie': movie,
+        'movie_db': movie,
+        'all_moods': all_moods,
+        # หนังที่ให้อารมณ์คล้ายกัน (จาก index NumPy ใน memory) ขึ้นกับหนังเรื่องอื่นด้วย เลยไม่ได้ cache ตามเวอร์ชัน
+        'similar_movies': similar_movies(movie, limit=6),
+    }
 
-        form = ReviewForm(request.POST)
-        if form.is_valid():
-            review = form.save(commit=False)
-            review.movie = movie
-            review.user = request.user
-            review.save()
-
-            # วนลูปเก็บคะแนน Mood Score
-            all_moods = Mood.objects.all()
-            for mood in all_moods:
-                score_key = f'mood_score_{mood.id}'
-                score_val = request.POST.get(score_key)
-                if score_val and score_val.isdigit():
-                    intensity = int(score_val)
-                    if intensity > 0:
-                        ReviewMoodScore.objects.create(
-                            review=review,
-                            mood=mood,
-                            intensity=intensity
-                        )
-            messages.success(request, 'บันทึกรีวิวเรียบร้อยแล้ว!')
-            return redirect('movie_detail', tmdb_id=movie.tmdb_id)
+    # รีวิวหน้าแรก (keyset) ที่เหลือโหลดต่อผ่าน movie_reviews_json ไม่โหลดทั้งหมดในครั้งเดียว
+    first_page = functools.cache(lambda: review_page(movie))
+    shared = {
+        'movie_genres': functools.cache(lambda: list(movie.genres.all())),
+        # Mood Stats สำหรับ Radar Chart อ่านจากตารางสรุป MovieMoodStats (query เดียว)
+        'mood_stats': functools.cache(lambda: mood_stats.radar_stats(movie, all_moods)),
+        'reviews': lambda: first_page()[0],
+        'reviews_next_cursor': lambda: first_page()[1],
+        'review_total': functools.cache(lambda: review_total(movie.id)),
+    }
+    if lazy:
+        context.update(shared)
     else:
-        form = ReviewForm()
-    
-    # 3. เตรียมข้อมูลแสดงผล
-    reviews = []
+        context.update({name: load() for name, load in shared.items()})
+
+    # ส่วนเฉพาะผู้ใช้ คำนวณทุกครั้ง
     is_favorited = False
     is_bookmarked = False
     user_lists = []
-    mood_stats = []
-    all_moods = Mood.objects.all()
     user_review = None
-
-    if movie:
-        reviews = movie.reviews.select_related('user', 'user__profile') \
-                               .prefetch_related('mood_scores__mood') \
-                               .order_by('-created_at')
-        
-        # คำนวณ Mood Stats สำหรับ Radar Chart
-        for mood in all_moods:
-            avg_intensity = ReviewMoodScore.objects.filter(
-                review__movie=movie, 
-                mood=mood
-            ).aggregate(avg=Avg('intensity'))['avg'] or 0
-            
-            mood_stats.append({
-                'name': mood.name,
-                'score': round(avg_intensity, 1)
-            })
-
-        if request.user.is_authenticated:
-            is_favorited = Favorite.objects.filter(user=request.user, movie=movie).exists()
-            is_bookmarked = Bookmark.objects.filter(user=request.user, movie=movie).exists()
-            user_lists = request.user.custom_lists.all().annotate(
-                has_movie=Count('movies', filter=Q(movies__id=movie.id))
-            )
-            # หา User Review
-            user_review = reviews.filter(user=request.user).first()
-            
-    elif request.user.is_authenticated:
-        user_lists = request.user.custom_lists.all()
-
-    context = {
-        'movie': movie,
-        'movie_db': movie,      
-        'movie_tmdb': tmdb_data,
-        'reviews': reviews,
+    if user.is_authenticated:
+        is_favorited = Favorite.objects.filter(user=user, movie=movie).exists()
+        is_bookmarked = Bookmark.objects.filter(user=user, movie=movie).exists()
+        user_lists = list(user.custom_lists.all().annotate(
+            has_movie=Count('movies', filter=Q(movies__id=movie.id))
+        ))
+        user_review = movie.reviews.filter(user=user).prefetch_related('mood_scores__mood').first()
+
+    context.update({
         'is_favorited': is_favorited,
         'is_bookmarked': is_bookmarked,
         'user_lists': user_lists,
-        'form': form,
-        'mood_stats': mood_stats,
-        'all_moods': all_moods,
         'user_review': user_review,
-    }
-    return render(request, 'movies/detail.html', context)
+    })
+    return context
+
+async def movie_detail(request, tmdb_id):
+    """แสดงรายละเอียดภาพยนตร์และรีวิว (อัปเดตใหม่ รองรับ Multi-Mood & Radar Chart)
+    ยิง TMDb (ถ้าต้อง sync) พร้อมกับ query ฝั่ง DB เวลารวมจะเท่ากับฝั่งที่ช้ากว่า ไม่ใช่ผลบวกของทั้งสอง"""
+    
+    # 1. จัดการข้อมูลหนัง (หาใน DB หรือดึงจาก TMDB มาสร้าง ดู movies/resolver.py)
+    movie = await movie_resolver.aresolve(tmdb_id)
+    if movie is None:
+        raise Http404('Movie not found')
+    tmdb_data = None
+
+    # 2. Handle Review Submission (POST)
+    user = await request.auser()
+    form = ReviewForm()
+    if request.method == 'POST' and user.is_authenticated:
+        response, form = await sync_to_async(_submit_review)(request, movie)
+        if response is not None:
+            return response
+
+    # 3. เตรียมข้อมูลแสดงผล (หนังที่เพิ่งสร้างจาก TMDb เพิ่ง sync ไป ไม่เข้าเงื่อนไขนี้)
+    if movie.needs_sync(TMDB_SYNC_MAX_AGE):
+        # ข้อมูลเก่า -> ยิง TMDb ขนานกับ query ฝั่ง DB
+        # TMDb ล่ม/ตัดวงจรอยู่ ก็แสดงจาก DB ไปก่อน
+        # (sync แล้วเวอร์ชันของหนังจะเปลี่ยน เลยคำนวณทุกส่วนไว้ render fragment ใหม่เลย)
+        tmdb_data, context = await asyncio.gather(
+            aget_movie_details_tmdb(tmdb_id),
+            sync_to_async(_movie_detail_context)(request, movie),
+        )
+        if tmdb_data:
+            # อัปเดต object เดิมที่อยู่ใน context ด้วย หน้าจะแสดงข้อมูลล่าสุดทันที
+            await sync_to_async(refresh_movie_from_tmdb)(movie, tmdb_data)
+            context['movie_genres'] = await _alist(movie.genres.all())
+        version = await fragments.amovie_version(movie.id)
+    else:
+        # มีใน DB และเพิ่ง sync มา -> แสดงจาก DB เลย ไม่ต้องเรียก TMDb
+        # ส่วนที่ใช้ร่วมกันจะ query ตอน render เฉพาะ fragment ที่ไม่มีใน cache
+        version = await fragments.amovie_version(movie.id)
+        context = await sync_to_async(_movie_detail_context)(request, movie, lazy=True)
+
+    context['movie_tmdb'] = tmdb_data
+    context['form'] = form
+    context['fragment_version'] = version
+    context['fragment_ttl'] = fragments.FRAGMENT_TTL
+    return await sync_to_async(render)(request, 'movies/detail.html', context)
+
+def movie_similar_json(request, tmdb_id):
+    """API: หนังที่ให้อารมณ์คล้ายกัน (cosine similarity ของ mood profile) ?limit= ได้สูงสุด 50"""
+    movie = get_object_or_404(Movie, tmdb_id=tmdb_id)
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 50)
+    except ValueError:
+        limit = 10
+    return JsonResponse({
+        'tmdb_id': movie.tmdb_id,
+        'results': [{
+            'tmdb_id': m.tmdb_id,
+            'title': m.title,
+            'poster_url': f"https://image.tmdb.org/t/p/w500{m.poster_path}" if m.poster_path else None,
+            'similarity': m.similarity,
+        } for m in similar_movies(movie, limit=limit)],
+    })
+
+def movie_reviews_json(request, tmdb_id):
+    """API: รีวิวหน้าถัดไป (?cursor= จากหน้าก่อน) คืน HTML ของการ์ดรีวิว + cursor ถัดไป สำหรับปุ่มโหลดเพิ่ม"""
+    movie = get_object_or_404(Movie, tmdb_id=tmdb_id)
+    try:
+        reviews, next_cursor = review_page(movie, cursor=request.GET.get('cursor'))
+    except InvalidCursor:
+        return JsonResponse({'error': 'cursor ไม่ถูกต้อง'}, status=400)
+    return JsonResponse({
+        'results': [{
+            'id': review.id,
+            'username': review.user.username,
+            'created_at': review.created_at.isoformat(),
+            'comment': review.comment,
+            'scores': [{'mood': score.mood.name, 'emoji': score.mood.emoji, 'intensity': score.intensity}
+                       for score in review.mood_scores.all() if score.intensity > 0],
+        } for review in reviews],
+        'html': ''.join(render_to_string('movies/review_card.html', {'review': review}, request=request)
+                        for review in reviews),
+        'next_cursor': next_cursor,
+        'total': review_total(movie.id),
+    })
 
 @login_required
 def search_users(request):
@@ -200,38 +331,35 @@ def search_users(request):
     return render(request, 'movies/search_users.html', {'users': users, 'query': query})
 
 def mood_recommendation(request, mood_id):
-    """แนะนำหนังตามอารมณ์ ด้วยสูตร Weighted Rating (IMDb Formula) [FIXED: กรองคะแนน 0 ออก]"""
-    mood = get_object_or_404(Mood, id=mood_id)
-    
-    m = 1  # Minimum Votes
-    
-    # (C) Global Average: คิดเฉพาะที่มีคะแนน (>0) ไม่งั้นค่าเฉลี่ยจะต่ำเกินจริง
-    global_stats = ReviewMoodScore.objects.filter(mood=mood, intensity__gt=0).aggregate(avg_global=Avg('intensity'))
-    C = global_stats['avg_global'] if global_stats['avg_global'] is not None else 5.0
-
-    # Query และคำนวณ Weighted Score
-    recommended_movies = Movie.objects.filter(
-        reviews__mood_scores__mood=mood,
-        reviews__mood_scores__intensity__gt=0 # [FIX] กรองหนังที่มีคะแนนอารมณ์นี้ > 0 เท่านั้น
-    ).distinct().annotate(
-        # (v) Count: นับเฉพาะคะแนน > 0
-        v=Count('reviews__mood_scores', filter=Q(reviews__mood_scores__mood=mood, reviews__mood_scores__intensity__gt=0)),
-        # (R) Average: เฉลี่ยเฉพาะคะแนน > 0
-        R=Avg('reviews__mood_scores__intensity', filter=Q(reviews__mood_scores__mood=mood, reviews__mood_scores__intensity__gt=0))
-    ).filter(
-        v__gte=m  
-    ).annotate(
-        mood_score=ExpressionWrapper(
-            ((F('v') * F('R')) + (m * C)) / (F('v') + m),
-            output_field=FloatField()
-        )
-    ).order_by('-mood_score')[:20]
+    """แนะนำหนังตามอารมณ์ ด้วยสูตร Weighted Rating (IMDb Formula) [FIXED: กรองคะแนน 0 ออก]
+    อ่าน top 20 จากตารางจัดอันดับ MovieMoodStats.weighted_score ที่อัปเดตไว้ล่วงหน้า
+    (m = 1, C = ค่าเฉลี่ยคะแนนของอารมณ์นี้จาก MoodPrior ดู movies/mood_stats.py)"""
+    mood = mood_registry.get(mood_id)
+    if mood is None:
+        raise Http404('ไม่พบอารมณ์นี้')
+    recommended_movies = mood_stats.leaderboard(mood, limit=20)
 
     return render(request, 'movies/recommendation.html', {
         'mood': mood,
         'movies': recommended_movies
     })
 
+@login_required
+def personal_recommendations(request):
+    """แนะนำหนังเฉพาะตัวผู้ใช้ จากโมเดล Matrix Factorization (train_recommender)
+    ผู้ใช้ใหม่ที่ยังไม่อยู่ในโมเดล จะเห็นหนังยอดนิยมในระบบแทน"""
+    movies = recommender.recommend(request.user, n=20)
+    personalized = bool(movies)
+    if not personalized:
+        movies = list(Movie.objects.exclude(poster_path__isnull=True).exclude(poster_path='').annotate(
+            fav_count=Count('favorited_by', distinct=True),
+        ).order_by('-fav_count', '-vote_average')[:20])
+
+    return render(request, 'movies/for_you.html', {
+        'movies': movies,
+        'personalized': personalized,
+    })
+
 # ==========================================
 # 2. USER ACTIONS (รีวิว, Fav, Bookmark)
 # ==========================================
@@ -249,37 +377,17 @@ def edit_review(request, review_id):
     if request.method == 'POST':
         form = ReviewForm(request.POST, instance=review)
         if form.is_valid():
-            form.save() # 1. บันทึกข้อความ Comment ก่อน
-
-            # 2. บันทึกคะแนน Mood Score (ส่วนที่ขาดหายไป)
-            all_moods = Mood.objects.all()
-            
-            # [Debug] ปริ้นท์เช็กหน่อยว่าส่งอะไรมาบ้าง
-            print(f"--- Editing Review ID: {review_id} ---")
-            
-            for mood in all_moods:
-                score_key = f'mood_score_{mood.id}'
-                score_val = request.POST.get(score_key)
-                
-                if score_val and score_val.isdigit():
-                    intensity = int(score_val)
-                    
-                    # ถ้าคะแนนมากกว่า 0 ให้บันทึก/อัปเดต
-                    if intensity > 0:
-                        ReviewMoodScore.objects.update_or_create(
-                            review=review,
-                            mood=mood,
-                            defaults={'intensity': intensity}
-                        )
-                        print(f"Saved: {mood.name} = {intensity}")
-                    else:
-                        # (Option) ถ้าเลื่อนเหลือ 0 ให้ลบคะแนนอารมณ์นั้นทิ้ง
-                        ReviewMoodScore.objects.filter(review=review, mood=mood).delete()
-                        print(f"Removed: {mood.name}")
-
-            messages.success(request, 'แก้ไขรีวิวเรียบร้อยแล้ว!')
-            return redirect('movie_detail', tmdb_id=review.movie.tmdb_id)
-            
+            try:
+                scores = services.parse_mood_scores(request.POST)
+            except ValidationError as e:
+                for message in e.messages:
+                    messages.error(request, message)
+            else:
+                # comment + คะแนนอารมณ์ + สถิติ เขียนใน transaction เดียว (จำนวน query คงที่)
+                services.update_review(review, form.cleaned_data['comment'], scores)
+                messages.success(request, 'แก้ไขรีวิวเรียบร้อยแล้ว!')
+                return redirect('movie_detail', tmdb_id=review.movie.tmdb_id)
+
     else:
         form = ReviewForm(instance=review)
 
@@ -290,7 +398,7 @@ def edit_review(request, review_id):
         'form': form, 
         'movie': review.movie,
         'review': review,
-        'all_moods': Mood.objects.all(),
+        'all_moods': mood_registry.all(),
         'existing_scores': existing_scores
     })
 
@@ -303,35 +411,27 @@ def delete_review(request, review_id):
     if request.user != review.user:
         messages.error(request, 'คุณไม่มีสิทธิ์ลบรีวิวนี้')
     else:
-        review.delete()
+        services.delete_review(review)
         messages.success(request, 'ลบรีวิวเรียบร้อยแล้ว')
         
     return redirect('movie_detail', tmdb_id=tmdb_id)
 
+def _toggle_mark(model, user, movie_id):
+    """เพิ่ม/ลบ Favorite หรือ Bookmark ของหนังเรื่องนี้ คืน 'added' / 'removed'"""
+    mark, created = model.objects.get_or_create(user=user, movie_id=movie_id)
+    if not created:
+        mark.delete()
+        return 'removed'
+    return 'added'
+
 @login_required
 @require_POST
 def toggle_favorite(request, tmdb_id):
     """Toggle Favorite (AJAX)"""
-    movie = Movie.objects.filter(tmdb_id=tmdb_id).first()
-    if not movie:
-        tmdb_data = get_movie_details_tmdb(tmdb_id)
-        if tmdb_data:
-            movie = Movie.objects.create(
-                tmdb_id=tmdb_data['tmdb_id'],
-                title=tmdb_data['title'],
-                poster_path=tmdb_data['poster_path'],
-                overview=tmdb_data.get('overview', ''),
-                release_date=tmdb_data.get('release_date')
-            )
-        else:
-             return JsonResponse({'status': 'error', 'message': 'Movie not found'}, status=404)
-
-    fav, created = Favorite.objects.get_or_create(user=request.user, movie=movie)
-    if not created:
-        fav.delete()
-        status = 'removed'
-    else:
-        status = 'added'
+    try:
+        status = movie_resolver.with_movie_id(tmdb_id, lambda movie_id: _toggle_mark(Favorite, request.user, movie_id))
+    except Movie.DoesNotExist:
+        return JsonResponse({'status': 'error', 'message': 'Movie not found'}, status=404)
 
     return JsonResponse({'status': status})
 
@@ -339,26 +439,10 @@ def toggle_favorite(request, tmdb_id):
 @require_POST
 def toggle_bookmark(request, tmdb_id):
     """Toggle Bookmark (AJAX)"""
-    movie = Movie.objects.filter(tmdb_id=tmdb_id).first()
-    if not movie:
-        tmdb_data = get_movie_details_tmdb(tmdb_id)
-        if tmdb_data:
-            movie = Movie.objects.create(
-                tmdb_id=tmdb_data['tmdb_id'],
-                title=tmdb_data['title'],
-                poster_path=tmdb_data['poster_path'],
-                overview=tmdb_data.get('overview', ''),
-                release_date=tmdb_data.get('release_date')
-            )
-        else:
-             return JsonResponse({'status': 'error', 'message': 'Movie not found'}, status=404)
-
-    bookmark, created = Bookmark.objects.get_or_create(user=request.user, movie=movie)
-    if not created:
-        bookmark.delete()
-        status = 'removed'
-    else:
-        status = 'added'
+    try:
+        status = movie_resolver.with_movie_id(tmdb_id, lambda movie_id: _toggle_mark(Bookmark, request.user, movie_id))
+    except Movie.DoesNotExist:
+        return JsonResponse({'status': 'error', 'message': 'Movie not found'}, status=404)
 
     return JsonResponse({'status': status})
 
@@ -393,8 +477,8 @@ def admin_movies(request):
 
 @staff_member_required(login_url='login')
 def admin_moods(request):
-    """จัดการอารมณ์"""
-    moods = Mood.objects.all()
+    """จัดการอารมณ์ (บันทึกแล้ว signal ใน movies/moods.py จะเพิ่มเวอร์ชันของทะเบียนอารมณ์ให้ทุก worker โหลดใหม่)"""
+    moods = mood_registry.all()
     
     if request.method == 'POST':
         mood_name = request.POST.get('mood_name')
@@ -426,6 +510,22 @@ def admin_reviews(request):
 
     return render(request, 'movies/admin/reviews.html', {'reviews': reviews, 'query': query})
 
+@staff_member_required(login_url='login')
+def admin_tmdb_metrics(request):
+    """สถานะการเรียก TMDb ของ worker นี้ (rate limit, cache, circuit breaker) เป็น JSON"""
+    client = get_client()
+    cache = client.cache
+    return JsonResponse({
+        'rate_limit': client.rate_limiter.metrics() if client.rate_limiter else None,
+        'circuit': client.breaker.state if client.breaker else None,
+        'cache': {
+            'size': len(cache),
+            'hits': cache.hits,
+            'stale_hits': cache.stale_hits,
+            'misses': cache.misses,
+        } if cache is not None else None,
+    })
+
 @staff_member_required(login_url='login')
 def admin_users(request):
     """จัดการผู้ใช้งาน (แสดงรายชื่อ + ค้นหา)"""
@@ -463,10 +563,17 @@ def admin_delete_user(request, user_id):
 # 4. CUSTOM LIST MANAGEMENT
 # ==========================================
 
+def _my_lists_queryset(user):
+    return user.custom_lists.all().annotate(movie_count=Count('movies')).order_by('-created_at')
+
+def _public_lists_queryset(user):
+    # ตรงกับ partial index customlist_public_idx (user, -created_at) WHERE is_public
+    return CustomList.objects.filter(user=user, is_public=True).order_by('-created_at')
+
 @login_required
 def my_lists(request):
     """หน้าแสดงรายการ List ทั้งหมดของฉัน"""
-    lists = request.user.custom_lists.all().annotate(movie_count=Count('movies')).order_by('-created_at')
+    lists = _my_lists_queryset(request.user)
     return render(request, 'movies/lists/my_lists.html', {'lists': lists})
 
 @login_required
@@ -543,28 +650,19 @@ def toggle_list_movie(request, list_id, tmdb_id):
     """Toggle Add/Remove Movie from List (AJAX) - ใช้ในหน้า Detail"""
     custom_list = get_object_or_404(CustomList, id=list_id, user=request.user)
     
-    # หาหรือสร้างหนัง
-    movie = Movie.objects.filter(tmdb_id=tmdb_id).first()
-    if not movie:
-        tmdb_data = get_movie_details_tmdb(tmdb_id)
-        if tmdb_data:
-            movie = Movie.objects.create(
-                tmdb_id=tmdb_data['tmdb_id'],
-                title=tmdb_data['title'],
-                poster_path=tmdb_data['poster_path'],
-                overview=tmdb_data.get('overview', ''),
-                release_date=tmdb_data.get('release_date')
-            )
-        else:
-             return JsonResponse({'status': 'error', 'message': 'Movie not found'}, status=404)
-
-    # เช็คว่ามีหนังนี้ในลิสต์ไหม
-    if custom_list.movies.filter(id=movie.id).exists():
-        custom_list.movies.remove(movie)
-        status = 'removed'
-    else:
-        custom_list.movies.add(movie)
-        status = 'added'
+    def toggle(movie_id):
+        # เช็คว่ามีหนังนี้ในลิสต์ไหม
+        if custom_list.movies.filter(id=movie_id).exists():
+            custom_list.movies.remove(movie_id)
+            return 'removed'
+        custom_list.movies.add(movie_id)
+        return 'added'
+
+    # หาหรือสร้างหนัง (ใช้แค่ id)
+    try:
+        status = movie_resolver.with_movie_id(tmdb_id, toggle)
+    except Movie.DoesNotExist:
+        return JsonResponse({'status': 'error', 'message': 'Movie not found'}, status=404)
 
     return JsonResponse({'status': status, 'list_name': custom_list.name})
 
@@ -582,7 +680,7 @@ def user_lists(request, username):
     # ----------------------------------------------------
     
     # ดึงเฉพาะรายการที่เป็น Public (is_public=True) ให้คนอื่นดู
-    lists = CustomList.objects.filter(user=profile_user, is_public=True).order_by('-created_at')
+    lists = _public_lists_queryset(profile_user)
 
     return render(request, 'movies/lists/user_lists.html', {
         'profile_user': profile_user,
@@ -596,7 +694,7 @@ def user_lists(request, username):
 from datetime import date, timedelta
 import calendar
 
-def movie_calendar(request):
+async def movie_calendar(request):
     """แสดงปฏิทินหนังเข้าใหม่"""
     # 1. หาปีและเดือนปัจจุบัน (วันนี้จริงๆ)
     today = date.today() 
@@ -615,7 +713,7 @@ def movie_calendar(request):
     end_date = f"{year}-{month:02d}-{last_day}"
 
     # 3. ดึงหนัง (สมมติว่าฟังก์ชันนี้มีอยู่แล้ว)
-    movies = get_movies_in_date_range(start_date, end_date) 
+    movies = await aget_movies_in_date_range(start_date, end_date)
 
     # 4. จัดกลุ่มหนังตามวันที่
     movies_by_date = {}
@@ -664,7 +762,8 @@ def movie_calendar(request):
         'current_year': today.year,   # ปีนี้ (เช่น 2026)
         # -----------------------------------------------
     }
-    return render(request, 'movies/calendar.html', context)
+    # render ใน thread (base.html อ่าน user จาก session ซึ่งต้องแตะ DB)
+    return await sync_to_async(render)(request, 'movies/calendar.html', context)
 
 # ==========================================
 # 6. ADMIN DELETE ACTIONS
@@ -680,13 +779,13 @@ def admin_delete_movie(request, movie_id):
 @staff_member_required(login_url='login')
 def admin_delete_mood(request, mood_id):
     mood = get_object_or_404(Mood, id=mood_id)
-    mood.delete()
+    mood.delete()  # post_delete -> ทะเบียนอารมณ์ของทุก worker โหลดใหม่
     messages.success(request, 'ลบอารมณ์เรียบร้อยแล้ว')
     return redirect('admin_moods')
 
 @staff_member_required(login_url='login')
 def admin_delete_review(request, review_id):
     review = get_object_or_404(Review, id=review_id)
-    review.delete()
+    services.delete_review(review)
     messages.success(request, 'ลบรีวิวเรียบร้อยแล้ว')
     return redirect('admin_reviews')
\ No newline at end of file